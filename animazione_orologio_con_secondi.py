@@ -1,14 +1,200 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterator, List, Optional, Tuple
+
 from esercizio_orologio_con_secondi import(
     crea_orologio
 )
 
-from img_lib_v0_6 import crea_gif
+from esercizio_orologio import RAGGIO, crea_quadrante, usa_quadrante
+
+from img_lib_v0_6 import (
+    Immagine,
+    crea_gif,
+    fattore_antialiasing,
+    modalita_antialiasing
+)
+
+from archivio_fotogrammi import ArchivioFotogrammi, apri_o_crea_archivio
+
+def crea_animazione_orologio(ore: int, minuti: int, secondi: int,
+                             processi: Optional[int] = 1,
+                             dimensione_blocco: int = 8,
+                             archivio: Optional[str] = None):
+    """
+    Crea la GIF animata di un orologio con ore, minuti e secondi, un frame
+    per ogni secondo da 0 a secondi - 1.
+    Indicando un archivio, i frame vengono prima salvati nell'archivio (vedi
+    archivia_orologi()) e poi letti da lì: se la creazione viene interrotta,
+    la volta successiva vengono creati solo i frame mancanti
+
+    :param ore: l'ora indicata dall'orologio
+    :param minuti: i minuti indicati dall'orologio
+    :param secondi: numero di frame (secondi) dell'animazione
+    :param processi: numero di processi con cui creare i frame in parallelo
+    (1 per crearli nel processo corrente, None per usare tutti i core)
+    :param dimensione_blocco: numero di frame creati da un processo alla volta
+    :param archivio: file in cui salvare i frame, oppure None per non
+    salvarli
+    """
+    if archivio is not None:
+        with archivia_orologi(ore, minuti, range(0, secondi), archivio,
+                              processi, dimensione_blocco) as fotogrammi:
+            return crea_gif("animazione_orologio", fotogrammi.fotogrammi(), 1,
+                            solo_differenze=True)
+    # I frame vengono generati uno alla volta, man mano che crea_gif() li
+    # scrive su file. Tra un frame e l'altro cambiano solo le lancette.
+    orologi = genera_orologi(ore, minuti, range(0, secondi), processi,
+                             dimensione_blocco)
+    return crea_gif("animazione_orologio", orologi, 1, solo_differenze=True)
+
+
+def genera_orologi(ore: int, minuti: int, lista_secondi: range,
+                   processi: Optional[int] = 1,
+                   dimensione_blocco: int = 8) -> Iterator[Immagine]:
+    """
+    Genera, nell'ordine, gli orologi che indicano ore e minuti e ognuno dei
+    secondi richiesti.
+    Con più di un processo, i frame vengono creati in parallelo a blocchi:
+    il quadrante viene costruito una volta sola e inviato a ogni processo
+    quando viene avviato, insieme al fattore di antialiasing attuale, e solo
+    un numero limitato di blocchi viene preparato in anticipo, per cui la
+    memoria usata non dipende dal numero di frame.
+
+    :param ore: l'ora indicata dagli orologi
+    :param minuti: i minuti indicati dagli orologi
+    :param lista_secondi: i secondi indicati dagli orologi, uno per frame
+    :param processi: numero di processi con cui creare i frame (1 per
+    crearli nel processo corrente, None per usare tutti i core)
+    :param dimensione_blocco: numero di frame creati da un processo alla volta
+    :returns: un iteratore sugli orologi
+    """
+    if processi == 1:
+        for passo in lista_secondi:
+            yield crea_orologio(ore, minuti, passo)
+        return
+    blocchi = [lista_secondi[inizio:inizio + dimensione_blocco]
+               for inizio in range(0, len(lista_secondi), dimensione_blocco)]
+    processi = processi or os.cpu_count() or 1
+    fattore = fattore_antialiasing()
+    with ProcessPoolExecutor(processi, initializer=_inizializza_processo,
+                             initargs=(crea_quadrante(), fattore)) as pool:
+        # Due blocchi per processo: mentre se ne consuma uno, il successivo
+        # è già in preparazione
+        massimo_in_corso = 2 * processi
+        in_corso: Deque[Future] = deque()
+        for blocco in blocchi:
+            in_corso.append(pool.submit(_crea_blocco, ore, minuti, blocco,
+                                        fattore))
+            if len(in_corso) >= massimo_in_corso:
+                yield from in_corso.popleft().result()
+        while in_corso:
+            yield from in_corso.popleft().result()
+
+
+def archivia_orologi(ore: int, minuti: int, lista_secondi: range,
+                     nome_archivio: str, processi: Optional[int] = 1,
+                     dimensione_blocco: int = 8) -> ArchivioFotogrammi:
+    """
+    Crea gli orologi che indicano ore e minuti e ognuno dei secondi
+    richiesti e li salva, nell'ordine, in un archivio di fotogrammi.
+    Se l'archivio esiste già ed è stato creato con gli stessi parametri
+    (orario, secondi, raggio, antialiasing e quadrante), vengono creati solo
+    i frame che mancano, per cui una creazione interrotta può essere
+    ripresa; altrimenti l'archivio viene ricreato da zero.
+    Con più di un processo, ogni processo scrive direttamente nell'archivio i
+    frame che crea, senza inviarli al processo principale.
+
+    :param ore: l'ora indicata dagli orologi
+    :param minuti: i minuti indicati dagli orologi
+    :param lista_secondi: i secondi indicati dagli orologi, uno per frame
+    :param nome_archivio: il file dell'archivio
+    :param processi: numero di processi con cui creare i frame (1 per
+    crearli nel processo corrente, None per usare tutti i core)
+    :param dimensione_blocco: numero di frame creati da un processo alla volta
+    :returns: l'archivio, aperto
+    """
+    quadrante = crea_quadrante()
+    parametri = {
+        "ore": ore,
+        "minuti": minuti,
+        "secondi": [lista_secondi.start, lista_secondi.stop,
+                    lista_secondi.step],
+        "raggio": RAGGIO,
+        "antialiasing": fattore_antialiasing(),
+        "quadrante": quadrante.get_impronta()[2].hex()
+    }
+    archivio = apri_o_crea_archivio(nome_archivio, len(lista_secondi),
+                                    quadrante.get_dimensioni(), parametri)
+    mancanti = archivio.mancanti()
+    if processi == 1:
+        for numero in mancanti:
+            archivio.scrivi(numero,
+                            crea_orologio(ore, minuti, lista_secondi[numero]))
+        return archivio
+    blocchi = [mancanti[inizio:inizio + dimensione_blocco]
+               for inizio in range(0, len(mancanti), dimensione_blocco)]
+    fattore = parametri["antialiasing"]
+    with ProcessPoolExecutor(processi or os.cpu_count() or 1,
+                             initializer=_inizializza_processo,
+                             initargs=(quadrante, fattore)) as pool:
+        for risultato in [pool.submit(_archivia_blocco, ore, minuti,
+                                      [(numero, lista_secondi[numero])
+                                       for numero in blocco], nome_archivio,
+                                      fattore)
+                          for blocco in blocchi]:
+            risultato.result()
+    return archivio
+
+
+def _archivia_blocco(ore: int, minuti: int, blocco: List[Tuple[int, int]],
+                     nome_archivio: str, fattore: int):
+    """
+    Crea un blocco di frame in un processo del pool e li scrive
+    nell'archivio
+    
+    :param ore: l'ora indicata dagli orologi
+    :param minuti: i minuti indicati dagli orologi
+    :param blocco: coppie (numero del frame, secondi indicati dall'orologio)
+    :param nome_archivio: il file dell'archivio
+    :param fattore: il fattore di antialiasing del processo principale
+    """
+    with ArchivioFotogrammi(nome_archivio) as archivio, \
+            modalita_antialiasing(fattore):
+        for numero, passo in blocco:
+            archivio.scrivi(numero, crea_orologio(ore, minuti, passo))
+
+
+def _inizializza_processo(quadrante: Immagine, fattore: int):
+    """
+    Prepara un processo del pool: il quadrante ricevuto viene riutilizzato
+    per tutti i frame. Il processo non eredita l'antialiasing del processo
+    principale (ad esempio se avviato con spawn), per cui il quadrante viene
+    memorizzato per il fattore ricevuto, lo stesso con cui vengono poi
+    disegnate le lancette
+    
+    :param quadrante: il quadrante costruito dal processo principale
+    :param fattore: il fattore di antialiasing del processo principale
+    """
+    with modalita_antialiasing(fattore):
+        usa_quadrante(quadrante)
+
+
+def _crea_blocco(ore: int, minuti: int, blocco: range,
+                 fattore: int) -> List[Immagine]:
+    """
+    Crea un blocco di frame in un processo del pool
+    
+    :param ore: l'ora indicata dagli orologi
+    :param minuti: i minuti indicati dagli orologi
+    :param blocco: i secondi dei frame da creare
+    :param fattore: il fattore di antialiasing del processo principale
+    :returns: gli orologi, nell'ordine
+    """
+    with modalita_antialiasing(fattore):
+        return [crea_orologio(ore, minuti, passo) for passo in blocco]
 
-def crea_animazione_orologio(ore: int, minuti: int, secondi: int):
-    lista_orologi = [
-        crea_orologio(ore, minuti, passo)
-        for passo in range(0, secondi)
-    ]
-    return crea_gif("animazione_orologio",lista_orologi, 1)
 
-crea_animazione_orologio(4, 10, 40)
+if __name__ == "__main__":
+    crea_animazione_orologio(4, 10, 40)
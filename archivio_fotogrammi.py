@@ -0,0 +1,245 @@
+"""
+Archivio di fotogrammi su file, per animazioni troppo lunghe per essere
+tenute in memoria.
+
+L'archivio è un file con un piccolo indice e i pixel RGBA di un numero fisso
+di fotogrammi, tutti delle stesse dimensioni, letto e scritto tramite mmap:
+
+- i fotogrammi possono essere scritti in qualsiasi ordine, anche da più
+  processi contemporaneamente (purché ognuno scriva fotogrammi diversi);
+- l'indice ricorda quali fotogrammi sono già stati scritti, per cui un
+  rendering interrotto può essere ripreso dai fotogrammi mancanti;
+- l'intestazione ricorda i parametri con cui sono stati creati i fotogrammi,
+  per cui un archivio creato con parametri diversi non viene riutilizzato;
+- i fotogrammi letti non vengono copiati: le immagini Pillow usano
+  direttamente la memoria del file, e possono essere passate a crea_gif() o
+  crea_apng().
+
+Uso:
+
+    with apri_o_crea_archivio("animazione.fotogrammi", 60, (600, 600),
+                              {"ore": 4, "minuti": 10}) as archivio:
+        for numero in archivio.mancanti():
+            archivio.scrivi(numero, crea_fotogramma(numero))
+        crea_gif("animazione", archivio.fotogrammi())
+"""
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image as ImageMod
+
+from img_lib_v0_6 import Immagine
+
+# Il file inizia con FIRMA, con larghezza, altezza e numero dei fotogrammi e
+# con la lunghezza dei parametri (_INTESTAZIONE), seguiti dai parametri in
+# JSON. Seguono, per ogni fotogramma, una voce dell'indice
+# (_VOCE: 1 se il fotogramma è stato scritto, altrimenti 0, e le coordinate
+# del punto di riferimento) e infine, a partire da un multiplo di
+# ALLINEAMENTO, i pixel di tutti i fotogrammi, uno dopo l'altro.
+FIRMA = b"FOTOGR02"
+ALLINEAMENTO = mmap.PAGESIZE
+_INTESTAZIONE = struct.Struct("<IIII")
+_VOCE = struct.Struct("<B3xii")
+
+
+def crea_archivio(nome_file: str, numero: int, dimensioni: Tuple[int, int],
+                  parametri: Optional[Dict[str, Any]] = None
+                  ) -> "ArchivioFotogrammi":
+    """
+    Crea un nuovo archivio vuoto (sovrascrivendo il file, se esiste già) e lo
+    apre. Lo spazio per i pixel viene riservato, ma sulla maggior parte dei
+    file system non occupa il disco finché i fotogrammi non vengono scritti.
+
+    :param nome_file: il file dell'archivio
+    :param numero: numero di fotogrammi
+    :param dimensioni: larghezza e altezza dei fotogrammi, in pixel
+    :param parametri: i parametri con cui vengono creati i fotogrammi (un
+                      dizionario convertibile in JSON), memorizzati
+                      nell'intestazione
+    :returns: l'archivio aperto
+    """
+    larghezza, altezza = dimensioni
+    if numero <= 0 or larghezza <= 0 or altezza <= 0:
+        raise ValueError("Numero e dimensioni dei fotogrammi devono essere "
+                         "positivi")
+    testo_parametri = json.dumps(parametri or {},
+                                 sort_keys=True).encode("utf-8")
+    inizio_dati = _inizio_dati(numero, len(testo_parametri))
+    with open(nome_file, "wb") as file:
+        file.write(FIRMA + _INTESTAZIONE.pack(larghezza, altezza, numero,
+                                              len(testo_parametri)))
+        file.write(testo_parametri)
+        file.truncate(inizio_dati + numero * larghezza * altezza * 4)
+    return ArchivioFotogrammi(nome_file)
+
+
+def apri_o_crea_archivio(nome_file: str, numero: int,
+                         dimensioni: Tuple[int, int],
+                         parametri: Optional[Dict[str, Any]] = None
+                         ) -> "ArchivioFotogrammi":
+    """
+    Apre un archivio esistente per riprendere un rendering interrotto,
+    oppure ne crea uno nuovo se il file non esiste, non è un archivio di
+    questa versione o contiene un numero diverso di fotogrammi, fotogrammi di
+    dimensioni diverse o fotogrammi creati con parametri diversi.
+
+    :param nome_file: il file dell'archivio
+    :param numero: numero di fotogrammi
+    :param dimensioni: larghezza e altezza dei fotogrammi, in pixel
+    :param parametri: i parametri con cui vengono creati i fotogrammi (vedi
+                      crea_archivio())
+    :returns: l'archivio aperto
+    """
+    if os.path.exists(nome_file):
+        try:
+            archivio = ArchivioFotogrammi(nome_file)
+        except ValueError:
+            archivio = None
+        if archivio is not None:
+            # Confronta i parametri come verrebbero riletti dal file (ad
+            # esempio, le tuple diventano liste)
+            if (len(archivio) == numero and archivio.dimensioni == dimensioni
+                    and archivio.parametri == json.loads(
+                        json.dumps(parametri or {}))):
+                return archivio
+            archivio.chiudi()
+    return crea_archivio(nome_file, numero, dimensioni, parametri)
+
+
+def _inizio_dati(numero: int, lunghezza_parametri: int) -> int:
+    """
+    Calcola la posizione nel file del primo pixel del primo fotogramma.
+
+    :param numero: numero di fotogrammi
+    :param lunghezza_parametri: lunghezza dei parametri in JSON, in byte
+    :returns: la posizione, in byte
+    """
+    fine_indice = (len(FIRMA) + _INTESTAZIONE.size + lunghezza_parametri
+                   + numero * _VOCE.size)
+    return fine_indice + -fine_indice % ALLINEAMENTO
+
+
+class ArchivioFotogrammi:
+    """
+    Archivio di fotogrammi creato con crea_archivio(), aperto in lettura e
+    scrittura tramite mmap.
+    """
+
+    def __init__(self, nome_file: str) -> None:
+        self.nome_file = nome_file
+        with open(nome_file, "r+b") as file:
+            self._mappa = mmap.mmap(file.fileno(), 0)
+        if self._mappa[:len(FIRMA)] != FIRMA:
+            self._mappa.close()
+            raise ValueError(f"{nome_file} non è un archivio di fotogrammi")
+        (larghezza, altezza, self._numero,
+         lunghezza_parametri) = _INTESTAZIONE.unpack_from(self._mappa,
+                                                          len(FIRMA))
+        self.dimensioni = (larghezza, altezza)
+        self._inizio_indice = len(FIRMA) + _INTESTAZIONE.size
+        try:
+            self.parametri: Dict[str, Any] = json.loads(self._mappa[
+                self._inizio_indice:self._inizio_indice + lunghezza_parametri])
+        except ValueError:
+            self._mappa.close()
+            raise
+        self._inizio_indice += lunghezza_parametri
+        self._byte_fotogramma = larghezza * altezza * 4
+        self._inizio_dati = _inizio_dati(self._numero, lunghezza_parametri)
+
+    def __len__(self) -> int:
+        return self._numero
+
+    def _posizione_voce(self, numero: int) -> int:
+        if not 0 <= numero < self._numero:
+            raise IndexError(f"Fotogramma inesistente: {numero}")
+        return self._inizio_indice + numero * _VOCE.size
+
+    def presente(self, numero: int) -> bool:
+        """
+        :param numero: numero del fotogramma, a partire da 0
+        :returns: True se il fotogramma è già stato scritto
+        """
+        return self._mappa[self._posizione_voce(numero)] == 1
+
+    def mancanti(self) -> List[int]:
+        """
+        :returns: i numeri dei fotogrammi non ancora scritti, in ordine
+        """
+        return [numero for numero in range(self._numero)
+                if not self.presente(numero)]
+
+    def scrivi(self, numero: int, immagine: Immagine):
+        """
+        Scrive un fotogramma nell'archivio. La voce dell'indice viene
+        aggiornata solo dopo aver scritto i pixel, per cui un fotogramma
+        interrotto a metà risulta ancora mancante.
+
+        :param numero: numero del fotogramma, a partire da 0
+        :param immagine: il fotogramma, delle dimensioni dell'archivio
+        """
+        posizione_voce = self._posizione_voce(numero)
+        if immagine.get_dimensioni() != self.dimensioni:
+            raise ValueError(f"Il fotogramma {numero} è grande "
+                             f"{immagine.get_dimensioni()} invece di "
+                             f"{self.dimensioni}")
+        img = immagine.get_image()
+        if img.mode != "RGBA":
+            img = img.convert("RGBA")
+        inizio = self._inizio_dati + numero * self._byte_fotogramma
+        self._mappa[inizio:inizio + self._byte_fotogramma] = img.tobytes()
+        _VOCE.pack_into(self._mappa, posizione_voce, 1,
+                        *immagine.get_punto_riferimento())
+
+    def leggi(self, numero: int) -> Immagine:
+        """
+        Legge un fotogramma senza copiarne i pixel. L'immagine ritornata non
+        va modificata e non va più usata dopo aver chiuso l'archivio.
+
+        :param numero: numero del fotogramma, a partire da 0
+        :returns: il fotogramma
+        """
+        stato, rif_x, rif_y = _VOCE.unpack_from(self._mappa,
+                                                self._posizione_voce(numero))
+        if stato != 1:
+            raise ValueError(f"Il fotogramma {numero} non è ancora stato "
+                             f"scritto")
+        inizio = self._inizio_dati + numero * self._byte_fotogramma
+        pixel = memoryview(self._mappa)[inizio:inizio + self._byte_fotogramma]
+        img = ImageMod.frombuffer("RGBA", self.dimensioni, pixel, "raw",
+                                  "RGBA", 0, 1)
+        return Immagine(img, (rif_x, rif_y))
+
+    def fotogrammi(self) -> Iterator[Immagine]:
+        """
+        Legge, in ordine, tutti i fotogrammi (vedi leggi()).
+
+        :returns: un iteratore sui fotogrammi
+        """
+        for numero in range(self._numero):
+            yield self.leggi(numero)
+
+    def sincronizza(self):
+        """
+        Scrive su disco i fotogrammi scritti finora (ad esempio, per poter
+        riprendere il rendering anche dopo un'interruzione del sistema).
+        """
+        self._mappa.flush()
+
+    def chiudi(self):
+        """
+        Chiude l'archivio, scrivendo su disco i fotogrammi scritti. Tutte le
+        immagini lette dall'archivio devono essere già state eliminate.
+        """
+        if not self._mappa.closed:
+            self._mappa.flush()
+            self._mappa.close()
+
+    def __enter__(self) -> "ArchivioFotogrammi":
+        return self
+
+    def __exit__(self, *eccezione) -> None:
+        self.chiudi()
@@ -0,0 +1,208 @@
+"""
+Atlante degli orologi: tutte le immagini necessarie per comporre un orologio
+stile FFS a qualsiasi ora, disegnate una volta sola e salvate in un file.
+
+L'atlante contiene il quadrante e ogni posizione distinta delle lancette: 360
+per la lancetta delle ore (che avanza di mezzo grado al minuto), 60 per quella
+dei minuti e 60 per quella dei secondi. Il file viene letto tramite mmap, per
+cui le immagini vengono caricate in memoria dal sistema operativo solo quando
+servono e possono essere condivise tra più processi; comporre un orologio
+richiede sempre e solo di copiare il quadrante e sovrapporvi tre lancette,
+indipendentemente da quanto è complesso disegnarle.
+
+Uso:
+
+    costruisci_atlante("orologi.atlante")
+    with AtlanteOrologio("orologi.atlante") as atlante:
+        orologio = atlante.crea_orologio(4, 10, 45)
+"""
+import json
+import mmap
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image as ImageMod
+
+from esercizio_orologio import (
+    RAGGIO,
+    angolo_minuti,
+    angolo_ore,
+    crea_lancetta_minuti,
+    crea_lancetta_ore,
+    crea_quadrante
+)
+from esercizio_orologio_con_secondi import (
+    angolo_secondi,
+    crea_lancetta_secondi
+)
+from img_lib_v0_6 import Immagine, componi_molti, salva_immagine
+
+# Il file inizia con FIRMA, seguita dalla lunghezza dell'indice JSON (intero
+# senza segno a 32 bit, little endian), dall'indice e dai pixel RGBA di tutte
+# le immagini, uno dopo l'altro, a partire da un multiplo di ALLINEAMENTO.
+FIRMA = b"OROLOGI1"
+ALLINEAMENTO = 16
+
+# Per ogni immagine, l'indice memorizza (posizione dei pixel rispetto
+# all'inizio dei dati, larghezza, altezza, x e y del punto di riferimento).
+_Voce = Tuple[int, int, int, int, int]
+
+
+def costruisci_atlante(nome_file: str, raggio: int = RAGGIO):
+    """
+    Disegna il quadrante e tutte le posizioni delle lancette per il raggio
+    indicato e le salva nel file dell'atlante.
+
+    :param nome_file: il file in cui salvare l'atlante
+    :param raggio: raggio degli orologi in pixel
+    """
+    immagini = {
+        "quadrante": {"0": crea_quadrante(raggio)},
+        "ore": {str(angolo): crea_lancetta_ore(angolo, raggio)
+                for angolo in range(360)},
+        "minuti": {str(angolo): crea_lancetta_minuti(angolo, raggio)
+                   for angolo in range(0, 360, 6)},
+        "secondi": {str(angolo): crea_lancetta_secondi(angolo, raggio)
+                    for angolo in range(0, 360, 6)}
+    }
+    quadrante = immagini["quadrante"]["0"]
+    indice: Dict[str, Dict[str, _Voce]] = {}
+    posizione = 0
+    for gruppo, per_angolo in immagini.items():
+        indice[gruppo] = {}
+        for angolo, immagine in per_angolo.items():
+            _controlla_dentro_quadrante(immagine, quadrante)
+            larghezza, altezza = immagine.get_dimensioni()
+            indice[gruppo][angolo] = (posizione, larghezza, altezza,
+                                      *immagine.get_punto_riferimento())
+            posizione += larghezza * altezza * 4
+    intestazione = json.dumps({"raggio": raggio,
+                               "immagini": indice}).encode("utf-8")
+    with open(nome_file, "wb") as file:
+        file.write(FIRMA + struct.pack("<I", len(intestazione)) + intestazione)
+        file.write(b"\0" * (-file.tell() % ALLINEAMENTO))
+        for per_angolo in immagini.values():
+            for immagine in per_angolo.values():
+                file.write(immagine.get_image().tobytes())
+
+
+def _controlla_dentro_quadrante(lancetta: Immagine, quadrante: Immagine):
+    """
+    Verifica che una lancetta, con il perno al centro del quadrante, non
+    sporga dal quadrante: solo così comporla equivale a sovrapporla al
+    quadrante senza ingrandirlo.
+
+    :param lancetta: l'immagine della lancetta
+    :param quadrante: l'immagine del quadrante
+    """
+    x, y = _posizione(lancetta.get_punto_riferimento(),
+                      quadrante.get_punto_riferimento())
+    larghezza, altezza = lancetta.get_dimensioni()
+    larghezza_quadrante, altezza_quadrante = quadrante.get_dimensioni()
+    if (x < 0 or y < 0 or x + larghezza > larghezza_quadrante
+            or y + altezza > altezza_quadrante):
+        raise ValueError("Una lancetta sporge dal quadrante")
+
+
+def _posizione(rif: Tuple[int, int],
+               rif_quadrante: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Calcola dove incollare un'immagine sul quadrante in modo che il suo punto
+    di riferimento coincida con quello del quadrante.
+
+    :param rif: punto di riferimento dell'immagine
+    :param rif_quadrante: punto di riferimento del quadrante
+    :returns: la posizione dell'angolo in alto a sinistra dell'immagine
+    """
+    return (rif_quadrante[0] - rif[0], rif_quadrante[1] - rif[1])
+
+
+class AtlanteOrologio:
+    """
+    Atlante creato con costruisci_atlante(), aperto in lettura tramite mmap.
+    Le immagini dell'atlante non vengono copiate: le immagini Pillow usano
+    direttamente la memoria del file.
+    """
+
+    def __init__(self, nome_file: str) -> None:
+        with open(nome_file, "rb") as file:
+            self._mappa = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mappa[:len(FIRMA)] != FIRMA:
+            self._mappa.close()
+            raise ValueError(f"{nome_file} non è un atlante degli orologi")
+        inizio = len(FIRMA) + 4
+        (lunghezza,) = struct.unpack("<I", self._mappa[len(FIRMA):inizio])
+        intestazione = json.loads(self._mappa[inizio:inizio + lunghezza])
+        self.raggio: int = intestazione["raggio"]
+        inizio += lunghezza
+        self._dati = memoryview(self._mappa)[
+            inizio + -inizio % ALLINEAMENTO:]
+        immagini = intestazione["immagini"]
+        self._quadrante: Optional[Immagine] = self._immagine(
+            immagini["quadrante"]["0"])
+        self._lancette: Dict[str, List[Optional[Immagine]]] = {}
+        for gruppo in ("ore", "minuti", "secondi"):
+            self._lancette[gruppo] = [None] * 360
+            for angolo, voce in immagini[gruppo].items():
+                self._lancette[gruppo][int(angolo)] = self._immagine(voce)
+
+    def _immagine(self, voce: _Voce) -> Immagine:
+        posizione, larghezza, altezza, rif_x, rif_y = voce
+        pixel = self._dati[posizione:posizione + larghezza * altezza * 4]
+        img = ImageMod.frombuffer("RGBA", (larghezza, altezza), pixel, "raw",
+                                  "RGBA", 0, 1)
+        return Immagine(img, (rif_x, rif_y))
+
+    def _lancetta(self, gruppo: str, angolo: int) -> Immagine:
+        lancetta = self._lancette[gruppo][angolo % 360]
+        if lancetta is None:
+            raise ValueError(f"Angolo non presente nell'atlante: {angolo}")
+        return lancetta
+
+    def crea_orologio(self, ore: int, minuti: int,
+                      secondi: Optional[int] = None) -> Immagine:
+        """
+        Compone un orologio con le immagini dell'atlante. Il risultato è
+        identico a quello di esercizio_orologio.crea_orologio() (senza
+        secondi) o di esercizio_orologio_con_secondi.crea_orologio() (con i
+        secondi) per il raggio dell'atlante.
+
+        :param ore: l'ora indicata dall'orologio (formato 12h o 24h)
+        :param minuti: i minuti indicati dall'orologio
+        :param secondi: i secondi indicati dall'orologio, oppure None per un
+                        orologio senza la lancetta dei secondi
+        :returns: l'orologio
+        """
+        lancette = [self._lancetta("ore", angolo_ore(ore, minuti)),
+                    self._lancetta("minuti", angolo_minuti(minuti))]
+        if secondi is not None:
+            lancette.insert(
+                0, self._lancetta("secondi", angolo_secondi(secondi)))
+        quadrante = self._quadrante
+        if quadrante is None:
+            raise ValueError("L'atlante è stato chiuso")
+        return componi_molti(lancette, quadrante)
+
+    def chiudi(self):
+        """
+        Chiude il file dell'atlante. Le immagini ottenute con
+        crea_orologio() restano valide, quelle dell'atlante no.
+        """
+        # Prima vanno eliminate le immagini, che usano la memoria del file
+        self._quadrante = None
+        self._lancette = {}
+        self._dati.release()
+        self._mappa.close()
+
+    def __enter__(self) -> "AtlanteOrologio":
+        return self
+
+    def __exit__(self, *eccezione) -> None:
+        self.chiudi()
+
+
+if __name__ == "__main__":
+    costruisci_atlante("orologi.atlante")
+    with AtlanteOrologio("orologi.atlante") as atlante_orologi:
+        salva_immagine("orologio_atlante",
+                       atlante_orologi.crea_orologio(4, 10, 45))
@@ -0,0 +1,651 @@
+"""
+Benchmark per la libreria img_lib_v0_6 e per gli esercizi sull'orologio.
+
+La suite misura tempo e picco di memoria residente (compresi i pixel delle
+immagini, misurato in un processo separato) delle primitive della libreria a
+varie dimensioni, della costruzione del quadrante, degli orologi (con e senza
+secondi, singoli e in blocco) e dell'animazione; per i casi che creano
+orologi viene riportato anche il numero di orologi al secondo. I risultati
+possono essere salvati come baseline in un file JSON e confrontati con una
+baseline salvata in precedenza: il confronto fallisce se un caso è
+peggiorato oltre una soglia.
+
+Sono disponibili anche quattro benchmark specifici: il calcolo dell'offset
+dopo una rotazione (usato da ruota()) confrontato con l'implementazione
+originale che ruotava ogni pixel in Python, il tempo necessario per importare
+la libreria e gli esercizi, la memoria occupata dagli oggetti Immagine e la
+velocità e la dimensione dei file dei formati di salva_immagine().
+
+Uso:
+
+    python benchmark.py [--salva FILE] [--confronta FILE] [--soglia 0.2]
+                        [--ripetizioni 5] [--frame 10] [--rotazione]
+                        [--import] [--memoria] [--formati]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import json
+from math import cos, radians, sin
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from PIL.Image import Image
+
+from img_lib_v0_6 import (
+    Immagine,
+    _offset_dopo_rotazione,
+    _padding_centra_punto_rif,
+    affianca,
+    anello_radiale,
+    cambia_punto_riferimento,
+    cerchio,
+    componi,
+    disattiva_cache_rotazioni,
+    modalita_antialiasing,
+    modalita_pigra,
+    rettangolo,
+    ruota,
+    salva_immagine,
+    testo
+)
+
+# Le variazioni di memoria sono relative ad almeno 1 MiB: i casi più piccoli
+# non fanno crescere il picco di memoria residente (riutilizzano la memoria
+# già allocata dal processo), ma devono comunque poter peggiorare
+_MEMORIA_MINIMA = 1024 * 1024
+
+# Un orologio per ogni minuto di 12 ore, per i casi che creano molti orologi
+_ORARI = [(ore, minuti) for ore in range(12) for minuti in range(60)]
+
+
+def _ruota_punto_riferimento(punto: Tuple[int, int],
+                             gradi: int) -> Tuple[int, int]:
+    """
+    Copia di _ruota_punto() della versione 0.6 originale.
+
+    :param punto: il punto da ruotare
+    :param gradi: angolo di rotazione in senso antiorario
+    :returns: le nuove coordinate del punto ruotato
+    """
+    theta = radians(-gradi)
+    x, y = punto  # pylint: disable=invalid-name
+    return (round(x * cos(theta) - y * sin(theta)),
+            round(x * sin(theta) + y * cos(theta)))
+
+
+def _offset_riferimento(img: Image, gradi: int) -> Tuple[int, int]:
+    """
+    Implementazione originale (per pixel, in Python puro) di
+    _offset_dopo_rotazione(), usata come riferimento.
+
+    :param img: immagine da ruotare
+    :param gradi: angolo di rotazione
+    :returns: coordinate (x, y) del pixel non trasparente più estremo in alto a
+              sinistra dopo la rotazione
+    """
+    pixel_coords = [(w, h) for h in range(img.height)
+                    for w in range(img.width)]
+    translated_coords = [_ruota_punto_riferimento(c, gradi)
+                         for c in pixel_coords]
+    alpha_values = img.getdata(3)
+    filled_coords = list(filter(lambda alpha_c: alpha_c[1] != 0,
+                                zip(translated_coords, alpha_values)))
+    min_x = min([alpha_c[0][0] for alpha_c in filled_coords])
+    min_y = min([alpha_c[0][1] for alpha_c in filled_coords])
+    return (min_x, min_y)
+
+
+def cronometra(funzione: Callable[[], Any], ripetizioni: int = 3) -> float:
+    """
+    Esegue una funzione più volte e ritorna il tempo migliore.
+
+    :param funzione: funzione senza parametri da cronometrare
+    :param ripetizioni: numero di esecuzioni
+    :returns: il tempo minimo di esecuzione, in secondi
+    """
+    migliore = float("inf")
+    for _ in range(ripetizioni):
+        inizio = perf_counter()
+        funzione()
+        migliore = min(migliore, perf_counter() - inizio)
+    return migliore
+
+
+def _lancetta(raggio: int) -> Image:
+    """
+    Crea una lancetta come quelle dell'orologio, già pronta per essere ruotata
+    (con il padding che ruota() aggiunge attorno al punto di riferimento).
+
+    :param raggio: raggio dell'orologio
+    :returns: l'immagine Pillow con il padding
+    """
+    lancetta = ruota(affianca(
+        cambia_punto_riferimento(
+            rettangolo(raggio * 20 // 100, raggio * 10 // 100, "black"),
+            "right", "middle"),
+        cambia_punto_riferimento(
+            rettangolo(raggio * 85 // 100, raggio * 10 // 100, "black"),
+            "left", "middle")), 90)
+    top, bottom, left, right = _padding_centra_punto_rif(lancetta)
+    return lancetta.get_image().crop(
+        (-left, -top, lancetta.get_image().width + right,
+         lancetta.get_image().height + bottom))
+
+
+def benchmark_offset_rotazione():
+    """
+    Confronta _offset_dopo_rotazione() con l'implementazione originale, su
+    una lancetta e su un cerchio di varie dimensioni.
+    """
+    print(f"{'immagine':<22}{'originale (s)':>15}{'numpy (s)':>12}"
+          f"{'speedup':>10}")
+    for raggio in (50, 150, 300):
+        casi = {
+            f"lancetta r={raggio}": _lancetta(raggio),
+            f"cerchio r={raggio}": cerchio(raggio, "black").get_image()
+        }
+        for nome, img in casi.items():
+            for gradi in (-37, 90, 173):
+                assert _offset_dopo_rotazione(img, gradi) == \
+                    _offset_riferimento(img, gradi), (nome, gradi)
+            originale = cronometra(lambda: _offset_riferimento(img, -37), 1)
+            veloce = cronometra(lambda: _offset_dopo_rotazione(img, -37))
+            print(f"{nome:<22}{originale:>15.4f}{veloce:>12.5f}"
+                  f"{originale / veloce:>9.0f}x")
+
+
+def _tempo_import(modulo: str, cartella: str) -> float:
+    """
+    Importa un modulo in un nuovo interprete Python, in modo che nessun modulo
+    sia già stato importato, e misura quanto tempo richiede l'import.
+
+    :param modulo: nome del modulo da importare
+    :param cartella: cartella di lavoro dell'interprete
+    :returns: il tempo di import, in secondi
+    """
+    codice = ("from time import perf_counter\n"
+              "inizio = perf_counter()\n"
+              f"import {modulo}\n"
+              "print(perf_counter() - inizio)")
+    percorso = os.path.dirname(os.path.abspath(__file__))
+    ambiente = dict(os.environ, PYTHONPATH=percorso)
+    risultato = subprocess.run([sys.executable, "-c", codice], cwd=cartella,
+                               env=ambiente, capture_output=True, text=True,
+                               check=True)
+    return float(risultato.stdout)
+
+
+def benchmark_import(ripetizioni: int = 5):
+    """
+    Misura il tempo di import della libreria e degli esercizi, verificando che
+    importarli non scriva alcun file.
+
+    :param ripetizioni: numero di misure per modulo (viene riportata la
+                        migliore)
+    """
+    print(f"{'modulo':<36}{'import (ms)':>12}")
+    for modulo in ("img_lib_v0_6", "esercizio_orologio",
+                   "esercizio_orologio_con_secondi",
+                   "animazione_orologio_con_secondi"):
+        with TemporaryDirectory() as cartella:
+            tempo = min(_tempo_import(modulo, cartella)
+                        for _ in range(ripetizioni))
+            assert not os.listdir(cartella), (modulo, os.listdir(cartella))
+        print(f"{modulo:<36}{tempo * 1000:>12.1f}")
+
+
+def benchmark_memoria_immagini(numero: int = 100_000):
+    """
+    Misura la memoria occupata da molti oggetti Immagine che condividono la
+    stessa immagine Pillow (come nelle cache o nelle scene pigre) e il tempo
+    necessario per crearli.
+
+    :param numero: numero di oggetti da creare per ogni caso
+    """
+    immagine = rettangolo(10, 10, "black")
+    img = immagine.get_image()
+    with modalita_pigra():
+        pigra = rettangolo(10, 10, "black")
+    casi: Dict[str, Callable[[], Any]] = {
+        "Immagine(img)": lambda: Immagine(img),
+        "con_punto_riferimento()":
+            lambda: immagine.con_punto_riferimento((0, 0)),
+        "cambia_punto_riferimento()":
+            lambda: cambia_punto_riferimento(immagine, "left", "top"),
+        "con_punto_riferimento() pigra":
+            lambda: pigra.con_punto_riferimento((0, 0))
+    }
+    print(f"{'caso':<32}{'byte/oggetto':>14}{'tempo (us)':>12}")
+    for nome, caso in casi.items():
+        tracemalloc.start()
+        oggetti = [caso() for _ in range(numero)]
+        occupati, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del oggetti
+        tempo = cronometra_chiamata(caso)
+        print(f"{nome:<32}{occupati / numero:>14.1f}{tempo * 1e6:>12.2f}")
+
+
+def benchmark_formati(raggi: Tuple[int, ...] = (150, 300)):
+    """
+    Misura, per ogni formato e opzione di salva_immagine(), il tempo
+    necessario per salvare un orologio in memoria e la dimensione del file.
+
+    :param raggi: raggi degli orologi da salvare
+    """
+    # pylint: disable=import-outside-toplevel
+    from esercizio_orologio_con_secondi import crea_orologio
+    varianti: Dict[str, Dict[str, Any]] = {
+        "png": {},
+        "png compressione=1": {"compressione": 1},
+        "png colori=256": {"colori": 256},
+        "png colori=256 compressione=1": {"colori": 256, "compressione": 1},
+        "webp": {"formato": "webp"},
+        "webp compressione=0": {"formato": "webp", "compressione": 0},
+        "qoi": {"formato": "qoi"},
+        "rgba": {"formato": "rgba"}
+    }
+    print(f"{'formato':<34}{'raggio':>7}{'tempo (ms)':>12}"
+          f"{'immagini/s':>12}{'byte':>9}")
+    for raggio in raggi:
+        orologio = crea_orologio(4, 10, 45, raggio)
+        for nome, opzioni in varianti.items():
+            def salva(opzioni=opzioni) -> BytesIO:
+                file = BytesIO()
+                salva_immagine(file, orologio, **opzioni)
+                return file
+            tempo = cronometra_chiamata(salva)
+            print(f"{nome:<34}{raggio:>7}{tempo * 1000:>12.2f}"
+                  f"{1 / tempo:>12.0f}{len(salva().getvalue()):>9}")
+
+
+def cronometra_chiamata(funzione: Callable[[], Any], ripetizioni: int = 5,
+                        durata_minima: float = 0.02) -> float:
+    """
+    Misura il tempo di una singola esecuzione di una funzione. Le funzioni
+    molto veloci vengono eseguite più volte di seguito per ogni misura, in
+    modo che ogni misura duri almeno `durata_minima` secondi e sia quindi
+    poco sensibile al rumore.
+
+    :param funzione: funzione senza parametri da cronometrare
+    :param ripetizioni: numero di misure (viene riportata la migliore)
+    :param durata_minima: durata minima di ogni misura, in secondi
+    :returns: il tempo di una esecuzione, in secondi
+    """
+    volte = 1
+    while True:
+        def serie(volte=volte):
+            for _ in range(volte):
+                funzione()
+        if cronometra(serie, 1) >= durata_minima or volte >= 10000:
+            break
+        volte *= 10
+    return cronometra(serie, ripetizioni) / volte
+
+
+def misura_memoria(nome: str, frame: int = 10) -> int:
+    """
+    Esegue un caso della suite in un nuovo processo e ritorna di quanto il
+    caso fa crescere il picco di memoria residente (RSS) del processo.
+    A differenza di tracemalloc, il picco comprende anche la memoria allocata
+    da Pillow per i pixel, che è quasi tutta la memoria usata dai casi.
+    Il caso viene eseguito una sola volta, a freddo (comprese, ad esempio, la
+    costruzione del quadrante e delle altre cache).
+
+    :param nome: nome del caso (vedi casi_benchmark())
+    :param frame: numero di frame dell'animazione
+    :returns: la crescita del picco di memoria, in byte
+    """
+    return misura_picco_memoria(_prepara_caso, nome, frame)
+
+
+def misura_picco_memoria(prepara: Callable[..., Callable[[], Any]],
+                         *argomenti: Any) -> int:
+    """
+    Esegue una funzione in un nuovo processo e ritorna di quanto fa crescere
+    il picco di memoria residente del processo.
+    Su Linux il picco viene azzerato subito prima di eseguire la funzione,
+    per cui non comprende la memoria usata in precedenza dal processo (né
+    quella del processo da cui è stato creato, che ru_maxrss invece eredita).
+
+    :param prepara: funzione (definita al primo livello di un modulo) che,
+                    chiamata con gli argomenti nel nuovo processo, ritorna la
+                    funzione da misurare
+    :param argomenti: argomenti di prepara
+    :returns: la crescita del picco di memoria, in byte
+    """
+    contesto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=contesto) as pool:
+        return pool.submit(_picco_memoria, prepara, argomenti).result()
+
+
+def _picco_memoria(prepara: Callable[..., Callable[[], Any]],
+                   argomenti: Tuple[Any, ...]) -> int:
+    """
+    Misura la funzione nel processo creato da misura_picco_memoria().
+
+    :param prepara: funzione che ritorna la funzione da misurare
+    :param argomenti: argomenti di prepara
+    :returns: la crescita del picco di memoria residente, in byte
+    """
+    # La libreria importa NumPy e i formati di Pillow solo quando servono:
+    # vengono importati prima, per non misurarli come memoria della funzione
+    # pylint: disable=import-outside-toplevel,unused-import
+    import numpy  # noqa: F401
+    from PIL import Image as ImageMod
+    ImageMod.init()
+    funzione = prepara(*argomenti)
+    prima = _azzera_picco_rss()
+    funzione()
+    return max(_picco_rss() - prima, 0)
+
+
+def _prepara_caso(nome: str, frame: int) -> Callable[[], Any]:
+    """
+    :param nome: nome del caso
+    :param frame: numero di frame dell'animazione
+    :returns: il caso della suite da misurare
+    """
+    return casi_benchmark(frame)[nome]
+
+
+def _azzera_picco_rss() -> int:
+    """
+    Porta il picco di memoria residente del processo corrente alla memoria
+    residente attuale, dove è possibile (su Linux, scrivendo 5 in
+    /proc/self/clear_refs).
+
+    :returns: il picco di memoria residente dopo l'azzeramento, in byte
+    """
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as file:
+            file.write("5")
+    except OSError:
+        pass
+    return _picco_rss()
+
+
+def _picco_rss() -> int:
+    """
+    :returns: il picco di memoria residente del processo corrente, in byte
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as file:
+            for riga in file:
+                if riga.startswith("VmHWM:"):
+                    # Il valore è in kB
+                    return int(riga.split()[1]) * 1024
+    except OSError:
+        pass
+    # Fuori da Linux: disponibile solo sui sistemi Unix
+    import resource  # pylint: disable=import-outside-toplevel
+    picco = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux misura ru_maxrss in KiB, macOS in byte
+    return picco if sys.platform == "darwin" else picco * 1024
+
+
+def _senza_cache(funzione: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Ritorna una funzione che esegue quella indicata e poi disattiva la cache
+    delle rotazioni, in modo che ogni caso parta dalle stesse condizioni
+    anche se un caso attiva la cache.
+
+    :param funzione: funzione senza parametri
+    :returns: la funzione modificata
+    """
+    def eseguita():
+        try:
+            funzione()
+        finally:
+            disattiva_cache_rotazioni()
+    return eseguita
+
+
+def casi_benchmark(frame: int = 10) -> Dict[str, Callable[[], Any]]:
+    """
+    Prepara i casi della suite di benchmark: le primitive della libreria a
+    varie dimensioni, il quadrante, gli orologi (anche con l'antialiasing) e
+    l'animazione.
+
+    :param frame: numero di frame dell'animazione
+    :returns: un dizionario che associa al nome di ogni caso una funzione
+              senza parametri che lo esegue
+    """
+    # pylint: disable=import-outside-toplevel
+    from esercizio_orologio import (crea_orologio as crea_orologio_minuti,
+                                    crea_orologi as crea_orologi_minuti,
+                                    crea_quadrante, svuota_cache_quadrante)
+    from esercizio_orologio_con_secondi import crea_orologio, crea_orologi
+    from animazione_orologio_con_secondi import crea_animazione_orologio
+
+    casi: Dict[str, Callable[[], Any]] = {}
+    for raggio in (50, 150, 300):
+        lancetta = cambia_punto_riferimento(
+            rettangolo(raggio, raggio // 10, "black"), "left", "middle")
+        disco = cerchio(raggio, "white")
+        casi[f"rettangolo r={raggio}"] = (
+            lambda r=raggio: rettangolo(r, r // 10, "black"))
+        casi[f"cerchio r={raggio}"] = lambda r=raggio: cerchio(r, "white")
+        casi[f"testo punti={raggio // 5}"] = (
+            lambda r=raggio: testo("12:34:56", r // 5, "black"))
+        casi[f"ruota r={raggio}"] = lambda l=lancetta: ruota(l, -37)
+        casi[f"componi r={raggio}"] = (
+            lambda l=lancetta, d=disco: componi(l, d))
+        casi[f"affianca r={raggio}"] = lambda d=disco: affianca(d, d)
+        casi[f"anello_radiale r={raggio}"] = (
+            lambda l=lancetta: anello_radiale(l, 60))
+
+    def quadrante():
+        svuota_cache_quadrante()
+        crea_quadrante()
+
+    def con_antialiasing(funzione: Callable[[], Any]) -> Callable[[], Any]:
+        def eseguita():
+            with modalita_antialiasing():
+                return funzione()
+        return eseguita
+
+    def animazione():
+        with TemporaryDirectory() as cartella:
+            corrente = os.getcwd()
+            os.chdir(cartella)
+            try:
+                crea_animazione_orologio(4, 10, frame)
+            finally:
+                os.chdir(corrente)
+
+    casi["crea_quadrante"] = quadrante
+    casi["crea_orologio ore e minuti"] = lambda: crea_orologio_minuti(4, 10)
+    casi["crea_orologio con secondi"] = lambda: crea_orologio(4, 10, 45)
+    casi["crea_quadrante antialiasing"] = con_antialiasing(quadrante)
+    casi["crea_orologio con secondi antialiasing"] = con_antialiasing(
+        lambda: crea_orologio(4, 10, 45))
+    casi[f"crea_orologi ore e minuti n={len(_ORARI)}"] = (
+        lambda: _consuma(crea_orologi_minuti(_ORARI)))
+    casi[f"crea_orologi con secondi n={len(_ORARI)}"] = (
+        lambda: _consuma(crea_orologi(
+            (ore, minuti, minuti) for ore, minuti in _ORARI)))
+    casi[f"crea_animazione_orologio frame={frame}"] = animazione
+    return {nome: _senza_cache(caso) for nome, caso in casi.items()}
+
+
+def orologi_per_caso(frame: int = 10) -> Dict[str, int]:
+    """
+    :param frame: numero di frame dell'animazione
+    :returns: per ogni caso della suite che crea orologi, quanti ne crea
+    """
+    return {"crea_orologio ore e minuti": 1,
+            "crea_orologio con secondi": 1,
+            "crea_orologio con secondi antialiasing": 1,
+            f"crea_orologi ore e minuti n={len(_ORARI)}": len(_ORARI),
+            f"crea_orologi con secondi n={len(_ORARI)}": len(_ORARI),
+            f"crea_animazione_orologio frame={frame}": frame}
+
+
+def _consuma(orologi: Iterable[Any]):
+    """
+    Consuma un iteratore di orologi senza tenerli in memoria.
+    """
+    for _ in orologi:
+        pass
+
+
+def esegui_suite(ripetizioni: int = 5,
+                 frame: int = 10) -> Dict[str, Dict[str, float]]:
+    """
+    Esegue la suite di benchmark, stampando i risultati man mano.
+
+    :param ripetizioni: numero di esecuzioni di ogni caso per misurarne il
+                        tempo (viene riportato il migliore)
+    :param frame: numero di frame dell'animazione
+    :returns: un dizionario che associa al nome di ogni caso il tempo in
+              secondi ("tempo"), la crescita del picco di memoria residente
+              in byte ("memoria_rss", vedi misura_memoria()) e,
+              se il caso crea orologi, gli orologi al secondo
+              ("orologi_al_secondo")
+    """
+    risultati: Dict[str, Dict[str, float]] = {}
+    orologi = orologi_per_caso(frame)
+    print(f"{'caso':<38}{'tempo (ms)':>12}{'memoria (KiB)':>15}"
+          f"{'orologi/s':>11}")
+    for nome, caso in casi_benchmark(frame).items():
+        tempo = cronometra_chiamata(caso, ripetizioni)
+        memoria = misura_memoria(nome, frame)
+        risultati[nome] = {"tempo": tempo, "memoria_rss": memoria}
+        riga = f"{nome:<38}{tempo * 1000:>12.2f}{memoria / 1024:>15.1f}"
+        if nome in orologi:
+            risultati[nome]["orologi_al_secondo"] = orologi[nome] / tempo
+            riga += f"{orologi[nome] / tempo:>11.0f}"
+        print(riga)
+    return risultati
+
+
+def salva_baseline(risultati: Dict[str, Dict[str, float]], nome_file: str):
+    """
+    Salva i risultati della suite come baseline in un file JSON.
+
+    :param risultati: i risultati di esegui_suite()
+    :param nome_file: il file in cui salvare la baseline
+    """
+    baseline = {"python": platform.python_version(),
+                "piattaforma": platform.platform(),
+                "casi": risultati}
+    with open(nome_file, "w", encoding="utf-8") as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+
+def carica_baseline(nome_file: str) -> Dict[str, Dict[str, float]]:
+    """
+    Carica una baseline salvata con salva_baseline().
+
+    :param nome_file: il file della baseline
+    :returns: i risultati memorizzati nella baseline
+    """
+    with open(nome_file, encoding="utf-8") as file:
+        return json.load(file)["casi"]
+
+
+def confronta(risultati: Dict[str, Dict[str, float]],
+              baseline: Dict[str, Dict[str, float]],
+              soglia: float = 0.2) -> List[str]:
+    """
+    Confronta i risultati della suite con una baseline, stampando le
+    variazioni percentuali dei casi presenti in entrambi.
+
+    :param risultati: i risultati di esegui_suite()
+    :param baseline: i risultati di riferimento
+    :param soglia: peggioramento relativo tollerato (0.2 significa 20%)
+    :returns: la descrizione di ogni peggioramento oltre la soglia
+    """
+    regressioni = []
+    print(f"{'caso':<38}{'tempo':>10}{'memoria':>10}")
+    for nome, misure in risultati.items():
+        if nome not in baseline:
+            continue
+        variazioni = {}
+        for metrica in ("tempo", "memoria_rss"):
+            riferimento = baseline[nome][metrica]
+            if metrica == "memoria_rss":
+                variazioni[metrica] = ((misure[metrica] - riferimento)
+                                       / max(riferimento, _MEMORIA_MINIMA))
+            else:
+                variazioni[metrica] = (misure[metrica] / riferimento - 1
+                                       if riferimento > 0 else 0.0)
+            if variazioni[metrica] > soglia:
+                regressioni.append(f"{nome}: {metrica} "
+                                   f"+{variazioni[metrica]:.0%}")
+        print(f"{nome:<38}{variazioni['tempo']:>+10.0%}"
+              f"{variazioni['memoria_rss']:>+10.0%}")
+    return regressioni
+
+
+def main(argomenti: Optional[List[str]] = None) -> int:
+    """
+    Esegue i benchmark richiesti dalla riga di comando.
+
+    :param argomenti: argomenti della riga di comando (se non indicati,
+                      quelli di sys.argv)
+    :returns: 1 se il confronto con la baseline ha rilevato regressioni,
+              altrimenti 0
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--salva", metavar="FILE",
+                        help="salva i risultati come baseline JSON")
+    parser.add_argument("--confronta", metavar="FILE",
+                        help="confronta i risultati con una baseline JSON")
+    parser.add_argument("--soglia", type=float, default=0.2,
+                        help="peggioramento tollerato (default: 0.2)")
+    parser.add_argument("--ripetizioni", type=int, default=5,
+                        help="esecuzioni per caso (default: 5)")
+    parser.add_argument("--frame", type=int, default=10,
+                        help="frame dell'animazione (default: 10)")
+    parser.add_argument("--rotazione", action="store_true",
+                        help="esegue anche il benchmark dell'offset dopo "
+                             "una rotazione")
+    parser.add_argument("--import", dest="importazione", action="store_true",
+                        help="esegue anche il benchmark degli import")
+    parser.add_argument("--memoria", action="store_true",
+                        help="esegue anche il benchmark della memoria "
+                             "occupata dalle immagini")
+    parser.add_argument("--formati", action="store_true",
+                        help="esegue anche il benchmark dei formati di "
+                             "salva_immagine()")
+    opzioni = parser.parse_args(argomenti)
+
+    if opzioni.rotazione:
+        benchmark_offset_rotazione()
+        print()
+    if opzioni.importazione:
+        benchmark_import()
+        print()
+    if opzioni.memoria:
+        benchmark_memoria_immagini()
+        print()
+    if opzioni.formati:
+        benchmark_formati()
+        print()
+    risultati = esegui_suite(opzioni.ripetizioni, opzioni.frame)
+    if opzioni.salva:
+        salva_baseline(risultati, opzioni.salva)
+    if opzioni.confronta:
+        print()
+        regressioni = confronta(risultati, carica_baseline(opzioni.confronta),
+                                opzioni.soglia)
+        if regressioni:
+            print("\nRegressioni oltre la soglia:")
+            print("\n".join(regressioni))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,18 +4,25 @@ FFS che indica ore e minuti.
 In particolare le funzioni permettono di:
 - creare lo sfondo del quadrante che evidenzia i minuti e i cinque minuti
 - creare le lancette delle ore e dei minuti
-- creare un orologio stile FFS con indicazioni ore e minuti
+- creare un orologio stile FFS con indicazioni ore e minuti, di qualsiasi
+  raggio o in più dimensioni alla volta
+- creare molti orologi (ad esempio uno per minuto) condividendo il lavoro
 """
+from typing import Dict, Iterable, Iterator, Tuple
+
 from img_lib_v0_6 import(
     Immagine, 
     affianca, 
+    anello_radiale,
     cerchio, 
-    immagine_vuota, 
     rettangolo, 
-    ruota, 
+    rettangolo_ruotato,
     sovrapponi, 
     cambia_punto_riferimento, 
     componi, 
+    componi_molti,
+    fattore_antialiasing,
+    modalita_pigra,
     salva_immagine,
     visualizza_immagine
 )
@@ -25,35 +32,68 @@ NERO = (0, 0, 0)
 BIANCO = (255, 255, 255)
 GRIGIO = (84, 84, 84)
 
+# Quadranti già costruiti, associati al raggio, ai colori usati e al fattore
+# di antialiasing
+_cache_quadrante: Dict[Tuple, Immagine] = {}
+
+
+def frazione_raggio(raggio: int, percentuale: int) -> int:
+    """
+    Calcola una misura dell'orologio come percentuale del raggio, in pixel.
+    La misura è sempre di almeno un pixel, anche per orologi molto piccoli
+    
+    :param raggio: raggio dell'orologio in pixel
+    :param percentuale: percentuale del raggio
+    :returns: la misura in pixel
+    """
+    return max(1, raggio * percentuale // 100)
+
 
-def crea_sfondo() -> Immagine:
+def crea_sfondo(raggio: int = RAGGIO) -> Immagine:
     """
     Crea lo sfondo del quadrante
     
+    :param raggio: raggio dell'orologio in pixel
     :returns: il cerchio del quadrante con un bordo grigio
     """
-    sfondo_grigio = cerchio(RAGGIO, GRIGIO)
-    sfondo_bianco = cerchio((RAGGIO * 95 // 100), BIANCO)
+    sfondo_grigio = cerchio(raggio, GRIGIO)
+    sfondo_bianco = cerchio(frazione_raggio(raggio, 95), BIANCO)
     return sovrapponi(sfondo_bianco, sfondo_grigio)
 
 
-def crea_lancetta_minuti(angolo: int) -> Immagine:
+def crea_lancetta(testa: int, coda: int, altezza: int, angolo: int,
+                  colore=NERO) -> Immagine:
+    """
+    Crea una lancetta nera ruotata, con il punto di riferimento nel perno.
+    La lancetta viene disegnata direttamente ruotata, senza ruotare pixel:
+    rispetto a ruotare l'immagine della lancetta orizzontale, le dimensioni
+    e il punto di riferimento possono differire di un pixel e i bordi di
+    qualche pixel.
+    
+    :param testa: lunghezza della parte che sporge oltre il perno
+    :param coda: lunghezza della parte che indica l'ora
+    :param altezza: spessore della lancetta
+    :param angolo: angolo di apertura della lancetta rispetto alla posizione 0
+    :param colore: colore della lancetta
+    :returns: una lancetta ruotata
+    """
+    # In posizione 0 la lancetta è verticale: da orizzontale, va ruotata di
+    # 90 gradi in senso antiorario e di angolo gradi in senso orario
+    return rettangolo_ruotato(testa + coda, altezza, (testa, altezza // 2), 
+                              90 - angolo, colore)
+
+
+def crea_lancetta_minuti(angolo: int, raggio: int = RAGGIO) -> Immagine:
     """
     Crea la lancetta dei minuti in posizione ore 0
     
     :param angolo: angolo di apertura della lancetta
+    :param raggio: raggio dell'orologio in pixel
     :returns: una lancetta ruotata
     """
-    altezza_lancetta = RAGGIO * 10 // 100
-    lancetta_testa = cambia_punto_riferimento(
-        (rettangolo(RAGGIO * 20 // 100, altezza_lancetta, NERO)), 
-        "right", "middle")
-    lancetta_coda = cambia_punto_riferimento(
-        (rettangolo(RAGGIO * 85 // 100, altezza_lancetta, NERO)), 
-        "left", "middle")
-    lancetta_orizzontale = affianca(lancetta_testa, lancetta_coda)
-    lancetta_verticale = ruota(lancetta_orizzontale, 90)
-    return ruota(lancetta_verticale, -(angolo))
+    return crea_lancetta(frazione_raggio(raggio, 20),
+                         frazione_raggio(raggio, 85),
+                         frazione_raggio(raggio, 10), angolo)
 
 
 def angolo_minuti(minuti: int) -> int:
@@ -66,23 +106,17 @@ def angolo_minuti(minuti: int) -> int:
     return minuti * 6
 
 
-def crea_lancetta_ore(angolo: int) -> Immagine:
+def crea_lancetta_ore(angolo: int, raggio: int = RAGGIO) -> Immagine:
     """
     Crea l'immagine di una lancetta in posizione 0
     
     :params angolo: angolo di rotazione rispetto alla posizione 0
+    :param raggio: raggio dell'orologio in pixel
     :returns: una lancetta ruotata
     """
-    altezza_lancetta = RAGGIO * 12 // 100
-    lancetta_testa = cambia_punto_riferimento(
-        (rettangolo(RAGGIO * 20 // 100, altezza_lancetta, NERO)), 
-        "right", "middle")
-    lancetta_coda = cambia_punto_riferimento(
-        (rettangolo(RAGGIO * 60 // 100, altezza_lancetta, NERO)), 
-        "left", "middle")
-    lancetta_orizzontale = affianca(lancetta_testa, lancetta_coda)
-    lancetta_verticale = ruota(lancetta_orizzontale, 90)
-    return ruota(lancetta_verticale, -(angolo))
+    return crea_lancetta(frazione_raggio(raggio, 20),
+                         frazione_raggio(raggio, 60),
+                         frazione_raggio(raggio, 12), angolo)
 
 
 def angolo_ore(ore: int, minuti: int) -> int:
@@ -97,74 +131,115 @@ def angolo_ore(ore: int, minuti: int) -> int:
     return ((ore * 30) % 360) + (angolo_minuti(minuti))//12
 
 
-def crea_tacca_minuti() -> Immagine:
+def crea_tacca_minuti(raggio: int = RAGGIO) -> Immagine:
     """
     Crea la singola tacca che indica i minuti
     
+    :param raggio: raggio dell'orologio in pixel
     :returns: una singola tacca indicante i minuti
     """
-    altezza_tacca = RAGGIO * 3 // 100
-    testa_tacca = rettangolo(RAGGIO * 82 // 100, altezza_tacca, BIANCO)
-    coda_tacca = rettangolo(RAGGIO * 8 // 100, altezza_tacca, NERO)
+    altezza_tacca = frazione_raggio(raggio, 3)
+    testa_tacca = rettangolo(frazione_raggio(raggio, 82), altezza_tacca,
+                             BIANCO)
+    coda_tacca = rettangolo(frazione_raggio(raggio, 8), altezza_tacca, NERO)
     return cambia_punto_riferimento(
         affianca(testa_tacca, coda_tacca), "left", "middle")
 
 
-def crea_tacche_minuti() -> Immagine:
+def crea_tacche_minuti(raggio: int = RAGGIO) -> Immagine:
     """
     Crea le tacche circolari indicanti i minuti
     
+    :param raggio: raggio dell'orologio in pixel
     :returns: le tacche circolari indicanti i minuti
     """
-    gradi = 6
-    quadrante_prec = immagine_vuota()
-    for tacca in range(0, 360, gradi):
-        tacca_quadrante = ruota(crea_tacca_minuti(), tacca)
-        quadrante_minuti = componi(quadrante_prec, tacca_quadrante)
-        quadrante_prec = quadrante_minuti
-    return quadrante_minuti
+    # La tacca è pigra: le 60 copie vengono disegnate direttamente ruotate
+    with modalita_pigra():
+        tacca = crea_tacca_minuti(raggio)
+    return anello_radiale(tacca, 60)
 
 
-def crea_tacca_cinque_minuti() -> Immagine:
+def crea_tacca_cinque_minuti(raggio: int = RAGGIO) -> Immagine:
     """
     Crea la singola tacca che indica i cinque minuti
     
+    :param raggio: raggio dell'orologio in pixel
     :returns: una singola tacca indicante i cinque minuti
     """
-    altezza_tacca = RAGGIO * 8 // 100
-    testa_tacca = rettangolo(RAGGIO * 70 // 100, altezza_tacca, BIANCO)
-    coda_tacca = rettangolo(RAGGIO * 20 // 100, altezza_tacca, NERO)
+    altezza_tacca = frazione_raggio(raggio, 8)
+    testa_tacca = rettangolo(frazione_raggio(raggio, 70), altezza_tacca,
+                             BIANCO)
+    coda_tacca = rettangolo(frazione_raggio(raggio, 20), altezza_tacca, NERO)
     return cambia_punto_riferimento(
         affianca(testa_tacca, coda_tacca), "left", "middle")
 
 
-def crea_tacche_cinque_minuti() -> Immagine:
+def crea_tacche_cinque_minuti(raggio: int = RAGGIO) -> Immagine:
     """
     Crea le tacche circolari indicanti i cinque minuti
     
+    :param raggio: raggio dell'orologio in pixel
     :returns: le tacche circolari indicanti i cinque minuti
     """
-    gradi = 30
-    quadrante_prec = immagine_vuota()
-    for tacca in range(0, 360, gradi):
-        tacca_quadrante = ruota(crea_tacca_cinque_minuti(), tacca)
-        quadrante_cinque_minuti = componi(quadrante_prec, tacca_quadrante)
-        quadrante_prec = quadrante_cinque_minuti
-    return quadrante_cinque_minuti
+    # La tacca è pigra: le 12 copie vengono disegnate direttamente ruotate
+    with modalita_pigra():
+        tacca = crea_tacca_cinque_minuti(raggio)
+    return anello_radiale(tacca, 12)
+
+
+def crea_quadrante(raggio: int = RAGGIO) -> Immagine:
+    """
+    Crea il quadrante dell'orologio con tacche minuti e cinque minuti.
+    Il quadrante viene costruito una sola volta per ogni raggio, colori e
+    fattore di antialiasing e poi riutilizzato, anche alternando raggi
+    diversi.
+    
+    :param raggio: raggio dell'orologio in pixel
+    :returns: un'immagine del quadrante dell'orologio senza lancette
+    """
+    chiave = (raggio, NERO, BIANCO, GRIGIO, fattore_antialiasing())
+    if chiave not in _cache_quadrante:
+        _cache_quadrante[chiave] = costruisci_quadrante(raggio)
+    quadrante = _cache_quadrante[chiave]
+    return quadrante.con_punto_riferimento(quadrante.get_punto_riferimento())
 
 
-def crea_quadrante() -> Immagine:
+def costruisci_quadrante(raggio: int = RAGGIO) -> Immagine:
     """
-    Crea il quadrante dell'orologio con tacche minuti e cinque minuti
+    Costruisce da zero il quadrante dell'orologio con tacche minuti e cinque
+    minuti, senza usare la cache di crea_quadrante()
     
+    :param raggio: raggio dell'orologio in pixel
     :returns: un'immagine del quadrante dell'orologio senza lancette
     """
     return componi(
-        componi(crea_tacche_cinque_minuti(), crea_tacche_minuti()), 
-        crea_sfondo())
+        componi(crea_tacche_cinque_minuti(raggio),
+                crea_tacche_minuti(raggio)), 
+        crea_sfondo(raggio))
 
 
-def crea_orologio(ore: int, minuti: int) -> Immagine:
+def usa_quadrante(quadrante: Immagine, raggio: int = RAGGIO):
+    """
+    Memorizza nella cache di crea_quadrante() un quadrante già costruito (ad
+    esempio in un altro processo) per il raggio indicato, i colori e il
+    fattore di antialiasing attuali
+    
+    :param quadrante: il quadrante costruito con costruisci_quadrante()
+    :param raggio: raggio dell'orologio in pixel
+    """
+    chiave = (raggio, NERO, BIANCO, GRIGIO, fattore_antialiasing())
+    _cache_quadrante[chiave] = quadrante
+
+
+def svuota_cache_quadrante():
+    """
+    Svuota la cache del quadrante, in modo che venga ricostruito alla
+    prossima chiamata di crea_quadrante()
+    """
+    _cache_quadrante.clear()
+
+
+def crea_orologio(ore: int, minuti: int, raggio: int = RAGGIO) -> Immagine:
     """
     Cra un orologio stile FFS con le lancette all'ora e al minuto desiderato
     
@@ -172,12 +247,61 @@ def crea_orologio(ore: int, minuti: int) -> Immagine:
     delle ore. Accettati il formato 12h e 24h
     :param minuti: i minuti rispetto ai quali si deve posizionare la lancetta 
     dei minuti
+    :param raggio: raggio dell'orologio in pixel
     :returns: un orologio stile FFS con l'ora e i minuti desiderati
     """
     return componi(
-        componi(crea_lancetta_ore(angolo_ore(ore, minuti)), 
-                crea_lancetta_minuti(angolo_minuti(minuti))), 
-        crea_quadrante())
+        componi(crea_lancetta_ore(angolo_ore(ore, minuti), raggio), 
+                crea_lancetta_minuti(angolo_minuti(minuti), raggio)), 
+        crea_quadrante(raggio))
+
+
+def crea_orologio_dimensioni(ore: int, minuti: int,
+                             raggi: Iterable[int]) -> Dict[int, Immagine]:
+    """
+    Crea lo stesso orologio (ore e minuti) in più dimensioni.
+    Il quadrante di ogni dimensione viene costruito solo la prima volta che
+    serve e poi riutilizzato (vedi crea_quadrante()), per cui ogni
+    dimensione richiede solo di disegnare le lancette e comporle con il
+    quadrante
+    
+    :param ore: l'ora indicata dagli orologi
+    :param minuti: i minuti indicati dagli orologi
+    :param raggi: i raggi degli orologi da creare, in pixel
+    :returns: un dizionario che associa a ogni raggio l'orologio di quel
+    raggio
+    """
+    return {raggio: crea_orologio(ore, minuti, raggio) for raggio in raggi}
+
+
+def crea_orologi(orari: Iterable[Tuple[int, int]],
+                 raggio: int = RAGGIO) -> Iterator[Immagine]:
+    """
+    Crea un orologio per ogni orario, nell'ordine, uno alla volta.
+    Il risultato è identico a quello di crea_orologio() per ogni orario, ma
+    ogni posizione distinta delle lancette viene disegnata una volta sola
+    (la lancetta delle ore, ad esempio, si sposta di un grado ogni due
+    minuti, per cui ne basta un'immagine per ogni due minuti) e
+    ogni orologio viene composto copiando il quadrante una sola volta
+    
+    :param orari: coppie (ore, minuti)
+    :param raggio: raggio degli orologi in pixel
+    :returns: un iteratore sugli orologi
+    """
+    quadrante = crea_quadrante(raggio)
+    lancette_ore: Dict[int, Immagine] = {}
+    lancette_minuti: Dict[int, Immagine] = {}
+    for ore, minuti in orari:
+        angolo = angolo_ore(ore, minuti)
+        if angolo not in lancette_ore:
+            lancette_ore[angolo] = crea_lancetta_ore(angolo, raggio)
+        angolo = angolo_minuti(minuti)
+        if angolo not in lancette_minuti:
+            lancette_minuti[angolo] = crea_lancetta_minuti(angolo, raggio)
+        yield componi_molti(
+            [lancette_ore[angolo_ore(ore, minuti)], lancette_minuti[angolo]],
+            quadrante)
 
 
-salva_immagine("orologio", crea_orologio(4, 10))
\ No newline at end of file
+if __name__ == "__main__":
+    salva_immagine("orologio", crea_orologio(4, 10))
@@ -3,7 +3,10 @@ Costruzione di un orologio stile FFS con ore, minuti e secondi
 In particolare le funzioni permettono di:
 - creare la lancetta dei secondi
 - creare un orologio stile FFS con indicazione su ore, minuti e secondi
+- creare molti orologi condividendo il lavoro
 """
+from typing import Dict, Iterable, Iterator, Tuple
+
 from img_lib_v0_6 import(
     Immagine, 
     affianca, 
@@ -12,46 +15,56 @@ from img_lib_v0_6 import(
     ruota,  
     cambia_punto_riferimento, 
     componi, 
+    componi_molti,
+    modalita_pigra,
     salva_immagine,
     visualizza_immagine
     )
 
 from esercizio_orologio import(
+    RAGGIO,
     crea_lancetta_ore,
     angolo_ore,
     crea_lancetta_minuti,
     angolo_minuti,
-    crea_quadrante
+    crea_quadrante,
+    frazione_raggio
     )
 
 
-RAGGIO: int = 300
 NERO = (0, 0, 0)
 BIANCO = (255, 255, 255)
 ROSSO = (255, 0, 0)
 
 
-def crea_lancetta_secondi(angolo: int) -> Immagine:
+def crea_lancetta_secondi(angolo: int, raggio: int = RAGGIO) -> Immagine:
     """
     Crea la lancetta dei secondi in posizione ore 0
     
     :param angolo: angolo di apertura della lancetta
+    :param raggio: raggio dell'orologio in pixel
     :returns: una lancetta ruotata
     """
-    altezza_lancetta = RAGGIO * 2 // 100
-    pallino_lancetta = cambia_punto_riferimento(
-        cerchio(RAGGIO *8 // 100, ROSSO), 
-        "middle", "middle")
-    lancetta_testa = cambia_punto_riferimento(
-        (rettangolo(RAGGIO * 25 // 100, altezza_lancetta, ROSSO)), 
-        "right", "middle")
-    lancetta_coda = cambia_punto_riferimento(
-        (rettangolo(RAGGIO * 60 // 100, altezza_lancetta, ROSSO)),
-        "left", "middle")
-    lancetta_orizzontale = affianca(
-        lancetta_testa, affianca(lancetta_coda, pallino_lancetta))
-    lancetta_verticale = ruota(lancetta_orizzontale, 90)
-    return ruota(lancetta_verticale, -(angolo))
+    altezza_lancetta = frazione_raggio(raggio, 2)
+    # La lancetta viene descritta geometricamente e ruotata una sola volta,
+    # disegnandola direttamente ruotata: rispetto a ruotare due volte
+    # l'immagine, le dimensioni e il punto di riferimento possono differire
+    # fino a due pixel
+    with modalita_pigra():
+        pallino_lancetta = cambia_punto_riferimento(
+            cerchio(frazione_raggio(raggio, 8), ROSSO), 
+            "middle", "middle")
+        lancetta_testa = cambia_punto_riferimento(
+            (rettangolo(frazione_raggio(raggio, 25), altezza_lancetta,
+                        ROSSO)), 
+            "right", "middle")
+        lancetta_coda = cambia_punto_riferimento(
+            (rettangolo(frazione_raggio(raggio, 60), altezza_lancetta, ROSSO)),
+            "left", "middle")
+        lancetta_orizzontale = affianca(
+            lancetta_testa, affianca(lancetta_coda, pallino_lancetta))
+        lancetta = ruota(lancetta_orizzontale, 90 - angolo)
+    return Immagine(lancetta.get_image(), lancetta.get_punto_riferimento())
 
 
 def angolo_secondi(secondi: int) -> int:
@@ -65,11 +78,60 @@ def angolo_secondi(secondi: int) -> int:
     return angolo
 
 
-def crea_orologio(ore: int, minuti: int, secondi: int) -> Immagine:
-    ore_minuti = componi(crea_lancetta_ore(angolo_ore(ore, minuti)), 
-                         crea_lancetta_minuti(angolo_minuti(minuti)))
-    lancette = componi(crea_lancetta_secondi(angolo_secondi(secondi)),
-                       ore_minuti)
-    return componi(lancette, crea_quadrante())
+def crea_orologio(ore: int, minuti: int, secondi: int,
+                  raggio: int = RAGGIO) -> Immagine:
+    ore_minuti = componi(crea_lancetta_ore(angolo_ore(ore, minuti), raggio), 
+                         crea_lancetta_minuti(angolo_minuti(minuti), raggio))
+    lancette = componi(
+        crea_lancetta_secondi(angolo_secondi(secondi), raggio), ore_minuti)
+    return componi(lancette, crea_quadrante(raggio))
+
+
+def crea_orologio_dimensioni(ore: int, minuti: int, secondi: int,
+                             raggi: Iterable[int]) -> Dict[int, Immagine]:
+    """
+    Crea lo stesso orologio (ore, minuti e secondi) in più dimensioni,
+    riutilizzando il quadrante di ogni dimensione (vedi
+    esercizio_orologio.crea_orologio_dimensioni())
+    
+    :param ore: l'ora indicata dagli orologi
+    :param minuti: i minuti indicati dagli orologi
+    :param secondi: i secondi indicati dagli orologi
+    :param raggi: i raggi degli orologi da creare, in pixel
+    :returns: un dizionario che associa a ogni raggio l'orologio di quel
+    raggio
+    """
+    return {raggio: crea_orologio(ore, minuti, secondi, raggio)
+            for raggio in raggi}
+
+
+def crea_orologi(orari: Iterable[Tuple[int, int, int]],
+                 raggio: int = RAGGIO) -> Iterator[Immagine]:
+    """
+    Crea un orologio per ogni orario, nell'ordine, uno alla volta,
+    disegnando ogni posizione distinta delle lancette una volta sola (vedi
+    esercizio_orologio.crea_orologi()). Il risultato è identico a quello di
+    crea_orologio() per ogni orario
+    
+    :param orari: terne (ore, minuti, secondi)
+    :param raggio: raggio degli orologi in pixel
+    :returns: un iteratore sugli orologi
+    """
+    quadrante = crea_quadrante(raggio)
+    crea_lancetta = {"secondi": crea_lancetta_secondi,
+                     "ore": crea_lancetta_ore,
+                     "minuti": crea_lancetta_minuti}
+    lancette: Dict[Tuple[str, int], Immagine] = {}
+    for ore, minuti, secondi in orari:
+        chiavi = [("secondi", angolo_secondi(secondi)),
+                  ("ore", angolo_ore(ore, minuti)),
+                  ("minuti", angolo_minuti(minuti))]
+        for chiave in chiavi:
+            if chiave not in lancette:
+                lancette[chiave] = crea_lancetta[chiave[0]](chiave[1], raggio)
+        yield componi_molti([lancette[chiave] for chiave in chiavi],
+                            quadrante)
+
 
-salva_immagine("orologio_ore_minuti_secondi", crea_orologio(4, 10, 45))
\ No newline at end of file
+if __name__ == "__main__":
+    salva_immagine("orologio_ore_minuti_secondi", crea_orologio(4, 10, 45))
@@ -5,26 +5,53 @@ Contiene funzioni per:
 
 - creare un'immagine vuota
 - creare forme basilari (rettangolo, triangolo equilatero, cerchio, settore
-  circolare, scena vuota);
+  circolare, scena vuota, poligoni e rettangoli ruotati);
 - combinare immagini esistenti creandone di più complesse (sovrapponendole,
   affiancandole verticalmente o orizzontalmente, ruotandole);
 - combinare immagini esistenti componendole arbitrariamente usando i loro
-  punti di riferimento, che possono essere modificati;
-- creare immagini contenenti testo;
+  punti di riferimento, che possono essere modificati (anche molte immagini
+  alla volta);
+- disporre copie ruotate di un'immagine ad anello attorno a un centro;
+- creare immagini contenenti testo (riutilizzando, se richiesto, i glifi già
+  disegnati);
 - determinare larghezza e altezza di un'immagine;
 - visualizzare un'immagine oppure salvarla su file;
-- creare una GIF animata usando una lista di immagini.
+- creare una GIF o un PNG animato usando una sequenza di immagini;
+- riutilizzare le rotazioni già calcolate tramite una cache (opzionale);
+- disegnare cerchi, settori circolari e poligoni con l'antialiasing
+  (opzionale);
+- costruire immagini "pigre", descritte geometricamente e disegnate solo
+  quando servono (opzionale), anche a tasselli o solo in parte per le
+  immagini molto grandi;
+- misurare tempi e pixel delle funzioni della libreria (profilazione,
+  opzionale).
 
 Versione 0.6
 """
 
-from dataclasses import dataclass
-from math import ceil, cos, sin, sqrt, radians
-from typing import Any, List, Optional, Tuple
-from PIL import Image as ImageMod, ImageDraw, ImageFont as ImageFontMod
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from hashlib import blake2b
+from io import BytesIO
+from math import ceil, cos, floor, sin, sqrt, radians
+import struct
+from time import perf_counter
+from typing import (TYPE_CHECKING, Any, BinaryIO, Callable, Dict, Hashable,
+                    Iterable, Iterator, List, Optional, Tuple, TypeVar,
+                    Union)
+import zlib
+from PIL import (Image as ImageMod, ImageChops, ImageColor, ImageDraw,
+                 ImageFont as ImageFontMod)
 from PIL.Image import Image
 from PIL.ImageFont import ImageFont
 
+# NumPy, il plugin GIF di Pillow e json sono importati solo nelle funzioni che
+# li usano, così importare la libreria resta veloce.
+if TYPE_CHECKING:
+    import numpy as np
+
 
 def _half(coord: int) -> int:
     """
@@ -40,7 +67,28 @@ def _half(coord: int) -> int:
     return ceil(coord / 2)
 
 
-@dataclass
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+def _strumentata(funzione: _F) -> _F:
+    """
+    Decoratore che, quando la profilazione è attiva (vedi profilazione()),
+    misura le chiamate alla funzione decorata. Quando la profilazione non è
+    attiva, costa solo il controllo di una variabile globale.
+
+    :param funzione: la funzione da misurare
+    :returns: la funzione decorata
+    """
+    nome = funzione.__qualname__
+
+    @wraps(funzione)
+    def strumentata(*args, **kwargs):
+        if _profilazione is None:
+            return funzione(*args, **kwargs)
+        return _misura(_profilazione, nome, funzione, args, kwargs)
+    return strumentata  # type: ignore[return-value]
+
+
 class Immagine:
     """
     Rappresenta un'immagine (con un punto di riferimento).
@@ -50,9 +98,13 @@ class Immagine:
     - rotazione (per determinare il centro di rotazione)
     - composizione di due immagini, che vengono composte allineando i loro
       punti di riferimento.
+
+    Le immagini sono immutabili (img e punto_riferimento sono in sola
+    lettura) e occupano poca memoria (usano __slots__): cambiare il punto di
+    riferimento crea una nuova immagine che condivide i pixel con quella
+    originale.
     """
-    img: Image
-    punto_riferimento: Tuple[int, int]
+    __slots__ = ("_pixel", "_rif", "_impronta_contenuto")
 
     def _riferimento_default(self) -> Tuple[int, int]:
         # Il riferimento predefinito è al centro dell'immagine (approssimato al
@@ -61,9 +113,31 @@ class Immagine:
                 _half(altezza_immagine(self) - 1))
 
     def __init__(self, img: Image, punto_rif=None) -> None:
-        self.img = img
-        self.punto_riferimento = punto_rif if punto_rif is not None \
-            else self._riferimento_default()
+        self._pixel = img
+        # Se non indicato, il punto di riferimento viene calcolato solo
+        # quando serve (vedi get_punto_riferimento())
+        self._rif: Optional[Tuple[int, int]] = punto_rif
+        # Impronta del contenuto, calcolata al primo uso (vedi get_impronta())
+        self._impronta_contenuto: Optional[Tuple[str, Tuple[int, int],
+                                                 bytes]] = None
+
+    def __repr__(self) -> str:
+        return (f"Immagine(img={self.img!r}, "
+                f"punto_riferimento={self.get_punto_riferimento()})")
+
+    @property
+    def img(self) -> Image:
+        """
+        L'immagine Pillow (vedi get_image()).
+        """
+        return self.get_image()
+
+    @property
+    def punto_riferimento(self) -> Tuple[int, int]:
+        """
+        Il punto di riferimento (vedi get_punto_riferimento()).
+        """
+        return self.get_punto_riferimento()
 
     # Usiamo:
     # - metodi per funzioni "interne",
@@ -76,7 +150,7 @@ class Immagine:
         :returns: un'istanza della classe Image in Pillow
         :meta private:
         """
-        return self.img
+        return self._pixel
 
     def get_punto_riferimento(self) -> Tuple[int, int]:
         """
@@ -86,7 +160,46 @@ class Immagine:
         :returns: punto di riferimento
         :meta private:
         """
-        return self.punto_riferimento
+        if self._rif is None:
+            self._rif = self._riferimento_default()
+        return self._rif
+
+    def get_dimensioni(self) -> Tuple[int, int]:
+        """
+        Ritorna le dimensioni di questa immagine, come coppia (larghezza,
+        altezza) in pixel.
+
+        :returns: dimensioni dell'immagine
+        :meta private:
+        """
+        return self._pixel.size
+
+    def con_punto_riferimento(self, punto_rif: Tuple[int, int]) -> "Immagine":
+        """
+        Ritorna un'immagine con lo stesso contenuto di questa ma con il punto di
+        riferimento indicato.
+
+        :param punto_rif: il nuovo punto di riferimento
+        :returns: una nuova immagine
+        :meta private:
+        """
+        nuova = Immagine(self._pixel, punto_rif)
+        nuova._impronta_contenuto = self._impronta_contenuto
+        return nuova
+
+    def get_impronta(self) -> Tuple[str, Tuple[int, int], bytes]:
+        """
+        Ritorna un'impronta compatta (modo, dimensioni e digest BLAKE2) del
+        contenuto di questa immagine. L'impronta viene calcolata una sola
+        volta e poi riusata: le immagini non vanno modificate dopo la loro
+        creazione.
+
+        :returns: l'impronta del contenuto
+        :meta private:
+        """
+        if self._impronta_contenuto is None:
+            self._impronta_contenuto = _impronta(self.get_image())
+        return self._impronta_contenuto
 
     def is_immagine_vuota(self) -> bool:
         """
@@ -95,8 +208,9 @@ class Immagine:
         :returns: True se l'immagine è vuota, False altrimenti
         :meta private:
         """
-        return self.get_image().size == (0, 0)
+        return self.get_dimensioni() == (0, 0)
 
+    @_strumentata
     def ritaglia_bounding_box(self) -> "Immagine":
         """
         Ritaglia (crop) un'immagine in modo che sia grande il minimo necessario
@@ -108,7 +222,8 @@ class Immagine:
         :returns: una nuova immagine, ritagliata
         :meta private:
         """
-        return Immagine(self.img.crop(self.img.getbbox()))
+        img = self.get_image()
+        return Immagine(img.crop(img.getbbox()))
 
     def immagine_debug(self) -> "Immagine":
         """
@@ -120,23 +235,23 @@ class Immagine:
         """
         rif = self.get_punto_riferimento()
         spessore = 5
-        img_bordo = _aggiungi_bordo(self, 5, "#E01010")
-        # This is a hack...
-        img_bordo.punto_riferimento = (rif[0] + spessore, rif[1] + spessore)
+        img_bordo = _aggiungi_bordo(self, 5, "#E01010").con_punto_riferimento(
+            (rif[0] + spessore, rif[1] + spessore))
         return _mostra_punto_riferimento(img_bordo)
 
     def _key(self) -> Tuple[Any, ...]:
         """
         Ritorna i field importanti per __eq__ e __hash__ come tupla.
 
-        La tupla risultante deve contenere valori confrontabili e hashabili,
-        pertanto viene trattato con attenzione il caso dell'immagine vuota
-        (su cui invocare .tobytes() genera un'eccezione).
+        Al posto dei pixel viene usata l'impronta del contenuto (vedi
+        get_impronta()), che è piccola e viene calcolata una sola volta; il
+        caso dell'immagine vuota viene trattato a parte, in modo che tutte le
+        immagini vuote risultino uguali.
 
         :returns: una tupla con i valori dei field importanti per determinare
                   l'uguaglianza
         """
-        return (self.get_image().tobytes() if not self.is_immagine_vuota()
+        return (self.get_impronta() if not self.is_immagine_vuota()
                 else None,
                 self.get_punto_riferimento())
 
@@ -146,12 +261,19 @@ class Immagine:
         Due immagini sono considerate uguali se sono entrambe vuote oppure
         se hanno uguale contenuto e uguale punto di riferimento.
 
+        Il confronto avviene sulle impronte; solo se queste coincidono i pixel
+        vengono confrontati per intero, per escludere le collisioni.
+
         :returns: True se le due immagini sono considerate uguali, False
         altrimenti
         """
-        if not isinstance(other, type(self)):
+        if not isinstance(other, Immagine):
             return NotImplemented
-        return self._key() == other._key()
+        if self._key() != other._key():
+            return False
+        img, img_altra = self.get_image(), other.get_image()
+        return (self.is_immagine_vuota() or img is img_altra
+                or img.tobytes() == img_altra.tobytes())
 
     def __hash__(self) -> int:
         """
@@ -202,6 +324,7 @@ def _mostra_punto_riferimento(immagine: Immagine) -> Immagine:
     return componi(croce, immagine)
 
 
+@_strumentata
 def visualizza_immagine(immagine: Immagine, debug: bool = False):
     """
     Visualizza un'immagine a schermo (tranne quando è l'immagine vuota).
@@ -221,48 +344,624 @@ def visualizza_immagine(immagine: Immagine, debug: bool = False):
         to_show.get_image().show()
 
 
-def salva_immagine(nome_file: str, immagine: Immagine, debug: bool = False):
+@_strumentata
+def salva_immagine(nome_file: Union[str, BinaryIO], immagine: Immagine,
+                   debug: bool = False, formato: str = "png",
+                   compressione: Optional[int] = None,
+                   colori: Optional[int] = None):
     """
-    Salva un'immagine come file PNG (tranne quando è l'immagine vuota).
+    Salva un'immagine come file PNG (tranne quando è l'immagine vuota),
+    oppure in uno degli altri formati senza perdita di qualità:
+
+    - "webp": WebP lossless, in genere il file più piccolo;
+    - "qoi": Quite OK Image, codifica e decodifica molto veloci;
+    - "rgba": i pixel RGBA, riga per riga, senza alcuna intestazione.
+
+    L'immagine può essere salvata anche in un file già aperto o in memoria
+    (ad esempio in un io.BytesIO), indicandolo al posto del nome del file.
 
     Quando debug è `True`, aggiunge alla visualizzazione un bordo rosso
     attorno alla bounding box dell'immagine e una croce giallastra sul
     punto di riferimento.
 
-    :param nome_file: nome del file (senza estensione)
+    :param nome_file: nome del file (senza estensione, che dipende dal
+                      formato), oppure un file binario aperto in scrittura
     :param immagine: l'immagine da salvare
     :param debug: facoltativamente può essere impostato a `True` per aggiungere
                   un bordo rosso attorno alla bounding box ed evidenziare con
                   una croce giallastra il punto di riferimento (a scopo di
                   debug).
+    :param formato: "png" (il default), "webp", "qoi" oppure "rgba"
+    :param compressione: per "png", il livello di compressione zlib, da 0
+                         (nessuna compressione, il più veloce) a 9 (il file
+                         più piccolo); per "webp", lo sforzo di compressione,
+                         da 0 a 6. Se non indicato, viene usato il default di
+                         Pillow
+    :param colori: solo per "png": salva l'immagine con una palette di al
+                   massimo questo numero di colori (fino a 256). Se
+                   l'immagine ha al massimo questo numero di colori, come gli
+                   orologi, i pixel restano identici e il file è più piccolo
+                   e più veloce da comprimere; altrimenti i colori vengono
+                   approssimati
     """
-    if not immagine.is_immagine_vuota():
-        to_show = immagine.immagine_debug() if debug else immagine
-        to_show.get_image().save(f"{nome_file}.png")
+    if formato not in _FORMATI:
+        raise ValueError(f"Formato non supportato: {formato}")
+    if compressione is not None and not (
+            0 <= compressione <= _FORMATI[formato][1]):
+        raise ValueError(f"Compressione non valida per il formato "
+                         f"{formato}: {compressione}")
+    if colori is not None and (formato != "png" or not 1 <= colori <= 256):
+        raise ValueError("La palette è disponibile solo per il formato png, "
+                         "con 1-256 colori")
+    if immagine.is_immagine_vuota():
+        return
+    to_show = immagine.immagine_debug() if debug else immagine
+    img = to_show.get_image()
+    if isinstance(nome_file, str):
+        nome_file = f"{nome_file}.{formato}"
+    if formato == "rgba":
+        if img.mode != _IMAGE_MODE:
+            img = img.convert(_IMAGE_MODE)
+        if isinstance(nome_file, str):
+            with open(nome_file, "wb") as file:
+                file.write(img.tobytes())
+        else:
+            nome_file.write(img.tobytes())
+        return
+    parametri: Dict[str, Any] = {}
+    if formato == "png":
+        if compressione is not None:
+            parametri["compress_level"] = compressione
+        if colori is not None:
+            img = _converti_in_palette(img, colori)
+    elif formato == "webp":
+        parametri["lossless"] = True
+        if compressione is not None:
+            parametri["method"] = compressione
+    img.save(nome_file, _FORMATI[formato][0], **parametri)
+
+
+def _converti_in_palette(img: Image, colori: int) -> Image:
+    """
+    Converte un'immagine in un'immagine con palette (con la trasparenza
+    nella palette). Se l'immagine ha al massimo `colori` colori, la palette
+    li contiene esattamente; altrimenti i colori vengono approssimati da
+    Pillow.
+
+    :param img: immagine Pillow
+    :param colori: numero massimo di colori della palette (fino a 256)
+    :returns: l'immagine Pillow in modalità P
+    """
+    if img.mode != _IMAGE_MODE:
+        img = img.convert(_IMAGE_MODE)
+    usati = img.getcolors(colori)
+    if usati is None:
+        return img.convert("P", palette=ImageMod.Palette.ADAPTIVE,
+                           colors=colori)
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    # Ogni colore RGBA viene trattato come un unico intero a 32 bit; la
+    # posizione nella palette, ordinata per intero, è l'indice di ogni pixel
+    palette = np.array([colore for _, colore in usati], np.uint8)
+    codici = palette.view(np.uint32).ravel()
+    ordine = np.argsort(codici)
+    palette, codici = palette[ordine], codici[ordine]
+    pixel = np.asarray(img).view(np.uint32)[..., 0]
+    indici = np.searchsorted(codici, pixel).astype(np.uint8)
+    img_p = ImageMod.fromarray(indici, "L").convert("P")
+    img_p.putpalette(palette.tobytes(), "RGBA")
+    return img_p
+
+
+@_strumentata
+def salva_immagine_a_tasselli(nome_file: str, immagine: Immagine):
+    """
+    Salva un'immagine come file PNG (tranne quando è l'immagine vuota),
+    disegnandola una striscia di tasselli alla volta (vedi tasselli()).
+    Per le immagini pigre molto grandi, la memoria usata dipende solo dalla
+    larghezza dell'immagine, non dalla sua altezza. I pixel salvati sono
+    identici a quelli di salva_immagine().
+
+    :param nome_file: nome del file (senza estensione)
+    :param immagine: l'immagine da salvare
+    """
+    if immagine.is_immagine_vuota():
+        return
+    larghezza, altezza = immagine.get_dimensioni()
+    compressore = zlib.compressobj()
+    with open(f"{nome_file}.png", "wb") as file:
+        file.write(_FIRMA_PNG)
+        # Profondità 8 bit, RGBA, nessun interlacciamento
+        _scrivi_blocco_png(file, b"IHDR", struct.pack(
+            ">IIBBBBB", larghezza, altezza, 8, 6, 0, 0, 0))
+        for alto in range(0, altezza, _LATO_TASSELLO):
+            # I pixel dei tasselli della striscia e la lunghezza in byte di
+            # una loro riga
+            striscia = []
+            for _, tassello in _tasselli_striscia(immagine, alto):
+                img = tassello.get_image()
+                if img.mode != _IMAGE_MODE:
+                    img = img.convert(_IMAGE_MODE)
+                striscia.append((img.tobytes(), 4 * img.width))
+            for riga in range(min(_LATO_TASSELLO, altezza - alto)):
+                # Ogni riga inizia con il tipo di filtro (0: nessuno)
+                dati = b"\0" + b"".join(
+                    pixel[riga * passo:(riga + 1) * passo]
+                    for pixel, passo in striscia)
+                compressi = compressore.compress(dati)
+                if compressi:
+                    _scrivi_blocco_png(file, b"IDAT", compressi)
+        _scrivi_blocco_png(file, b"IDAT", compressore.flush())
+        _scrivi_blocco_png(file, b"IEND", b"")
+
+
+@_strumentata
+def disegna_regione(immagine: Immagine,
+                    regione: Tuple[int, int, int, int]) -> Immagine:
+    """
+    Disegna solo una regione rettangolare di un'immagine. Per le immagini
+    pigre vengono disegnati solo i tasselli che contengono la regione (vedi
+    tasselli()), senza creare l'immagine intera; i pixel sono identici a
+    quelli della stessa regione dell'immagine intera.
+
+    :param immagine: immagine (pigra o normale)
+    :param regione: (sinistra, alto, destra, basso) in pixel, con destra e
+                    basso esclusi, interamente contenuta nell'immagine
+    :returns: un'immagine con i pixel della regione, con il punto di
+              riferimento nella stessa posizione rispetto ai pixel
+    """
+    sinistra, alto, destra, basso = regione
+    larghezza, altezza = immagine.get_dimensioni()
+    if not 0 <= sinistra < destra <= larghezza \
+            or not 0 <= alto < basso <= altezza:
+        raise ValueError(f"La regione {regione} non è contenuta "
+                         f"nell'immagine")
+    rif = immagine.get_punto_riferimento()
+    rif = (rif[0] - sinistra, rif[1] - alto)
+    if not isinstance(immagine, ImmaginePigra) \
+            or immagine.get_immagine_disegnata() is not None:
+        return Immagine(immagine.get_image().crop(regione), rif)
+    return Immagine(_disegna_forme(immagine.forme, immagine.dimensioni,
+                                   regione), rif)
+
+
+def tasselli(immagine: Immagine) -> Iterator[
+        Tuple[Tuple[int, int, int, int], Immagine]]:
+    """
+    Divide un'immagine in tasselli quadrati (più piccoli lungo il bordo
+    destro e quello inferiore) e li disegna uno alla volta, da sinistra a
+    destra e dall'alto in basso. Un'immagine pigra viene disegnata sempre un
+    tassello alla volta, per cui anche un'immagine molto grande può essere
+    elaborata (ad esempio salvata con salva_immagine_a_tasselli()) usando
+    solo la memoria necessaria per un tassello.
+
+    :param immagine: immagine (pigra o normale)
+    :returns: un iteratore sulle coppie (regione, tassello), dove la regione
+              è (sinistra, alto, destra, basso) come in disegna_regione()
+    """
+    if immagine.is_immagine_vuota():
+        return
+    for alto in range(0, altezza_immagine(immagine), _LATO_TASSELLO):
+        yield from _tasselli_striscia(immagine, alto)
+
+
+def _tasselli_striscia(immagine: Immagine, alto: int) -> Iterator[
+        Tuple[Tuple[int, int, int, int], Immagine]]:
+    """
+    Disegna uno alla volta i tasselli di una striscia (vedi tasselli()).
+
+    :param immagine: immagine (pigra o normale)
+    :param alto: coordinata y del lato superiore della striscia
+    :returns: un iteratore sulle coppie (regione, tassello)
+    """
+    larghezza, altezza = immagine.get_dimensioni()
+    basso = min(alto + _LATO_TASSELLO, altezza)
+    for sinistra in range(0, larghezza, _LATO_TASSELLO):
+        regione = (sinistra, alto, min(sinistra + _LATO_TASSELLO, larghezza),
+                   basso)
+        yield regione, disegna_regione(immagine, regione)
 
 
-def crea_gif(nome_file: str, immagini: List[Immagine], durata: int = 40):
+@_strumentata
+def crea_gif(nome_file: str, immagini: Iterable[Immagine], durata: int = 40,
+             solo_differenze: bool = False):
     """
-    Crea una GIF animata partendo da una lista di immagini e la memorizza come
-    file.
+    Crea una GIF animata partendo da una sequenza di immagini e la memorizza
+    come file.
 
     Le immagini verranno riprodotte in sequenza (normalmente a 25 frame per
     secondo) in loop. Le immagini con lo sfondo trasparente non sono
     supportate.
 
+    Oltre a una lista, si può fornire qualsiasi sequenza di immagini, ad
+    esempio un generatore: ogni immagine viene codificata e scritta su file
+    appena viene prodotta, per cui la memoria usata non dipende dal numero di
+    frame.
+
+    Di ogni frame dopo il primo viene salvato solo il rettangolo che contiene
+    i pixel cambiati rispetto al frame precedente. Ogni frame mantiene i
+    propri colori (al massimo 256) e usa la palette del primo frame quando
+    questa li contiene tutti.
+
+    Quando solo_differenze è `True`, tutti i frame usano la palette del primo
+    (al massimo 256 colori). È la scelta migliore per animazioni in cui
+    cambia solo una piccola parte dell'immagine, come le lancette di un
+    orologio: il file è ancora più piccolo e viene creato più velocemente. I
+    colori che non compaiono nel primo frame vengono approssimati con quelli
+    della sua palette.
+
     :param nome_file: nome del file (senza estensione)
-    :param immagini: lista di immagini da salvare come GIF
+    :param immagini: immagini da salvare come GIF, tutte delle stesse
+                     dimensioni
     :param durata: durata in millisecondi per cui deve essere visualizzato un
                    frame (di default, 40 millisecondi, che corrisponde a 25
                    frame per secondo)
+    :param solo_differenze: facoltativamente può essere impostato a `True` per
+                            salvare solo le differenze tra un frame e l'altro
     """
-    if len(immagini) == 0:
+    frame = _frame_animazione(immagini)
+    with open(f"{nome_file}.gif", "wb") as file:
+        if solo_differenze:
+            _scrivi_gif_differenze(file, frame, durata)
+        else:
+            _scrivi_gif(file, frame, durata)
+        file.write(b";")  # fine del file GIF
+
+
+def _scrivi_gif(file: BinaryIO, frame: Iterator[Image], durata: int):
+    """
+    Scrive su file i frame di una GIF animata (senza il terminatore): il primo
+    completo, i successivi limitati al rettangolo cambiato rispetto al frame
+    precedente e disegnati sopra di esso. Ogni frame usa la palette globale
+    del primo quando questa contiene tutti i suoi colori, altrimenti una
+    propria.
+    Se un frame rende trasparenti dei pixel che nel precedente non lo erano,
+    il frame precedente deve essere cancellato dopo essere stato mostrato:
+    per questo ogni frame viene scritto solo dopo aver letto il successivo.
+
+    :param file: file binario
+    :param frame: immagini Pillow da scrivere
+    :param durata: durata di ogni frame in millisecondi
+    """
+    # pylint: disable=import-outside-toplevel
+    from PIL import GifImagePlugin
+    precedente = next(frame)
+    img_p = _converti_per_gif(precedente)
+    # Con disposal 1 ogni frame viene disegnato sopra quello precedente
+    parametri = {"duration": durata, "disposal": 1}
+    trasparente = img_p.info.get("transparency")
+    if trasparente is not None:
+        parametri["transparency"] = trasparente
+    intestazione, _ = GifImagePlugin.getheader(
+        img_p, info=dict(parametri, loop=0))
+    file.writelines(intestazione)
+    colori = img_p.getpalette("RGB")
+    # Indice di ogni colore della palette globale (il primo, se ripetuto)
+    palette = {tuple(colori[i:i + 3]): i // 3
+               for i in range(len(colori) - 3, -1, -3)
+               if i // 3 != trasparente}
+    # Il frame letto ma non ancora scritto: il primo è già convertito
+    in_attesa = (img_p, (0, 0))
+    for img in frame:
+        # Se il frame è identico al precedente, basta un pixel invariato
+        bbox = _bbox_differenze(img, precedente) or (0, 0, 1, 1)
+        cancellati = _bbox_nuovi_trasparenti(img, precedente)
+        if cancellati is None:
+            _scrivi_frame_gif(file, *in_attesa, parametri, palette)
+        else:
+            # Il frame precedente viene cancellato dopo essere stato mostrato
+            # (disposal 2), anche dove diventa trasparente: se è stato
+            # ritagliato, lo si ritaglia di nuovo per comprendere quei pixel
+            sinistra, alto = in_attesa[1]
+            riquadro = (sinistra, alto, sinistra + in_attesa[0].width,
+                        alto + in_attesa[0].height)
+            if _unione_rettangoli(riquadro, cancellati) != riquadro:
+                riquadro = _unione_rettangoli(riquadro, cancellati)
+                in_attesa = (_ritaglio_per_gif(precedente, riquadro),
+                             riquadro[:2])
+            _scrivi_frame_gif(file, *in_attesa, dict(parametri, disposal=2),
+                              palette)
+            # Questo frame ridisegna tutta l'area cancellata
+            bbox = _unione_rettangoli(bbox, riquadro)
+        in_attesa = (_ritaglio_per_gif(img, bbox), bbox[:2])
+        precedente = img
+    _scrivi_frame_gif(file, *in_attesa, parametri, palette)
+
+
+def _bbox_nuovi_trasparenti(img: Image, precedente: Image
+                            ) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Calcola il rettangolo più piccolo che contiene tutti i pixel trasparenti
+    in un frame che non lo erano nel frame precedente.
+
+    :param img: il frame, immagine Pillow in modalità RGBA
+    :param precedente: il frame precedente, delle stesse dimensioni
+    :returns: il rettangolo (sinistra, sopra, destra, sotto), oppure None se
+              non ci sono pixel diventati trasparenti
+    """
+    trasparenti = img.getchannel("A").point(
+        lambda alpha: 255 if alpha == 0 else 0)
+    visibili = precedente.getchannel("A").point(
+        lambda alpha: 0 if alpha == 0 else 255)
+    return ImageChops.darker(trasparenti, visibili).getbbox()
+
+
+def _unione_rettangoli(primo: Tuple[int, int, int, int],
+                       secondo: Tuple[int, int, int, int]
+                       ) -> Tuple[int, int, int, int]:
+    """
+    :param primo: rettangolo (sinistra, sopra, destra, sotto)
+    :param secondo: altro rettangolo
+    :returns: il rettangolo più piccolo che contiene entrambi
+    """
+    return (min(primo[0], secondo[0]), min(primo[1], secondo[1]),
+            max(primo[2], secondo[2]), max(primo[3], secondo[3]))
+
+
+def _ritaglio_per_gif(img: Image, bbox: Tuple[int, int, int, int]) -> Image:
+    """
+    Ritaglia un frame e lo converte in un'immagine con palette.
+
+    :param img: immagine Pillow in modalità RGBA
+    :param bbox: il rettangolo da ritagliare
+    :returns: il ritaglio in modalità P
+    """
+    return _converti_per_gif(img.crop(bbox))
+
+
+def _scrivi_frame_gif(file: BinaryIO, img_p: Image, posizione: Tuple[int, int],
+                      parametri: Dict[str, Any],
+                      palette: Dict[Tuple[int, ...], int]):
+    """
+    Scrive su file un frame di una GIF animata, usando la palette globale se
+    contiene tutti i colori del frame, altrimenti la palette del frame.
+
+    :param file: file binario
+    :param img_p: il frame (o il suo ritaglio) in modalità P
+    :param posizione: posizione del frame nell'animazione
+    :param parametri: parametri del frame (durata, disposal, trasparenza)
+    :param palette: indici dei colori della palette globale, escluso quello
+                    trasparente
+    """
+    # pylint: disable=import-outside-toplevel
+    from PIL import GifImagePlugin
+    colori = img_p.getpalette("RGB")
+    trasparente = img_p.info.get("transparency")
+    indici = bytearray(256)
+    for _, indice in img_p.getcolors(256):
+        colore = tuple(colori[indice * 3:indice * 3 + 3])
+        if indice == trasparente and "transparency" in parametri:
+            indici[indice] = parametri["transparency"]
+        elif colore in palette:
+            indici[indice] = palette[colore]
+        else:
+            break
+    else:
+        # Tutti i colori sono nella palette globale: basta cambiare gli indici
+        img_p = ImageMod.frombytes("P", img_p.size,
+                                   img_p.tobytes().translate(indici))
+        file.writelines(GifImagePlugin.getdata(img_p, offset=posizione,
+                                               **parametri))
+        return
+    parametri = dict(parametri, include_color_table=True)
+    parametri.pop("transparency", None)
+    if trasparente is not None:
+        parametri["transparency"] = trasparente
+    file.writelines(GifImagePlugin.getdata(img_p, offset=posizione,
+                                           **parametri))
+
+
+def _scrivi_gif_differenze(file: BinaryIO, frame: Iterator[Image],
+                           durata: int):
+    """
+    Scrive su file i frame di una GIF animata (senza il terminatore): il primo
+    completo, i successivi limitati al rettangolo cambiato rispetto al frame
+    precedente. Tutti i frame usano la palette globale del primo.
+
+    :param file: file binario
+    :param frame: immagini Pillow da scrivere
+    :param durata: durata di ogni frame in millisecondi
+    """
+    # pylint: disable=import-outside-toplevel
+    from PIL import GifImagePlugin
+    precedente = next(frame)
+    img_p = _converti_per_gif(precedente)
+    # Con disposal 1 ogni frame viene disegnato sopra quello precedente
+    parametri = {"duration": durata, "disposal": 1}
+    trasparente = img_p.info.get("transparency")
+    if trasparente is not None:
+        parametri["transparency"] = trasparente
+    intestazione, _ = GifImagePlugin.getheader(
+        img_p, info=dict(parametri, loop=0))
+    file.writelines(intestazione)
+    file.writelines(GifImagePlugin.getdata(img_p, **parametri))
+    palette = _palette_per_quantizzare(img_p, trasparente)
+    for img in frame:
+        # Se il frame è identico al precedente, basta un pixel invariato
+        bbox = _bbox_differenze(img, precedente) or (0, 0, 1, 1)
+        ritaglio = img.crop(bbox)
+        ritaglio_p = ritaglio.convert("RGB").quantize(
+            palette=palette, dither=ImageMod.Dither.NONE)
+        if trasparente is not None:
+            ritaglio_p.paste(trasparente, mask=ritaglio.getchannel(3).point(
+                lambda alpha: 255 if alpha == 0 else 0, "1"))
+        file.writelines(GifImagePlugin.getdata(ritaglio_p, offset=bbox[:2],
+                                               **parametri))
+        precedente = img
+
+
+def _bbox_differenze(img: Image,
+                     altra: Image) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Calcola il rettangolo più piccolo che contiene tutti i pixel diversi tra
+    due immagini delle stesse dimensioni (considerando tutte le bande, anche
+    alpha).
+
+    :param img: prima immagine Pillow
+    :param altra: seconda immagine Pillow
+    :returns: il rettangolo (sinistra, sopra, destra, sotto), oppure None se
+              le immagini sono identiche
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    # Confrontando ogni pixel RGBA come un unico intero a 32 bit
+    diversi = (np.frombuffer(img.tobytes(), dtype=np.uint32)
+               != np.frombuffer(altra.tobytes(), dtype=np.uint32)).reshape(
+                   img.height, img.width)
+    righe = np.flatnonzero(diversi.any(axis=1))
+    if len(righe) == 0:
+        return None
+    colonne = np.flatnonzero(diversi.any(axis=0))
+    return (int(colonne[0]), int(righe[0]),
+            int(colonne[-1]) + 1, int(righe[-1]) + 1)
+
+
+def _palette_per_quantizzare(img_p: Image,
+                             trasparente: Optional[int]) -> Image:
+    """
+    Crea un'immagine che porta la palette di img_p, da usare con
+    Image.quantize() per convertire altre immagini negli stessi colori.
+    Il colore trasparente viene sostituito con un colore non presente nella
+    palette, in modo che nessun pixel opaco venga convertito in esso.
+
+    :param img_p: immagine in modalità P
+    :param trasparente: indice del colore trasparente, oppure None
+    :returns: un'immagine 1x1 in modalità P con la palette di img_p
+    """
+    colori = img_p.getpalette("RGB")
+    if trasparente is not None:
+        usati = {tuple(colori[i:i + 3]) for i in range(0, len(colori), 3)}
+        libero = next(c for c in ((r, 255 - r, r // 2) for r in range(256))
+                      if c not in usati)
+        colori[trasparente * 3:trasparente * 3 + 3] = libero
+    palette = ImageMod.new("P", (1, 1))
+    palette.putpalette(colori)
+    return palette
+
+
+@_strumentata
+def crea_apng(nome_file: str, immagini: Iterable[Immagine],
+              durata: int = 40):
+    """
+    Crea un PNG animato (APNG) partendo da una sequenza di immagini e lo
+    memorizza come file.
+
+    Come in crea_gif(), le immagini verranno riprodotte in sequenza in loop e
+    possono essere fornite anche tramite un generatore, senza tenerle tutte in
+    memoria. A differenza delle GIF, i PNG animati mantengono tutti i colori e
+    la trasparenza delle immagini.
+
+    :param nome_file: nome del file (senza estensione)
+    :param immagini: immagini da salvare come APNG, tutte delle stesse
+                     dimensioni
+    :param durata: durata in millisecondi per cui deve essere visualizzato un
+                   frame (di default, 40 millisecondi, che corrisponde a 25
+                   frame per secondo)
+    """
+    frame = _frame_animazione(immagini)
+    with open(f"{nome_file}.png", "wb") as file:
+        sequenza = 0
+        posizione_actl = 0
+        for numero, img in enumerate(frame):
+            # Ogni frame viene compresso da Pillow come un normale PNG, da cui
+            # si recuperano l'intestazione e i dati compressi
+            blocchi = _blocchi_png(img)
+            if numero == 0:
+                file.write(_FIRMA_PNG)
+                _scrivi_blocco_png(file, b"IHDR", blocchi[b"IHDR"])
+                # Il numero di frame viene corretto alla fine
+                posizione_actl = file.tell()
+                _scrivi_blocco_png(file, b"acTL", struct.pack(">II", 0, 0))
+            _scrivi_blocco_png(file, b"fcTL", struct.pack(
+                ">IIIIIHHBB", sequenza, img.width, img.height, 0, 0,
+                durata, 1000, 0, 0))
+            sequenza += 1
+            if numero == 0:
+                _scrivi_blocco_png(file, b"IDAT", blocchi[b"IDAT"])
+            else:
+                _scrivi_blocco_png(file, b"fdAT",
+                                   struct.pack(">I", sequenza)
+                                   + blocchi[b"IDAT"])
+                sequenza += 1
+        _scrivi_blocco_png(file, b"IEND", b"")
+        file.seek(posizione_actl)
+        _scrivi_blocco_png(file, b"acTL", struct.pack(">II", numero + 1, 0))
+
+
+def _frame_animazione(immagini: Iterable[Immagine]) -> Iterator[Image]:
+    """
+    Prepara le immagini di un'animazione, controllando che ce ne sia almeno
+    una (subito) e che abbiano tutte le stesse dimensioni (man mano che
+    vengono prodotte).
+
+    :param immagini: immagini dell'animazione
+    :returns: un iteratore sulle immagini Pillow
+    """
+    iteratore = iter(immagini)
+    prima = next(iteratore, None)
+    if prima is None:
         raise ValueError("La lista delle immagini non può essere vuota")
-    pil_imgs = list(map(Immagine.get_image, immagini))
-    pil_imgs[0].save(f"{nome_file}.gif", save_all=True,
-                     append_images=pil_imgs[1:],
-                     duration=durata,
-                     loop=0)   # loop 0 means "loop indefinitely"
+
+    def frame() -> Iterator[Image]:
+        dimensioni = prima.get_dimensioni()
+        yield prima.get_image()
+        for immagine in iteratore:
+            if immagine.get_dimensioni() != dimensioni:
+                raise ValueError("Le immagini di un'animazione devono avere "
+                                 "tutte le stesse dimensioni")
+            yield immagine.get_image()
+    return frame()
+
+
+def _converti_per_gif(img: Image) -> Image:
+    """
+    Converte un'immagine RGBA in un'immagine con palette (al massimo 256
+    colori), come farebbe Pillow salvando una GIF. Se uno dei colori è
+    trasparente, viene indicato in info["transparency"].
+
+    :param img: immagine Pillow in modalità RGBA
+    :returns: l'immagine Pillow in modalità P
+    """
+    img_p = img.convert("P", palette=ImageMod.Palette.ADAPTIVE)
+    if img_p.palette.mode == "RGBA":
+        for rgba, indice in img_p.palette.colors.items():
+            if rgba[3] == 0:
+                img_p.info["transparency"] = indice
+                break
+    return img_p
+
+
+def _blocchi_png(img: Image) -> Dict[bytes, bytes]:
+    """
+    Comprime un'immagine come PNG e ne ritorna i blocchi (chunk), con tutti i
+    dati compressi riuniti in un unico blocco IDAT.
+
+    :param img: immagine Pillow
+    :returns: un dizionario dal tipo del blocco ai suoi dati
+    """
+    png = BytesIO()
+    img.save(png, "PNG")
+    dati = png.getvalue()
+    blocchi: Dict[bytes, bytes] = {}
+    posizione = len(_FIRMA_PNG)
+    while posizione < len(dati):
+        lunghezza, tipo = struct.unpack(">I4s", dati[posizione:posizione + 8])
+        contenuto = dati[posizione + 8:posizione + 8 + lunghezza]
+        blocchi[tipo] = blocchi.get(tipo, b"") + contenuto
+        posizione += 12 + lunghezza  # lunghezza, tipo, dati e CRC
+    return blocchi
+
+
+def _scrivi_blocco_png(file: BinaryIO, tipo: bytes, dati: bytes):
+    """
+    Scrive un blocco (chunk) PNG su file.
+
+    :param file: file binario
+    :param tipo: tipo del blocco, ad esempio b"IDAT"
+    :param dati: contenuto del blocco
+    """
+    file.write(struct.pack(">I", len(dati)) + tipo + dati
+               + struct.pack(">I", zlib.crc32(tipo + dati)))
 
 
 def larghezza_immagine(immagine: Immagine) -> int:
@@ -272,7 +971,7 @@ def larghezza_immagine(immagine: Immagine) -> int:
     :param img: immagine di cui si vuole sapere la larghezza
     :returns: la largheza dell'immagine in pixel
     """
-    return immagine.get_image().width
+    return immagine.get_dimensioni()[0]
 
 
 def altezza_immagine(immagine: Immagine) -> int:
@@ -282,9 +981,10 @@ def altezza_immagine(immagine: Immagine) -> int:
     :param img: immagine di cui si vuole sapere l'altezza
     :returns: l'altezza dell'immagine in pixel
     """
-    return immagine.get_image().height
+    return immagine.get_dimensioni()[1]
 
 
+@_strumentata
 def rettangolo(larghezza: int, altezza: int,
                colore_riempimento: str) -> Immagine:
     """
@@ -298,10 +998,17 @@ def rettangolo(larghezza: int, altezza: int,
     """
     _valida_dimensione(larghezza)
     _valida_dimensione(altezza)
+    if _modalita_pigra:
+        vertici = ((0, 0), (larghezza - 1, 0),
+                   (larghezza - 1, altezza - 1), (0, altezza - 1))
+        return ImmaginePigra(
+            (_Poligono(vertici, colore_riempimento, _antialiasing),),
+            (larghezza, altezza))
     return Immagine(ImageMod.new(_IMAGE_MODE, (larghezza, altezza),
                                  colore_riempimento))
 
 
+@_strumentata
 def cambia_punto_riferimento(immagine: Immagine, punto_orizzontale: str,
                              punto_verticale: str) -> Immagine:
     """
@@ -318,20 +1025,38 @@ def cambia_punto_riferimento(immagine: Immagine, punto_orizzontale: str,
            rispettivamente in alto, centro o in basso
     :returns: un'immagine con il nuovo punto di riferimento
     """
+    return immagine.con_punto_riferimento(
+        _punto_riferimento(larghezza_immagine(immagine),
+                           altezza_immagine(immagine),
+                           punto_orizzontale, punto_verticale))
+
+
+def _punto_riferimento(larghezza: int, altezza: int, punto_orizzontale: str,
+                       punto_verticale: str) -> Tuple[int, int]:
+    """
+    Calcola la posizione di un punto di riferimento in un'immagine delle
+    dimensioni indicate (vedi cambia_punto_riferimento()).
+
+    :param larghezza: larghezza dell'immagine in pixel
+    :param altezza: altezza dell'immagine in pixel
+    :param punto_orizzontale: "left", "middle" o "right"
+    :param punto_verticale: "top", "middle" o "bottom"
+    :returns: le coordinate (x, y) del punto di riferimento
+    """
     x_mapping = {
         "left": 0,
-        "middle": _half(larghezza_immagine(immagine) - 1),
-        "right": larghezza_immagine(immagine)
+        "middle": _half(larghezza - 1),
+        "right": larghezza
     }
     y_mapping = {
         "top": 0,
-        "middle": _half(altezza_immagine(immagine) - 1),
-        "bottom": altezza_immagine(immagine)
+        "middle": _half(altezza - 1),
+        "bottom": altezza
     }
-    return Immagine(immagine.get_image(), (x_mapping[punto_orizzontale],
-                                           y_mapping[punto_verticale]))
+    return (x_mapping[punto_orizzontale], y_mapping[punto_verticale])
 
 
+@_strumentata
 def affianca(img_sinistra: Immagine, img_destra: Immagine) -> Immagine:
     """
     Affianca due immagini in orizzontale, posizionandole nell'immagine
@@ -346,6 +1071,7 @@ def affianca(img_sinistra: Immagine, img_destra: Immagine) -> Immagine:
                    cambia_punto_riferimento(img_destra, "left", "middle"))
 
 
+@_strumentata
 def affianca_verticale(img_sopra: Immagine, img_sotto: Immagine) -> Immagine:
     """
     Affianca due immagini in verticale, posizionandole nell'immagine
@@ -360,6 +1086,35 @@ def affianca_verticale(img_sopra: Immagine, img_sotto: Immagine) -> Immagine:
                    cambia_punto_riferimento(img_sotto, "middle", "top"))
 
 
+@_strumentata
+def affianca_molti(immagini: List[Immagine]) -> Immagine:
+    """
+    Affianca una lista di immagini in orizzontale, da sinistra a destra.
+    Il risultato è identico a quello di affianca(a, affianca(b, c)) per la
+    lista [a, b, c], ma viene allocata una sola immagine.
+
+    :param immagini: immagini da affiancare, dalla più a sinistra
+    :returns: un'immagine composta dalle immagini affiancate
+    """
+    return _componi_in_sequenza(immagini, ("right", "middle"),
+                                ("left", "middle"))
+
+
+@_strumentata
+def affianca_verticale_molti(immagini: List[Immagine]) -> Immagine:
+    """
+    Affianca una lista di immagini in verticale, dall'alto verso il basso.
+    Il risultato è identico a quello di affianca_verticale(a,
+    affianca_verticale(b, c)) per la lista [a, b, c], ma viene allocata una
+    sola immagine.
+
+    :param immagini: immagini da affiancare, dalla più in alto
+    :returns: un'immagine composta dalle immagini affiancate in verticale
+    """
+    return _componi_in_sequenza(immagini, ("middle", "bottom"),
+                                ("middle", "top"))
+
+
 def _ruota_punto(punto: Tuple[int, int], gradi: int) -> Tuple[int, int]:
     """
     Ruota un punto di un angolo `gradi` in senso antiorario usando la matrice
@@ -386,21 +1141,44 @@ def _offset_dopo_rotazione(img: Image, gradi: int) -> Tuple[int, int]:
     I pixel "trasparenti" vengono infatti eliminati quando l'immagine (ruotata)
     viene ritagliata lungo la bounding box.
 
+    Il calcolo viene svolto con NumPy sulla banda alpha. Dato che la rotazione
+    è lineare e l'arrotondamento è monotono, per ogni riga basta considerare il
+    primo e l'ultimo pixel non trasparente: gli estremi dopo la rotazione si
+    trovano necessariamente tra questi. Il risultato coincide con quello
+    ottenuto applicando _ruota_punto() a ogni pixel non trasparente.
+
     :param img: immagine da ruotare
     :param gradi: angolo di rotazione
     :returns coordinate (x, y) del pixel non trasparente più estremo in alto a
              sinistra dopo la rotazione
     """
-    pixel_coords = [(w, h) for h in range(img.height)
-                    for w in range(img.width)]
-    translated_coords = [_ruota_punto(c, gradi) for c in pixel_coords]
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    xs, ys = _contorno(img)
+    # Stesse operazioni (e stesso arrotondamento half-to-even) di _ruota_punto
+    theta = radians(-gradi)
+    ruotate_x = np.round(xs * cos(theta) - ys * sin(theta))
+    ruotate_y = np.round(xs * sin(theta) + ys * cos(theta))
+    return (int(ruotate_x.min()), int(ruotate_y.min()))
+
+
+def _contorno(img: Image) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Trova, per ogni riga dell'immagine, il primo e l'ultimo pixel non
+    trasparente. Dopo una trasformazione affine, i pixel non trasparenti più
+    estremi si trovano necessariamente tra questi.
+
+    :param img: immagine Pillow in modalità RGBA
+    :returns: coordinate x e coordinate y dei pixel trovati
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
     # In RGBA, alpha è la quarta banda
-    alpha_values = img.getdata(3)
-    filled_coords = list(filter(lambda alpha_c: alpha_c[1] != 0,
-                                zip(translated_coords, alpha_values)))
-    min_x = min([alpha_c[0][0] for alpha_c in filled_coords])
-    min_y = min([alpha_c[0][1] for alpha_c in filled_coords])
-    return (min_x, min_y)
+    pieni = np.asarray(img.getchannel(3)) != 0
+    righe = np.flatnonzero(pieni.any(axis=1))
+    primi = pieni[righe].argmax(axis=1)
+    ultimi = img.width - 1 - pieni[righe, ::-1].argmax(axis=1)
+    return (np.concatenate((primi, ultimi)), np.concatenate((righe, righe)))
 
 
 def _padding_centra_punto_rif(img: Immagine) -> Tuple[int, int, int, int]:
@@ -426,6 +1204,7 @@ def _padding_centra_punto_rif(img: Immagine) -> Tuple[int, int, int, int]:
     return (padding_top, padding_bottom, padding_left, padding_right)
 
 
+@_strumentata
 def ruota(immagine: Immagine, gradi: int) -> Immagine:
     """
     Ruota un'immagine del numero di gradi specificato in senso antiorario
@@ -434,10 +1213,38 @@ def ruota(immagine: Immagine, gradi: int) -> Immagine:
     all'immagine. Possono verificarsi piccoli errori di approssimazione dovuti
     all'uso di coordinate intere.
 
+    Quando la cache delle rotazioni è attiva (vedi attiva_cache_rotazioni()),
+    le rotazioni già calcolate vengono riutilizzate.
+
     :param img: immagine da ruotare
     :param gradi: numero di gradi con cui l'immagine deve essere ruotata
     :returns: un'immagine come quella fornita, ruotata
     """
+    if isinstance(immagine, ImmaginePigra):
+        return immagine.ruotata(gradi)
+    if _cache_rotazioni is None:
+        return _ruota_senza_cache(immagine, gradi)
+    chiave = (immagine.get_impronta(), immagine.get_punto_riferimento(),
+              gradi)
+    ruotata = _cache_rotazioni.cerca(chiave)
+    if ruotata is None:
+        ruotata = _ruota_senza_cache(immagine, gradi)
+        _cache_rotazioni.inserisci(chiave, ruotata)
+    return ruotata
+
+
+def _ruota_senza_cache(immagine: Immagine, gradi: int) -> Immagine:
+    """
+    Implementazione di ruota(), senza passare dalla cache delle rotazioni.
+
+    :param immagine: immagine da ruotare
+    :param gradi: numero di gradi con cui l'immagine deve essere ruotata
+    :returns: un'immagine come quella fornita, ruotata
+    """
+    if gradi % 90 == 0:
+        ruotata = _ruota_angolo_retto(immagine, gradi)
+        if ruotata is not None:
+            return ruotata
 
     # Quando la rotazione non è attorno al centro, Pillow non gestisce
     # correttamente l'espansione dell'immagine. Più specificamente, Pillow
@@ -488,6 +1295,42 @@ def ruota(immagine: Immagine, gradi: int) -> Immagine:
                     translated_rotated_rif)
 
 
+def _ruota_angolo_retto(immagine: Immagine,
+                        gradi: int) -> Optional[Immagine]:
+    """
+    Ruota un'immagine di un multiplo di 90 gradi con Image.transpose(), senza
+    padding e senza calcolare l'offset pixel per pixel. Il risultato è
+    identico a quello del caso generale di _ruota_senza_cache(): per questi
+    angoli anche Image.rotate() usa transpose(), e le rotazioni di un punto
+    sono esatte, per cui il nuovo punto di riferimento si ricava direttamente
+    dalla bounding box dell'immagine originale.
+
+    :param immagine: immagine da ruotare
+    :param gradi: un multiplo di 90
+    :returns: l'immagine ruotata, oppure None se l'immagine è completamente
+              trasparente (caso lasciato all'implementazione generale)
+    """
+    img = immagine.get_image()
+    bbox = img.getbbox()
+    if bbox is None:
+        return None
+    sinistra, alto, destra, basso = bbox
+    rif_x, rif_y = immagine.get_punto_riferimento()
+    quarti = gradi // 90 % 4
+    img = img.crop(bbox)
+    if quarti == 0:
+        return Immagine(img, (rif_x - sinistra, rif_y - alto))
+    if quarti == 1:
+        return Immagine(img.transpose(ImageMod.Transpose.ROTATE_90),
+                        (rif_y - alto, destra - 1 - rif_x))
+    if quarti == 2:
+        return Immagine(img.transpose(ImageMod.Transpose.ROTATE_180),
+                        (destra - 1 - rif_x, basso - 1 - rif_y))
+    return Immagine(img.transpose(ImageMod.Transpose.ROTATE_270),
+                    (basso - 1 - rif_y, rif_x - sinistra))
+
+
+@_strumentata
 def sovrapponi(img_primopiano: Immagine,
                img_secondopiano: Immagine) -> Immagine:
     """
@@ -504,6 +1347,22 @@ def sovrapponi(img_primopiano: Immagine,
         cambia_punto_riferimento(img_secondopiano, "middle", "middle"))
 
 
+@_strumentata
+def sovrapponi_molti(immagini: List[Immagine]) -> Immagine:
+    """
+    Sovrappone una lista di immagini usando i rispettivi centri, con la prima
+    immagine in primo piano e l'ultima sullo sfondo.
+    Il risultato è identico a quello di sovrapponi(a, sovrapponi(b, c)) per la
+    lista [a, b, c], ma viene allocata una sola immagine.
+
+    :param immagini: immagini da sovrapporre, dalla più in primo piano
+    :returns: un'immagine contenente le immagini fornite sovrapposte
+    """
+    return _componi_in_sequenza(immagini, ("middle", "middle"),
+                                ("middle", "middle"))
+
+
+@_strumentata
 def componi(img_pp: Immagine, img_sp: Immagine) -> Immagine:
     """
     Compone due immagini (tenendo la prima in primo piano e la seconda in
@@ -516,27 +1375,178 @@ def componi(img_pp: Immagine, img_sp: Immagine) -> Immagine:
     :param img_secondopiano: immagine da mettere in secondo piano
     :returns: un'immagine composta con le due immagini fornite
     """
-    img_pp_rif = img_pp.get_punto_riferimento()
-    img_sp_rif = img_sp.get_punto_riferimento()
-    sopra = max(img_pp_rif[1],
-                img_sp_rif[1])
-    sotto = max(altezza_immagine(img_pp) - img_pp_rif[1],
-                altezza_immagine(img_sp) - img_sp_rif[1])
-    sinistra = max(img_pp.get_punto_riferimento()[0],
-                   img_sp.get_punto_riferimento()[0])
-    destra = max(larghezza_immagine(img_pp) - img_pp_rif[0],
-                 larghezza_immagine(img_sp) - img_sp_rif[0])
-    img_ris = ImageMod.new(_IMAGE_MODE, (sinistra + destra, sopra + sotto),
-                           _TRANSPARENT_COLOR)
-    img_ris.paste(img_sp.get_image(),
-                  (sinistra - img_sp_rif[0],
-                   sopra - img_sp_rif[1]))
-    img_ris.alpha_composite(img_pp.get_image(),
-                            (sinistra - img_pp_rif[0],
-                             sopra - img_pp_rif[1]))
-    return Immagine(img_ris, (sinistra, sopra))
+    return componi_molti([img_pp, img_sp])
+
+
+@_strumentata
+def componi_molti(immagini: List[Immagine],
+                  sfondo: Optional[Immagine] = None) -> Immagine:
+    """
+    Compone una lista di immagini allineando i rispettivi punti di
+    riferimento, con la prima immagine in primo piano e l'ultima sullo
+    sfondo.
+
+    Il risultato è identico a quello di componi(a, componi(b, c)) per la
+    lista [a, b, c], ma l'immagine risultante viene allocata una sola volta
+    (invece di una per ogni chiamata a componi()).
+    Quando i pixel delle immagini che si sovrappongono sono opachi o
+    completamente trasparenti, come nelle forme di base, il risultato è
+    identico anche a quello di componi(componi(a, b), c).
+
+    Se viene indicato uno sfondo, le immagini vengono prima composte tra loro
+    e poi sovrapposte allo sfondo: il risultato è identico a quello di
+    componi(componi_molti(immagini), sfondo), anche quando i pixel sono
+    semitrasparenti. È il caso delle lancette di un orologio sul quadrante:
+    quando le immagini non sporgono dallo sfondo, vengono composte in
+    un'immagine grande quanto il rettangolo che le contiene e lo sfondo
+    viene copiato una sola volta.
+
+    :param immagini: immagini da comporre, dalla più in primo piano
+    :param sfondo: facoltativamente, l'immagine su cui sovrapporre le altre
+    :returns: un'immagine composta con le immagini fornite
+    """
+    if sfondo is not None:
+        return _componi_su_sfondo(immagini, sfondo)
+    if len(immagini) == 0:
+        return immagine_vuota()
+    dimensioni, rif, posizioni = _disponi(
+        [(immagine.get_dimensioni(), immagine.get_punto_riferimento())
+         for immagine in immagini])
+    return _assembla(dimensioni, rif, immagini, posizioni)
+
+
+def _componi_su_sfondo(immagini: List[Immagine],
+                       sfondo: Immagine) -> Immagine:
+    """
+    Compone delle immagini tra loro e poi con uno sfondo (vedi
+    componi_molti()).
+
+    :param immagini: immagini da comporre, dalla più in primo piano
+    :param sfondo: l'immagine su cui sovrapporre le altre
+    :returns: l'immagine composta
+    """
+    if len(immagini) == 0:
+        return sfondo
+    dimensioni, rif, posizioni = _disponi(
+        [(immagine.get_dimensioni(), immagine.get_punto_riferimento())
+         for immagine in immagini])
+    rif_sfondo = sfondo.get_punto_riferimento()
+    sinistra = rif_sfondo[0] - rif[0]
+    alto = rif_sfondo[1] - rif[1]
+    larghezza, altezza = sfondo.get_dimensioni()
+    if (sinistra < 0 or alto < 0 or sinistra + dimensioni[0] > larghezza
+            or alto + dimensioni[1] > altezza
+            or isinstance(sfondo, ImmaginePigra)
+            or any(isinstance(immagine, ImmaginePigra)
+                   for immagine in immagini)):
+        return componi(_assembla(dimensioni, rif, immagini, posizioni),
+                       sfondo)
+    img = sfondo.get_image().copy()
+    img.alpha_composite(_rasterizza(dimensioni, immagini, posizioni),
+                        (sinistra, alto))
+    return Immagine(img, rif_sfondo)
+
+
+def _disponi(livelli: List[Tuple[Tuple[int, int], Tuple[int, int]]]) \
+        -> Tuple[Tuple[int, int], Tuple[int, int], List[Tuple[int, int]]]:
+    """
+    Calcola come disporre delle immagini in modo che i rispettivi punti di
+    riferimento coincidano.
+
+    :param livelli: dimensioni e punto di riferimento di ogni immagine
+    :returns: dimensioni dell'immagine risultante, suo punto di riferimento e
+              posizione (dell'angolo in alto a sinistra) di ogni immagine
+    """
+    sopra = max(rif[1] for _, rif in livelli)
+    sotto = max(dim[1] - rif[1] for dim, rif in livelli)
+    sinistra = max(rif[0] for _, rif in livelli)
+    destra = max(dim[0] - rif[0] for dim, rif in livelli)
+    posizioni = [(sinistra - rif[0], sopra - rif[1]) for _, rif in livelli]
+    return (sinistra + destra, sopra + sotto), (sinistra, sopra), posizioni
 
 
+def _componi_in_sequenza(immagini: List[Immagine],
+                         punto_pp: Tuple[str, str],
+                         punto_sp: Tuple[str, str]) -> Immagine:
+    """
+    Equivale a comporre le immagini a due a due partendo dalle ultime, come in
+    componi(cambia_punto_riferimento(a, *punto_pp),
+    cambia_punto_riferimento(componi(...), *punto_sp)), ma calcolando solo
+    la disposizione delle immagini e allocando una sola immagine risultante.
+
+    :param immagini: immagini da comporre, dalla più in primo piano
+    :param punto_pp: punto di riferimento (orizzontale, verticale) usato per
+                     l'immagine in primo piano a ogni passo
+    :param punto_sp: punto di riferimento (orizzontale, verticale) usato per
+                     il risultato dei passi precedenti
+    :returns: un'immagine composta con le immagini fornite
+    """
+    if len(immagini) == 0:
+        return immagine_vuota()
+    if len(immagini) == 1:
+        return immagini[0]
+    dimensioni = immagini[-1].get_dimensioni()
+    posizioni = [(0, 0)]
+    for immagine in reversed(immagini[:-1]):
+        dimensioni_pp = immagine.get_dimensioni()
+        dimensioni, rif, (pos_pp, pos_sp) = _disponi([
+            (dimensioni_pp, _punto_riferimento(*dimensioni_pp, *punto_pp)),
+            (dimensioni, _punto_riferimento(*dimensioni, *punto_sp))])
+        posizioni = [pos_pp] + [(x + pos_sp[0], y + pos_sp[1])
+                                for x, y in posizioni]
+    return _assembla(dimensioni, rif, immagini, posizioni)
+
+
+def _assembla(dimensioni: Tuple[int, int], rif: Tuple[int, int],
+              immagini: List[Immagine],
+              posizioni: List[Tuple[int, int]]) -> Immagine:
+    """
+    Crea l'immagine risultante da una composizione, date le dimensioni, il
+    punto di riferimento e la posizione di ogni immagine.
+    Se almeno una delle immagini è pigra, anche il risultato è pigro e non
+    viene disegnato alcun pixel.
+
+    :param dimensioni: dimensioni dell'immagine risultante
+    :param rif: punto di riferimento dell'immagine risultante
+    :param immagini: immagini da comporre, dalla più in primo piano
+    :param posizioni: posizione dell'angolo in alto a sinistra di ogni
+                      immagine
+    :returns: l'immagine composta
+    """
+    if any(isinstance(immagine, ImmaginePigra) for immagine in immagini):
+        forme: List[_Forma] = []
+        for immagine, (x, y) in zip(reversed(immagini), reversed(posizioni)):
+            traslazione = _matrice_traslazione(x, y)
+            forme.extend(forma.trasformata(traslazione)
+                         for forma in _forme(immagine))
+        return ImmaginePigra(tuple(forme), dimensioni, rif)
+    return Immagine(_rasterizza(dimensioni, immagini, posizioni), rif)
+
+
+def _rasterizza(dimensioni: Tuple[int, int], immagini: List[Immagine],
+                posizioni: List[Tuple[int, int]]) -> Image:
+    """
+    Crea una nuova immagine Pillow e vi disegna le immagini fornite nelle
+    posizioni indicate, dall'ultima (sullo sfondo) alla prima (in primo
+    piano).
+
+    :param dimensioni: dimensioni dell'immagine da creare
+    :param immagini: immagini da disegnare, dalla più in primo piano
+    :param posizioni: posizione dell'angolo in alto a sinistra di ogni
+                      immagine
+    :returns: l'immagine Pillow risultante
+    """
+    img_ris = ImageMod.new(_IMAGE_MODE, dimensioni, _TRANSPARENT_COLOR)
+    # L'immagine sullo sfondo viene copiata così com'è, le altre vengono
+    # sovrapposte tenendo conto della trasparenza
+    img_ris.paste(immagini[-1].get_image(), posizioni[-1])
+    for immagine, posizione in zip(reversed(immagini[:-1]),
+                                   reversed(posizioni[:-1])):
+        img_ris.alpha_composite(immagine.get_image(), posizione)
+    return img_ris
+
+
+@_strumentata
 def immagine_vuota() -> Immagine:
     """
     Crea un'immagine vuota.
@@ -546,9 +1556,12 @@ def immagine_vuota() -> Immagine:
 
     :returns: un'immagine vuota di larghezza e altezza 0 pixel.
     """
+    if _modalita_pigra:
+        return ImmaginePigra((), (0, 0))
     return Immagine(ImageMod.new(_IMAGE_MODE, (0, 0)))
 
 
+@_strumentata
 def scena_vuota(larghezza: int, altezza: int) -> Immagine:
     """
     Crea un'immagine trasparente delle dimensioni indicate.
@@ -559,10 +1572,13 @@ def scena_vuota(larghezza: int, altezza: int) -> Immagine:
     """
     _valida_dimensione(larghezza)
     _valida_dimensione(altezza)
+    if _modalita_pigra:
+        return ImmaginePigra((), (larghezza, altezza))
     return Immagine(ImageMod.new(_IMAGE_MODE, (larghezza, altezza),
                                  _TRANSPARENT_COLOR))
 
 
+@_strumentata
 def testo(contenuto: str, punti: int, colore: str) -> Immagine:
     """
     Crea un'immagine con il testo indicato visualizzato usando il font Arial
@@ -577,20 +1593,19 @@ def testo(contenuto: str, punti: int, colore: str) -> Immagine:
     :param colore: colore per il testo
     :returns: un'immagine con il testo
     """
-    lista_font = ["arial.ttf", "Arial.ttf"]
-    i = 0
-    font = None
-    while i < len(lista_font) and font is None:
-        font = _ottieni_font_se_disponibile(lista_font[i], punti)
-        i += 1
-    if font is None:
-        font = ImageFontMod.load_default()
-    img = ImageMod.new(_IMAGE_MODE, font.getsize(contenuto))
+    font = _font_testo(punti)
+    dimensioni = _dimensioni_testo(font, contenuto)
+    if _atlante_glifi is not None:
+        img = _componi_glifi(font, contenuto, colore, dimensioni)
+        if img is not None:
+            return Immagine(img)
+    img = ImageMod.new(_IMAGE_MODE, dimensioni)
     draw = ImageDraw.Draw(img)
     draw.text((0, 0), contenuto, fill=colore, font=font)
     return Immagine(img)
 
 
+@_strumentata
 def cerchio(raggio: int, colore_riempimento: str) -> Immagine:
     """
     Crea un cerchio avente il raggio indicato, riempito con un colore.
@@ -602,12 +1617,18 @@ def cerchio(raggio: int, colore_riempimento: str) -> Immagine:
     """
     _valida_dimensione(raggio)
     lato = raggio * 2
+    forma = _Cerchio((0, 0), lato, colore_riempimento, _antialiasing)
+    if _modalita_pigra:
+        return ImmaginePigra((forma,), (lato, lato))
+    if _antialiasing > 1:
+        return Immagine(_disegna_forme((forma,), (lato, lato)))
     img = ImageMod.new(_IMAGE_MODE, (lato, lato), _TRANSPARENT_COLOR)
     draw = ImageDraw.Draw(img)
     draw.ellipse([(0, 0), img.size], fill=colore_riempimento)
     return Immagine(img)
 
 
+@_strumentata
 def settore_circolare(raggio: int, angolo: int,
                       colore_riempimento: str) -> Immagine:
     """
@@ -630,11 +1651,20 @@ def settore_circolare(raggio: int, angolo: int,
     _valida_dimensione(raggio)
     lato = raggio * 2
     img = ImageMod.new(_IMAGE_MODE, (lato, lato), _TRANSPARENT_COLOR)
+    if _antialiasing > 1:
+        fattore = _antialiasing
+        _disegna_sovracampionato(
+            img, colore_riempimento, (0, 0, lato, lato), fattore,
+            lambda draw, _sinistra, _alto: draw.pieslice(
+                [(0, 0), (lato * fattore - 1, lato * fattore - 1)], 0,
+                angolo, fill=255))
+        return Immagine(img).ritaglia_bounding_box()
     draw = ImageDraw.Draw(img)
     draw.pieslice([(0, 0), img.size], 0, angolo, fill=colore_riempimento)
     return Immagine(img).ritaglia_bounding_box()
 
 
+@_strumentata
 def triangolo(lato: int, colore_riempimento: str) -> Immagine:
     """
     Crea un triangolo equilatero con la punta verso l'alto avente il lato
@@ -647,15 +1677,482 @@ def triangolo(lato: int, colore_riempimento: str) -> Immagine:
     """
     _valida_dimensione(lato)
     altezza = round(lato * sqrt(3) / 2)
-    img = ImageMod.new(_IMAGE_MODE, (lato, altezza), _TRANSPARENT_COLOR)
-    draw = ImageDraw.Draw(img)
     p_sottosx = (0, altezza)
     p_alto = (round(lato / 2), 0)
     p_sottodx = (lato, altezza)
+    if _antialiasing > 1:
+        # Con l'antialiasing il triangolo copre interamente i pixel dei
+        # vertici, per cui non sporge oltre i bordi
+        vertici = ((0, altezza - 1), p_alto, (lato - 1, altezza - 1))
+        pigra = ImmaginePigra(
+            (_Poligono(vertici, colore_riempimento, _antialiasing),),
+            (lato, altezza))
+        return pigra if _modalita_pigra else Immagine(pigra.get_image())
+    img = ImageMod.new(_IMAGE_MODE, (lato, altezza), _TRANSPARENT_COLOR)
+    draw = ImageDraw.Draw(img)
     draw.polygon([p_sottosx, p_alto, p_sottodx], fill=colore_riempimento)
+    if _modalita_pigra:
+        # Il poligono sporge oltre i bordi dell'immagine, che lo tagliano:
+        # per avere gli stessi pixel, la forma pigra è l'immagine stessa
+        return ImmaginePigra((_Raster(img, _IDENTITA, _contorno(img)),),
+                             (lato, altezza))
     return Immagine(img)
 
 
+@_strumentata
+def poligono_ruotato(vertici: List[Tuple[int, int]], perno: Tuple[int, int],
+                     gradi: int, colore_riempimento: str) -> Immagine:
+    """
+    Crea un poligono con i vertici indicati, ruotato in senso antiorario
+    attorno al perno e riempito con un colore. Il perno diventa il punto di
+    riferimento dell'immagine.
+
+    Il risultato è simile a quello ottenuto disegnando il poligono e
+    ruotandolo con ruota(), ma non identico: il poligono viene disegnato
+    direttamente ruotato e il punto di riferimento viene calcolato
+    analiticamente, senza ruotare alcun pixel, per cui i pixel lungo i bordi,
+    le dimensioni e il punto di riferimento possono differire di un pixel.
+
+    :param vertici: vertici del poligono (almeno tre), come coordinate (x, y)
+                    in pixel; i vertici fanno parte del poligono
+    :param perno: centro di rotazione, nelle stesse coordinate dei vertici
+    :param gradi: angolo di rotazione in senso antiorario
+    :param colore_riempimento: stringa che indica il colore con cui riempire il
+                               poligono
+    :returns: un'immagine contenente il poligono ruotato
+    """
+    if len(vertici) < 3:
+        raise ValueError("Un poligono deve avere almeno tre vertici")
+    ruotato = _ruota_forme(
+        (_Poligono(tuple(vertici), colore_riempimento, _antialiasing),),
+        perno, gradi)
+    if _modalita_pigra:
+        return ruotato
+    return Immagine(ruotato.get_image(), ruotato.get_punto_riferimento())
+
+
+@_strumentata
+def rettangolo_ruotato(larghezza: int, altezza: int, perno: Tuple[int, int],
+                       gradi: int, colore_riempimento: str) -> Immagine:
+    """
+    Crea un rettangolo delle dimensioni indicate, ruotato in senso antiorario
+    attorno al perno e riempito con un colore. Il perno diventa il punto di
+    riferimento dell'immagine (vedi poligono_ruotato()).
+
+    Ad esempio, rettangolo_ruotato(30, 10, (5, 5), 45, "black") equivale a
+    ruotare di 45 gradi un rettangolo 30x10 il cui punto di riferimento è a 5
+    pixel dal bordo sinistro e dal bordo superiore.
+
+    :param larghezza: larghezza del rettangolo in pixel
+    :param altezza: altezza del rettangolo in pixel
+    :param perno: centro di rotazione, rispetto all'angolo in alto a sinistra
+                  del rettangolo
+    :param gradi: angolo di rotazione in senso antiorario
+    :param colore_riempimento: stringa che indica il colore con cui riempire il
+                               rettangolo
+    :returns: un'immagine contenente il rettangolo ruotato
+    """
+    _valida_dimensione(larghezza)
+    _valida_dimensione(altezza)
+    return poligono_ruotato([(0, 0), (larghezza - 1, 0),
+                             (larghezza - 1, altezza - 1), (0, altezza - 1)],
+                            perno, gradi, colore_riempimento)
+
+
+@_strumentata
+def disegna_poligono_ruotato(scena: Immagine, vertici: List[Tuple[int, int]],
+                             perno: Tuple[int, int], gradi: int,
+                             colore_riempimento: str) -> Immagine:
+    """
+    Disegna un poligono ruotato (vedi poligono_ruotato()) sopra un'immagine
+    esistente, facendo coincidere il perno con il punto di riferimento
+    dell'immagine. Le parti del poligono che escono dall'immagine vengono
+    tagliate.
+
+    Il poligono viene disegnato direttamente sui pixel dell'immagine (di cui
+    viene fatta una sola copia, in modo da lasciare invariata quella
+    originale), senza creare un'immagine per il poligono e senza comporle.
+
+    :param scena: immagine su cui disegnare il poligono
+    :param vertici: vertici del poligono (almeno tre), in pixel
+    :param perno: centro di rotazione, nelle stesse coordinate dei vertici
+    :param gradi: angolo di rotazione in senso antiorario
+    :param colore_riempimento: stringa che indica il colore con cui riempire il
+                               poligono
+    :returns: l'immagine con il poligono disegnato sopra
+    """
+    if len(vertici) < 3:
+        raise ValueError("Un poligono deve avere almeno tre vertici")
+    rif = scena.get_punto_riferimento()
+    matrice = _prodotto(
+        _matrice_traslazione(rif[0] - perno[0], rif[1] - perno[1]),
+        _matrice_rotazione(perno, gradi))
+    poligono = _Poligono(tuple(vertici), colore_riempimento,
+                         _antialiasing).trasformata(matrice)
+    if isinstance(scena, ImmaginePigra):
+        return ImmaginePigra(scena.forme + (poligono,),
+                             scena.get_dimensioni(), rif)
+    img = scena.get_image().copy()
+    poligono.disegna(img)
+    return Immagine(img, rif)
+
+
+@_strumentata
+def anello_radiale(elemento: Immagine, n: int, raggio: int = 0) -> Immagine:
+    """
+    Dispone n copie di un'immagine attorno a un centro, ruotandole in senso
+    antiorario a intervalli regolari di 360 / n gradi (la prima copia non è
+    ruotata ed è in primo piano). Il punto di riferimento di ogni copia si
+    trova a distanza `raggio` dal centro, che diventa il punto di riferimento
+    del risultato; la prima copia si trova a destra del centro.
+
+    Con raggio 0, il risultato è equivalente (a meno di un pixel lungo i
+    bordi) a comporre le immagini ruotate con ruota():
+
+        componi_molti([ruota(elemento, i * 360 // n) for i in range(n)])
+
+    ma tutte le copie vengono disegnate direttamente nell'immagine finale,
+    trasformandone la geometria: le forme di un'immagine pigra (vedi
+    modalita_pigra()) vengono disegnate già ruotate, senza ruotare alcun
+    pixel. In modalità pigra anche il risultato è un'immagine pigra.
+
+    :param elemento: immagine da ripetere
+    :param n: numero di copie
+    :param raggio: distanza in pixel del punto di riferimento di ogni copia
+                   dal centro
+    :returns: un'immagine con le n copie disposte ad anello
+    """
+    _valida_dimensione(n)
+    forme = _forme(elemento)
+    if len(forme) == 0:
+        raise ValueError("Impossibile disporre ad anello un'immagine "
+                         "completamente trasparente")
+    rif_x, rif_y = elemento.get_punto_riferimento()
+    centro = (rif_x - raggio, rif_y)
+    # Dall'ultima copia (sullo sfondo) alla prima (in primo piano)
+    copie = tuple(forma.trasformata(_matrice_rotazione(centro, i * 360 / n))
+                  for i in reversed(range(n)) for forma in forme)
+    anello = _ritaglia_forme(copie, centro)
+    if _modalita_pigra:
+        return anello
+    return Immagine(anello.get_image(), anello.get_punto_riferimento())
+
+
+def attiva_cache_rotazioni(max_voci: int = 512,
+                           max_byte: int = 256 * 1024 * 1024):
+    """
+    Attiva la cache delle rotazioni usata da ruota().
+
+    Ruotare un'immagine è un'operazione costosa, ma il risultato dipende solo
+    dal contenuto dell'immagine, dal suo punto di riferimento e dall'angolo:
+    con la cache attiva, ruotare di nuovo la stessa immagine dello stesso
+    angolo non richiede alcun calcolo. Il contenuto viene riconosciuto
+    tramite la sua impronta (vedi Immagine.get_impronta()), che viene
+    calcolata una sola volta per ogni immagine e non a ogni rotazione; le
+    immagini restituite dalla cache sono condivise, ma non possono essere
+    modificate.
+    La cache scarta le rotazioni usate meno di recente quando supera il
+    numero massimo di voci o di byte indicato.
+    Se la cache è già attiva, vengono solo aggiornati i limiti.
+
+    :param max_voci: numero massimo di rotazioni memorizzate
+    :param max_byte: dimensione massima (in byte) dei pixel memorizzati
+    """
+    global _cache_rotazioni  # pylint: disable=global-statement
+    _valida_dimensione(max_voci)
+    _valida_dimensione(max_byte)
+    if _cache_rotazioni is None:
+        _cache_rotazioni = _CacheLRU(max_voci, max_byte)
+    else:
+        _cache_rotazioni.cambia_limiti(max_voci, max_byte)
+
+
+def disattiva_cache_rotazioni():
+    """
+    Disattiva la cache delle rotazioni, liberando la memoria che occupa.
+    """
+    global _cache_rotazioni  # pylint: disable=global-statement
+    _cache_rotazioni = None
+
+
+def svuota_cache_rotazioni():
+    """
+    Svuota la cache delle rotazioni (se attiva) e ne azzera le statistiche.
+    """
+    if _cache_rotazioni is not None:
+        _cache_rotazioni.svuota()
+
+
+def statistiche_cache_rotazioni() -> Dict[str, int]:
+    """
+    Ritorna le statistiche della cache delle rotazioni.
+
+    :returns: un dizionario con il numero di rotazioni trovate nella cache
+              ("hit") e non trovate ("miss"), il numero di voci memorizzate
+              ("voci") e i byte che occupano ("byte"); quando la cache non è
+              attiva, tutti i valori sono 0
+    """
+    if _cache_rotazioni is None:
+        return {"hit": 0, "miss": 0, "voci": 0, "byte": 0}
+    return _cache_rotazioni.statistiche()
+
+
+def attiva_atlante_glifi(max_voci: int = 1024,
+                         max_byte: int = 16 * 1024 * 1024):
+    """
+    Attiva l'atlante dei glifi usato da testo().
+
+    Con l'atlante attivo, ogni carattere viene disegnato una sola volta per
+    ogni font e dimensione, qualunque sia il colore; i testi vengono poi
+    composti incollando i glifi già pronti, il che conviene quando si
+    disegnano molte volte le stesse cifre (ad esempio i numeri di un
+    orologio o un orario digitale).
+    Il risultato è identico a quello ottenuto senza atlante: i testi per cui
+    non è possibile comporre i glifi separatamente (ad esempio per la
+    crenatura del font) vengono disegnati per intero.
+    Se l'atlante è già attivo, vengono solo aggiornati i limiti.
+
+    :param max_voci: numero massimo di glifi memorizzati
+    :param max_byte: dimensione massima (in byte) dei glifi memorizzati
+    """
+    global _atlante_glifi  # pylint: disable=global-statement
+    _valida_dimensione(max_voci)
+    _valida_dimensione(max_byte)
+    if _atlante_glifi is None:
+        _atlante_glifi = _CacheLRU(max_voci, max_byte)
+    else:
+        _atlante_glifi.cambia_limiti(max_voci, max_byte)
+
+
+def disattiva_atlante_glifi():
+    """
+    Disattiva l'atlante dei glifi, liberando la memoria che occupa.
+    """
+    global _atlante_glifi  # pylint: disable=global-statement
+    _atlante_glifi = None
+    _lunghezze_glifi.clear()
+
+
+def statistiche_atlante_glifi() -> Dict[str, int]:
+    """
+    Ritorna le statistiche dell'atlante dei glifi.
+
+    :returns: un dizionario con il numero di glifi trovati nell'atlante
+              ("hit") e non trovati ("miss"), il numero di glifi memorizzati
+              ("voci") e i byte che occupano ("byte"); quando l'atlante non è
+              attivo, tutti i valori sono 0
+    """
+    if _atlante_glifi is None:
+        return {"hit": 0, "miss": 0, "voci": 0, "byte": 0}
+    return _atlante_glifi.statistiche()
+
+
+def attiva_profilazione():
+    """
+    Attiva la profilazione delle funzioni della libreria, azzerando le misure
+    raccolte in precedenza.
+
+    Per ogni funzione pubblica (tranne quelle banali, come
+    larghezza_immagine(), il cui costo sarebbe dominato dalla misura)
+    vengono misurati il numero di chiamate, il tempo totale (incluse le
+    funzioni chiamate), il tempo proprio (escluse le altre funzioni
+    misurate), i pixel delle immagini prodotte e l'immagine più grande
+    prodotta. I pixel vengono attribuiti solo alla funzione chiamata
+    dall'esterno della libreria, non a quelle che essa chiama a sua volta,
+    e sono escluse le immagini che condividono i pixel di un argomento, come
+    fa cambia_punto_riferimento().
+    Il tempo di una funzione che riceve un iteratore, come crea_gif(),
+    comprende anche il tempo necessario a produrne gli elementi.
+    """
+    global _profilazione  # pylint: disable=global-statement
+    _profilazione = _Profilazione()
+
+
+def disattiva_profilazione():
+    """
+    Disattiva la profilazione; le misure raccolte restano disponibili tramite
+    risultati_profilazione() fino alla prossima attivazione.
+    """
+    # pylint: disable=global-statement
+    global _profilazione, _ultima_profilazione
+    if _profilazione is not None:
+        _ultima_profilazione = _profilazione
+    _profilazione = None
+
+
+def risultati_profilazione() -> Dict[str, Dict[str, Any]]:
+    """
+    Ritorna le misure raccolte dalla profilazione attiva (oppure
+    dall'ultima profilazione, se non è attiva).
+
+    :returns: un dizionario che associa al nome di ogni funzione chiamata un
+              dizionario con numero di chiamate ("chiamate"), tempo totale e
+              tempo proprio in secondi ("tempo" e "tempo_proprio"), pixel
+              delle immagini prodotte ("pixel") e dimensioni dell'immagine più
+              grande prodotta ("picco")
+    """
+    profilazione = _profilazione or _ultima_profilazione
+    if profilazione is None:
+        return {}
+    return profilazione.risultati()
+
+
+def tabella_profilazione(
+        risultati: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """
+    Formatta le misure della profilazione come una tabella di testo, ordinata
+    per tempo proprio decrescente.
+
+    :param risultati: misure da formattare (come quelle ritornate da
+                      risultati_profilazione()); se non indicate, vengono
+                      usate quelle della profilazione attiva o dell'ultima
+    :returns: la tabella
+    """
+    if risultati is None:
+        risultati = risultati_profilazione()
+    righe = [f"{'funzione':<32}{'chiamate':>10}{'tempo (ms)':>12}"
+             f"{'proprio (ms)':>14}{'pixel':>14}{'picco':>12}"]
+    for nome, misure in sorted(risultati.items(),
+                               key=lambda voce: -voce[1]["tempo_proprio"]):
+        larghezza, altezza = misure["picco"]
+        righe.append(f"{nome:<32}{misure['chiamate']:>10}"
+                     f"{misure['tempo'] * 1000:>12.2f}"
+                     f"{misure['tempo_proprio'] * 1000:>14.2f}"
+                     f"{misure['pixel']:>14}"
+                     f"{f'{larghezza}x{altezza}':>12}")
+    return "\n".join(righe)
+
+
+def profilazione_json(
+        risultati: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """
+    Esporta le misure della profilazione in formato JSON.
+
+    :param risultati: misure da esportare (come quelle ritornate da
+                      risultati_profilazione()); se non indicate, vengono
+                      usate quelle della profilazione attiva o dell'ultima
+    :returns: il documento JSON
+    """
+    import json  # pylint: disable=import-outside-toplevel
+    if risultati is None:
+        risultati = risultati_profilazione()
+    return json.dumps(risultati, indent=2, sort_keys=True)
+
+
+@contextmanager
+def profilazione() -> Iterator[Dict[str, Dict[str, Any]]]:
+    """
+    Profila le funzioni della libreria chiamate all'interno di un blocco with
+    (vedi attiva_profilazione()).
+    Il dizionario fornito dal blocco with viene riempito con le misure (come
+    quelle ritornate da risultati_profilazione()) all'uscita dal blocco.
+    Le misure vengono aggiunte anche a un'eventuale profilazione già attiva.
+
+    Ad esempio:
+
+        with profilazione() as risultati:
+            crea_orologio(4, 10)
+        print(tabella_profilazione(risultati))
+
+    :returns: un context manager
+    """
+    global _profilazione  # pylint: disable=global-statement
+    precedente = _profilazione
+    attuale = _Profilazione()
+    risultati: Dict[str, Dict[str, Any]] = {}
+    _profilazione = attuale
+    try:
+        yield risultati
+    finally:
+        _profilazione = precedente
+        if precedente is not None:
+            precedente.aggiungi(attuale)
+        risultati.update(attuale.risultati())
+
+
+@contextmanager
+def modalita_pigra(attiva: bool = True) -> Iterator[None]:
+    """
+    Attiva la modalità pigra all'interno di un blocco with.
+
+    In modalità pigra, rettangolo(), cerchio(), triangolo(), scena_vuota() e
+    immagine_vuota() non disegnano alcun pixel, ma creano immagini pigre che
+    descrivono le forme geometricamente. Ruotare, affiancare, sovrapporre o
+    comporre immagini pigre crea altre immagini pigre, trasformando solo la
+    geometria: dimensioni e punti di riferimento sono calcolati senza
+    disegnare nulla.
+    I pixel vengono disegnati una sola volta, direttamente nell'immagine
+    finale, solo quando servono (ad esempio in salva_immagine(),
+    visualizza_immagine() o crea_gif()). Le immagini pigre rimangono pigre
+    anche dopo l'uscita dal blocco with.
+
+    Rispetto alle stesse immagini create normalmente, i bordi delle forme
+    ruotate possono differire di un pixel.
+
+    Esempio::
+
+        with modalita_pigra():
+            img = ruota(affianca(rettangolo(10, 20, "red"),
+                                 cerchio(10, "blue")), 30)
+        salva_immagine("esempio", img)
+
+    :param attiva: False per disattivare la modalità pigra all'interno del
+                   blocco (ad esempio in una funzione che ha bisogno dei pixel)
+    """
+    global _modalita_pigra  # pylint: disable=global-statement
+    precedente = _modalita_pigra
+    _modalita_pigra = attiva
+    try:
+        yield
+    finally:
+        _modalita_pigra = precedente
+
+
+@contextmanager
+def modalita_antialiasing(fattore: int = 4) -> Iterator[None]:
+    """
+    Attiva l'antialiasing all'interno di un blocco with.
+
+    Con l'antialiasing, cerchio(), settore_circolare(), triangolo(),
+    poligono_ruotato(), rettangolo_ruotato() e disegna_poligono_ruotato()
+    disegnano bordi sfumati: ogni forma viene disegnata `fattore` volte più
+    grande in una maschera, limitata al rettangolo che la contiene, e poi
+    ridotta alle dimensioni finali con una media dei pixel. Tutto il resto
+    (composizione, rotazioni, salvataggio) avviene alle dimensioni finali,
+    per cui il costo aggiuntivo è limitato al disegno delle forme.
+    Le forme create in modalità pigra (anche i rettangoli, che possono
+    essere ruotati) ricordano l'antialiasing anche dopo l'uscita dal blocco
+    with. ruota() di un'immagine normale ruota i pixel e non aggiunge
+    antialiasing: per avere bordi sfumati, le forme vanno disegnate
+    direttamente ruotate o costruite in modalità pigra.
+
+    Esempio::
+
+        with modalita_antialiasing():
+            img = rettangolo_ruotato(100, 10, (5, 5), 30, "black")
+
+    :param fattore: quante volte più grande (in ogni direzione) viene
+                    disegnata ogni forma; 1 disattiva l'antialiasing
+    """
+    global _antialiasing  # pylint: disable=global-statement
+    if fattore < 1:
+        raise ValueError(f"Fattore di antialiasing non valido: {fattore}")
+    precedente = _antialiasing
+    _antialiasing = fattore
+    try:
+        yield
+    finally:
+        _antialiasing = precedente
+
+
+def fattore_antialiasing() -> int:
+    """
+    :returns: il fattore di antialiasing attuale, 1 se l'antialiasing non è
+              attivo (vedi modalita_antialiasing())
+    """
+    return _antialiasing
+
+
 # ======================================== #
 # Costanti
 # ======================================== #
@@ -664,11 +2161,804 @@ def triangolo(lato: int, colore_riempimento: str) -> Immagine:
 _IMAGE_MODE = "RGBA"  # RGB + canale Alpha
 _TRANSPARENT_COLOR = (0, 0, 0, 0)  # Canale Alpha completamente trasparente
 
+_modalita_pigra = False  # vedi modalita_pigra()
+_antialiasing = 1  # vedi modalita_antialiasing()
+
+# Le immagini pigre più grandi di un tassello vengono disegnate un tassello
+# alla volta, sempre lungo la stessa griglia: in questo modo disegnare un
+# tassello o una regione dà esattamente gli stessi pixel che disegnare
+# l'immagine intera.
+_LATO_TASSELLO = 1024
+
+_FONT_TESTO = ("arial.ttf", "Arial.ttf")  # in ordine di preferenza
+
+_FIRMA_PNG = b"\x89PNG\r\n\x1a\n"
+
+# Formati di salva_immagine(): nome del formato in Pillow e compressione
+# massima
+_FORMATI = {"png": ("PNG", 9), "webp": ("WEBP", 6), "qoi": ("QOI", 0),
+            "rgba": ("", 0)}
+
+# ======================================== #
+# Immagini pigre
+# ======================================== #
+
+# Matrice di una trasformazione affine (a, b, c, d, e, f), che porta il punto
+# (x, y) in (a * x + b * y + c, d * x + e * y + f).
+# Tutte le coordinate sono indici di pixel, come in _ruota_punto().
+_Matrice = Tuple[float, float, float, float, float, float]
+
+_IDENTITA: _Matrice = (1, 0, 0, 0, 1, 0)
+
+
+class ImmaginePigra(Immagine):
+    """
+    Immagine descritta da una sequenza di forme (poligoni, cerchi e immagini
+    Pillow trasformate), i cui pixel vengono disegnati solo alla prima
+    chiamata di get_image(). Vedi modalita_pigra().
+    """
+
+    __slots__ = ("forme", "dimensioni", "_disegno")
+
+    def __init__(self, forme: Tuple["_Forma", ...],
+                 dimensioni: Tuple[int, int], punto_rif=None) -> None:
+        super().__init__(None, punto_rif)
+        self.forme = forme  # dallo sfondo al primo piano
+        self.dimensioni = dimensioni
+        # L'immagine Pillow, una volta disegnata; la lista è condivisa con le
+        # immagini create da con_punto_riferimento(), in modo che i pixel
+        # vengano disegnati una volta sola
+        self._disegno: List[Optional[Image]] = [None]
+
+    def get_image(self) -> Image:
+        """
+        Ritorna l'immagine Pillow, disegnandola al primo accesso.
+
+        :returns: un'istanza della classe Image in Pillow
+        :meta private:
+        """
+        if self._disegno[0] is None:
+            self._disegno[0] = _disegna_forme(self.forme, self.dimensioni)
+        return self._disegno[0]
+
+    def get_immagine_disegnata(self) -> Optional[Image]:
+        """
+        Ritorna l'immagine Pillow se è già stata disegnata, senza disegnarla.
+
+        :returns: l'immagine Pillow, oppure None
+        :meta private:
+        """
+        return self._disegno[0]
+
+    def get_dimensioni(self) -> Tuple[int, int]:
+        return self.dimensioni
+
+    def con_punto_riferimento(self, punto_rif: Tuple[int, int]) -> Immagine:
+        nuova = ImmaginePigra(self.forme, self.dimensioni, punto_rif)
+        # pylint: disable=protected-access
+        nuova._disegno = self._disegno
+        nuova._impronta_contenuto = self._impronta_contenuto
+        return nuova
+
+    def ruotata(self, gradi: int) -> Immagine:
+        """
+        Ruota l'immagine attorno al suo punto di riferimento, trasformando solo
+        la geometria delle forme (vedi ruota()).
+
+        :param gradi: angolo di rotazione in senso antiorario
+        :returns: una nuova immagine pigra
+        """
+        return _ruota_forme(self.forme, self.get_punto_riferimento(), gradi)
+
+    def __repr__(self) -> str:
+        return (f"ImmaginePigra(forme={len(self.forme)}, "
+                f"dimensioni={self.dimensioni}, "
+                f"punto_riferimento={self.get_punto_riferimento()})")
+
+
+def _ruota_forme(forme: Tuple["_Forma", ...], rif: Tuple[int, int],
+                 gradi: int) -> ImmaginePigra:
+    """
+    Ruota delle forme attorno a un punto e le ritaglia, come farebbe ruota()
+    con un'immagine che le contiene e ha quel punto di riferimento.
+
+    :param forme: forme da ruotare
+    :param rif: centro di rotazione, che diventa il punto di riferimento
+    :param gradi: angolo di rotazione in senso antiorario
+    :returns: un'immagine pigra con le forme ruotate
+    """
+    ruotate = [forma.trasformata(_matrice_rotazione(rif, gradi))
+               for forma in forme]
+    if len(ruotate) == 0:
+        raise ValueError("Impossibile ruotare un'immagine "
+                         "completamente trasparente")
+    return _ritaglia_forme(tuple(ruotate), rif)
+
+
+def _ritaglia_forme(forme: Tuple["_Forma", ...],
+                    rif: Tuple[int, int]) -> ImmaginePigra:
+    """
+    Crea un'immagine pigra grande il minimo necessario per contenere delle
+    forme (almeno una), traslandole in modo che il ritaglio parta da (0, 0).
+
+    :param forme: forme da contenere
+    :param rif: punto di riferimento, nelle stesse coordinate delle forme
+    :returns: un'immagine pigra con le forme traslate
+    """
+    estensioni = [forma.estensione() for forma in forme]
+    # Come in ruota(), le coordinate dei pixel ruotati vengono arrotondate
+    min_x = round(min(e[0] for e in estensioni))
+    min_y = round(min(e[1] for e in estensioni))
+    max_x = round(max(e[2] for e in estensioni))
+    max_y = round(max(e[3] for e in estensioni))
+    traslazione = _matrice_traslazione(-min_x, -min_y)
+    return ImmaginePigra(
+        tuple(forma.trasformata(traslazione) for forma in forme),
+        (max_x - min_x + 1, max_y - min_y + 1),
+        (rif[0] - min_x, rif[1] - min_y))
+
+
+@dataclass(frozen=True)
+class _Poligono:
+    """
+    Poligono pieno, con i vertici espressi come indici di pixel (inclusi nel
+    poligono, come in ImageDraw.polygon()). Con l'antialiasing (fattore
+    maggiore di 1), il poligono viene allargato di mezzo pixel, in modo che
+    copra interamente i pixel dei vertici.
+    """
+    vertici: Tuple[Tuple[float, float], ...]
+    colore: Any
+    antialiasing: int = 1
+
+    def trasformata(self, matrice: _Matrice) -> "_Poligono":
+        return _Poligono(tuple(_applica(matrice, v) for v in self.vertici),
+                         self.colore, self.antialiasing)
+
+    def estensione(self) -> Tuple[float, float, float, float]:
+        xs = [v[0] for v in self.vertici]
+        ys = [v[1] for v in self.vertici]
+        if self.antialiasing > 1:
+            # I pixel parzialmente coperti dal bordo allargato (tranne quelli
+            # coperti per meno di un centesimo)
+            return (min(xs) - 0.49, min(ys) - 0.49,
+                    max(xs) + 0.49, max(ys) + 0.49)
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def disegna(self, img: Image, origine: Tuple[int, int] = (0, 0)):
+        vertici = self.vertici
+        if origine != (0, 0):
+            vertici = tuple((x - origine[0], y - origine[1])
+                            for x, y in vertici)
+        if self.antialiasing > 1:
+            fattore = self.antialiasing
+            # ImageDraw include nel poligono anche parte dei pixel della
+            # maschera attraversati dal bordo: in media, un quarto di pixel
+            # della maschera in più
+            allargato = _poligono_allargato(vertici, 0.5 - 0.25 / fattore)
+            xs = [v[0] for v in allargato]
+            ys = [v[1] for v in allargato]
+            riquadro = (floor(min(xs) + 0.5), floor(min(ys) + 0.5),
+                        floor(max(xs) + 0.5) + 1, floor(max(ys) + 0.5) + 1)
+            # Il centro del pixel (x, y) dell'immagine è il punto
+            # (x + 0.5, y + 0.5), che nella maschera diventa
+            # ((x + 0.5 - sinistra) * fattore, (y + 0.5 - alto) * fattore)
+            _disegna_sovracampionato(
+                img, self.colore, riquadro, fattore,
+                lambda draw, sinistra, alto: draw.polygon(
+                    [((x + 0.5 - sinistra) * fattore - 0.5,
+                      (y + 0.5 - alto) * fattore - 0.5)
+                     for x, y in allargato], fill=255))
+            return
+        _disegna_opaco_o_trasparente(
+            img, self.colore,
+            lambda draw, colore: draw.polygon(vertici, fill=colore))
+
+
+@dataclass(frozen=True)
+class _Cerchio:
+    """
+    Cerchio pieno di diametro `lato` pixel, di cui `angolo` è il pixel in alto
+    a sinistra del quadrato che lo contiene.
+    Essendo un cerchio, una rotazione ne sposta solo il centro.
+    Senza antialiasing, il cerchio viene disegnato come in cerchio(), cioè
+    nel quadrato [(0, 0), (lato, lato)] tagliato ai lato x lato pixel
+    dell'immagine.
+    """
+    angolo: Tuple[float, float]
+    lato: int
+    colore: Any
+    antialiasing: int = 1
+
+    def trasformata(self, matrice: _Matrice) -> "_Cerchio":
+        semilato = (self.lato - 1) / 2
+        centro = _applica(matrice, (self.angolo[0] + semilato,
+                                    self.angolo[1] + semilato))
+        return _Cerchio((centro[0] - semilato, centro[1] - semilato),
+                        self.lato, self.colore, self.antialiasing)
+
+    def estensione(self) -> Tuple[float, float, float, float]:
+        x, y = round(self.angolo[0]), round(self.angolo[1])
+        return (x, y, x + self.lato - 1, y + self.lato - 1)
+
+    def disegna(self, img: Image, origine: Tuple[int, int] = (0, 0)):
+        x0, y0, x1, y1 = self.estensione()  # pylint: disable=invalid-name
+        box = (x0 - origine[0], y0 - origine[1],
+               x1 - origine[0], y1 - origine[1])
+        if self.antialiasing > 1:
+            fattore = self.antialiasing
+            _disegna_sovracampionato(
+                img, self.colore, (box[0], box[1], box[2] + 1, box[3] + 1),
+                fattore,
+                lambda draw, sinistra, alto: draw.ellipse(
+                    ((box[0] - sinistra) * fattore,
+                     (box[1] - alto) * fattore,
+                     (box[2] + 1 - sinistra) * fattore - 1,
+                     (box[3] + 1 - alto) * fattore - 1), fill=255))
+            return
+        maschera = ImageMod.new("L", (self.lato, self.lato), 0)
+        ImageDraw.Draw(maschera).ellipse([(0, 0), maschera.size], fill=255)
+        _componi_maschera(img, self.colore, maschera, (box[0], box[1]))
+
+
+@dataclass(frozen=True, eq=False)
+class _Raster:
+    """
+    Immagine Pillow disegnata dopo averle applicato una trasformazione
+    affine. Il contorno (vedi _contorno()) permette di calcolare l'estensione
+    dei soli pixel non trasparenti, come farebbe ruota() ritagliando
+    l'immagine.
+    """
+    img: Image
+    matrice: _Matrice
+    contorno: Tuple["np.ndarray", "np.ndarray"]
+
+    def trasformata(self, matrice: _Matrice) -> "_Raster":
+        return _Raster(self.img, _prodotto(matrice, self.matrice),
+                       self.contorno)
+
+    def estensione(self) -> Tuple[float, float, float, float]:
+        a, b, c, d, e, f = self.matrice  # pylint: disable=invalid-name
+        xs, ys = self.contorno
+        if len(xs) == 0:
+            # Immagine completamente trasparente: conta solo l'origine
+            return (c, f, c, f)
+        trasformate_x = a * xs + b * ys + c
+        trasformate_y = d * xs + e * ys + f
+        return (float(trasformate_x.min()), float(trasformate_y.min()),
+                float(trasformate_x.max()), float(trasformate_y.max()))
+
+    def disegna(self, img: Image, origine: Tuple[int, int] = (0, 0)):
+        a, b, c, d, e, f = self.matrice  # pylint: disable=invalid-name
+        if (a, b, d, e) == (1, 0, 0, 1) and c == int(c) and f == int(f):
+            # Semplice traslazione di un numero intero di pixel
+            x, y = int(c) - origine[0], int(f) - origine[1]
+            if x >= 0 and y >= 0:
+                img.alpha_composite(self.img, (x, y))
+            elif x + self.img.width > 0 and y + self.img.height > 0:
+                # Il tassello taglia l'immagine a sinistra o in alto
+                img.alpha_composite(self.img, (max(x, 0), max(y, 0)),
+                                    (max(-x, 0), max(-y, 0)))
+            return
+        # Pillow vuole la trasformazione inversa (dal risultato all'originale)
+        # e considera il centro dei pixel in (x + 0.5, y + 0.5)
+        inversa = _prodotto(_matrice_traslazione(0.5, 0.5), _prodotto(
+            _inversa(self.matrice), _matrice_traslazione(-0.5, -0.5)))
+        if origine != (0, 0):
+            inversa = _prodotto(inversa, _matrice_traslazione(*origine))
+        img.alpha_composite(self.img.transform(
+            img.size, ImageMod.AFFINE, inversa, fillcolor=_TRANSPARENT_COLOR))
+
+
+# Ogni forma sa trasformarsi con una matrice affine (trasformata()), calcolare
+# il rettangolo (min_x, min_y, max_x, max_y) che la contiene (estensione()) e
+# disegnarsi su un'immagine Pillow (disegna()), eventualmente su un solo
+# tassello con l'angolo in alto a sinistra in `origine`.
+_Forma = Union[_Poligono, _Cerchio, _Raster]
+
+
+def _forme(immagine: Immagine) -> Tuple[_Forma, ...]:
+    """
+    Ritorna le forme che descrivono un'immagine: quelle di un'immagine pigra,
+    oppure l'immagine Pillow stessa per un'immagine normale.
+
+    :param immagine: immagine (pigra o normale)
+    :returns: le forme, dallo sfondo al primo piano
+    """
+    if isinstance(immagine, ImmaginePigra):
+        return immagine.forme
+    if immagine.is_immagine_vuota():
+        return ()
+    img = immagine.get_image()
+    return (_Raster(img, _IDENTITA, _contorno(img)),)
+
+
+def _disegna_forme(forme: Tuple[_Forma, ...], dimensioni: Tuple[int, int],
+                   regione: Optional[Tuple[int, int, int, int]] = None
+                   ) -> Image:
+    """
+    Disegna delle forme, dallo sfondo al primo piano, in una nuova immagine
+    Pillow trasparente.
+    Le immagini più grandi di un tassello vengono disegnate un tassello alla
+    volta (vedi _LATO_TASSELLO), disegnando in ogni tassello solo le forme
+    che lo toccano.
+
+    :param forme: forme da disegnare
+    :param dimensioni: dimensioni dell'immagine intera
+    :param regione: (sinistra, alto, destra, basso) della parte da disegnare,
+                    oppure None per disegnare l'immagine intera
+    :returns: l'immagine Pillow con le forme disegnate
+    """
+    larghezza, altezza = dimensioni
+    if larghezza <= _LATO_TASSELLO and altezza <= _LATO_TASSELLO:
+        img = ImageMod.new(_IMAGE_MODE, dimensioni, _TRANSPARENT_COLOR)
+        for forma in forme:
+            forma.disegna(img)
+        return img if regione is None else img.crop(regione)
+    sinistra, alto, destra, basso = regione or (0, 0, larghezza, altezza)
+    img = ImageMod.new(_IMAGE_MODE, (destra - sinistra, basso - alto),
+                       _TRANSPARENT_COLOR)
+    riquadri = [(forma, _riquadro(forma)) for forma in forme]
+    inizio_x = sinistra - sinistra % _LATO_TASSELLO
+    inizio_y = alto - alto % _LATO_TASSELLO
+    for y in range(inizio_y, basso, _LATO_TASSELLO):
+        for x in range(inizio_x, destra, _LATO_TASSELLO):
+            tassello = (x, y, min(x + _LATO_TASSELLO, larghezza),
+                        min(y + _LATO_TASSELLO, altezza))
+            img_tassello = ImageMod.new(
+                _IMAGE_MODE, (tassello[2] - x, tassello[3] - y),
+                _TRANSPARENT_COLOR)
+            for forma, riquadro in riquadri:
+                if (riquadro[0] < tassello[2] and riquadro[2] > x
+                        and riquadro[1] < tassello[3] and riquadro[3] > y):
+                    forma.disegna(img_tassello, (x, y))
+            img.paste(img_tassello.crop(
+                (max(sinistra, x) - x, max(alto, y) - y,
+                 min(destra, tassello[2]) - x, min(basso, tassello[3]) - y)),
+                (max(sinistra, x) - sinistra, max(alto, y) - alto))
+    return img
+
+
+def _riquadro(forma: _Forma) -> Tuple[int, int, int, int]:
+    """
+    Calcola un rettangolo di pixel che contiene sicuramente tutti i pixel
+    disegnati da una forma, con un margine per gli arrotondamenti di Pillow.
+
+    :param forma: la forma
+    :returns: (sinistra, alto, destra, basso), con destra e basso esclusi
+    """
+    margine = 2
+    if isinstance(forma, _Raster):
+        a, b, _, d, e, _ = forma.matrice  # pylint: disable=invalid-name
+        # Un pixel trasformato copre al massimo mezza diagonale attorno al
+        # suo centro
+        margine += ceil((abs(a) + abs(b) + abs(d) + abs(e)) / 2)
+    min_x, min_y, max_x, max_y = forma.estensione()
+    return (int(min_x) - margine, int(min_y) - margine,
+            int(max_x) + margine + 1, int(max_y) + margine + 1)
+
+
+def _disegna_opaco_o_trasparente(img: Image, colore: Any,
+                                 disegna: Callable[[Any, Any], None]):
+    """
+    Disegna una forma su un'immagine Pillow usando ImageDraw.
+    ImageDraw sostituisce i pixel invece di sovrapporli: per i colori opachi
+    è equivalente, mentre per quelli semitrasparenti la forma viene disegnata
+    a parte e poi sovrapposta.
+
+    :param img: immagine su cui disegnare
+    :param colore: colore della forma
+    :param disegna: funzione che disegna la forma, dati un ImageDraw e il
+                    colore
+    """
+    rgba = ImageColor.getcolor(colore, _IMAGE_MODE) \
+        if isinstance(colore, str) else tuple(colore)
+    if len(rgba) == 3 or rgba[3] == 255:
+        disegna(ImageDraw.Draw(img), rgba)
+    else:
+        livello = ImageMod.new(_IMAGE_MODE, img.size, _TRANSPARENT_COLOR)
+        disegna(ImageDraw.Draw(livello), rgba)
+        img.alpha_composite(livello)
+
+
+def _disegna_sovracampionato(img: Image, colore: Any,
+                             riquadro: Tuple[int, int, int, int],
+                             fattore: int,
+                             disegna: Callable[[Any, int, int], None]):
+    """
+    Disegna una forma con l'antialiasing: la forma viene disegnata in una
+    maschera `fattore` volte più grande della sola parte dell'immagine che la
+    contiene, e la maschera ridotta fa da canale alfa per il colore.
+
+    :param img: immagine su cui disegnare
+    :param colore: colore della forma
+    :param riquadro: (sinistra, alto, destra, basso) dei pixel dell'immagine
+                     che la forma può toccare, con destra e basso esclusi
+    :param fattore: fattore di sovracampionamento
+    :param disegna: funzione che disegna la forma con valore 255, dati un
+                    ImageDraw della maschera e le coordinate dell'immagine
+                    del suo angolo in alto a sinistra
+    """
+    sinistra, alto = max(riquadro[0], 0), max(riquadro[1], 0)
+    destra = min(riquadro[2], img.width)
+    basso = min(riquadro[3], img.height)
+    if sinistra >= destra or alto >= basso:
+        return
+    maschera = ImageMod.new("L", ((destra - sinistra) * fattore,
+                                  (basso - alto) * fattore), 0)
+    disegna(ImageDraw.Draw(maschera), sinistra, alto)
+    _componi_maschera(img, colore, maschera.reduce(fattore),
+                      (sinistra, alto))
+
+
+def _componi_maschera(img: Image, colore: Any, maschera: Image,
+                      posizione: Tuple[int, int]):
+    """
+    Sovrappone a un'immagine un colore, usando una maschera come canale alfa
+    (moltiplicato per l'alfa del colore). La maschera può sporgere
+    dall'immagine, che la taglia.
+
+    :param img: immagine su cui disegnare
+    :param colore: colore da sovrapporre
+    :param maschera: maschera in modalità "L" (255 dove il colore è pieno)
+    :param posizione: posizione nell'immagine dell'angolo in alto a sinistra
+                      della maschera (anche negativa)
+    """
+    x, y = posizione  # pylint: disable=invalid-name
+    sinistra, alto = max(x, 0), max(y, 0)
+    destra = min(x + maschera.width, img.width)
+    basso = min(y + maschera.height, img.height)
+    if sinistra >= destra or alto >= basso:
+        return
+    if (sinistra, alto, destra, basso) != (x, y, x + maschera.width,
+                                           y + maschera.height):
+        maschera = maschera.crop((sinistra - x, alto - y,
+                                  destra - x, basso - y))
+    rgba = ImageColor.getcolor(colore, _IMAGE_MODE) \
+        if isinstance(colore, str) else tuple(colore)
+    if len(rgba) == 4 and rgba[3] < 255:
+        maschera = maschera.point(
+            lambda valore: (valore * rgba[3] + 127) // 255)
+    livello = ImageMod.new(_IMAGE_MODE, maschera.size, rgba[:3] + (0,))
+    livello.putalpha(maschera)
+    img.alpha_composite(livello, (sinistra, alto))
+
+
+def _poligono_allargato(vertici: Tuple[Tuple[float, float], ...],
+                        distanza: float) -> List[Tuple[float, float]]:
+    """
+    Allarga un poligono spostando ogni lato verso l'esterno di `distanza`
+    (con gli spigoli appuntiti, come i vertici originali). Un poligono
+    degenere (un punto o un segmento) diventa il rettangolo che lo contiene,
+    allargato in tutte le direzioni.
+
+    :param vertici: vertici del poligono, in senso orario o antiorario
+    :param distanza: di quanto allargare il poligono
+    :returns: i vertici del poligono allargato
+    """
+    punti = [v for i, v in enumerate(vertici) if v != vertici[i - 1]]
+    area = sum(x0 * y1 - x1 * y0  # pylint: disable=invalid-name
+               for (x0, y0), (x1, y1) in zip(punti, punti[1:] + punti[:1]))
+    if len(punti) < 3 or area == 0:
+        xs = [v[0] for v in vertici]
+        ys = [v[1] for v in vertici]
+        return [(min(xs) - distanza, min(ys) - distanza),
+                (max(xs) + distanza, min(ys) - distanza),
+                (max(xs) + distanza, max(ys) + distanza),
+                (min(xs) - distanza, max(ys) + distanza)]
+    verso = 1 if area > 0 else -1
+    normali = []
+    for (x0, y0), (x1, y1) in zip(  # pylint: disable=invalid-name
+            punti, punti[1:] + punti[:1]):
+        lunghezza = sqrt((x1 - x0) ** 2 + (y1 - y0) ** 2)
+        normali.append((verso * (y1 - y0) / lunghezza,
+                        -verso * (x1 - x0) / lunghezza))
+    allargato = []
+    for i, (x, y) in enumerate(punti):
+        # Lo spigolo si sposta lungo la bisettrice delle normali dei due lati,
+        # di più quanto più è appuntito (entro un limite)
+        (nx0, ny0), (nx1, ny1) = normali[i - 1], normali[i]
+        divisore = max(1 + nx0 * nx1 + ny0 * ny1, 0.125)
+        allargato.append((x + distanza * (nx0 + nx1) / divisore,
+                          y + distanza * (ny0 + ny1) / divisore))
+    return allargato
+
+
+def _applica(matrice: _Matrice,
+             punto: Tuple[float, float]) -> Tuple[float, float]:
+    """
+    Applica una trasformazione affine a un punto.
+    """
+    a, b, c, d, e, f = matrice  # pylint: disable=invalid-name
+    x, y = punto  # pylint: disable=invalid-name
+    return (a * x + b * y + c, d * x + e * y + f)
+
+
+def _prodotto(prima: _Matrice, seconda: _Matrice) -> _Matrice:
+    """
+    Compone due trasformazioni affini: il risultato applica prima `seconda` e
+    poi `prima`.
+    """
+    a1, b1, c1, d1, e1, f1 = prima
+    a2, b2, c2, d2, e2, f2 = seconda
+    return (a1 * a2 + b1 * d2, a1 * b2 + b1 * e2, a1 * c2 + b1 * f2 + c1,
+            d1 * a2 + e1 * d2, d1 * b2 + e1 * e2, d1 * c2 + e1 * f2 + f1)
+
+
+def _inversa(matrice: _Matrice) -> _Matrice:
+    """
+    Calcola l'inversa di una trasformazione affine.
+    """
+    a, b, c, d, e, f = matrice  # pylint: disable=invalid-name
+    det = a * e - b * d
+    return (e / det, -b / det, (b * f - c * e) / det,
+            -d / det, a / det, (c * d - a * f) / det)
+
+
+def _matrice_traslazione(dx: float, dy: float) -> _Matrice:
+    """
+    Ritorna la matrice della traslazione di (dx, dy).
+    """
+    return (1, 0, dx, 0, 1, dy)
+
+
+def _matrice_rotazione(centro: Tuple[float, float], gradi: float) -> _Matrice:
+    """
+    Ritorna la matrice della rotazione in senso antiorario di `gradi` attorno
+    a `centro` (con la stessa convenzione di _ruota_punto()).
+    """
+    theta = radians(-gradi)
+    cx, cy = centro  # pylint: disable=invalid-name
+    coseno, seno = cos(theta), sin(theta)
+    return (coseno, -seno, cx - coseno * cx + seno * cy,
+            seno, coseno, cy - seno * cx - coseno * cy)
+
+
+# ======================================== #
+# Cache
+# ======================================== #
+
+
+class _CacheLRU:
+    """
+    Cache di immagini con politica LRU (least recently used), limitata sia nel
+    numero di voci che nella dimensione complessiva dei pixel memorizzati.
+    """
+
+    def __init__(self, max_voci: int, max_byte: int) -> None:
+        self.voci: "OrderedDict[Hashable, Immagine]" = OrderedDict()
+        self.max_voci = max_voci
+        self.max_byte = max_byte
+        self.byte = 0
+        self.hit = 0
+        self.miss = 0
+
+    def cerca(self, chiave: Hashable) -> Optional[Immagine]:
+        """
+        Cerca un'immagine nella cache, aggiornando le statistiche.
+
+        :param chiave: chiave dell'immagine
+        :returns: l'immagine memorizzata, oppure None se non è presente
+        """
+        immagine = self.voci.get(chiave)
+        if immagine is None:
+            self.miss += 1
+        else:
+            self.hit += 1
+            self.voci.move_to_end(chiave)
+        return immagine
+
+    def inserisci(self, chiave: Hashable, immagine: Immagine):
+        """
+        Memorizza un'immagine nella cache, scartando se necessario le voci
+        usate meno di recente. Le immagini più grandi dell'intera cache non
+        vengono memorizzate.
+
+        :param chiave: chiave dell'immagine
+        :param immagine: immagine da memorizzare
+        """
+        if _byte_immagine(immagine) > self.max_byte:
+            return
+        if chiave in self.voci:
+            self.byte -= _byte_immagine(self.voci.pop(chiave))
+        self.voci[chiave] = immagine
+        self.byte += _byte_immagine(immagine)
+        self._rispetta_limiti()
+
+    def cambia_limiti(self, max_voci: int, max_byte: int):
+        """
+        Cambia i limiti della cache, scartando le voci in eccesso.
+
+        :param max_voci: numero massimo di voci
+        :param max_byte: dimensione massima in byte
+        """
+        self.max_voci = max_voci
+        self.max_byte = max_byte
+        self._rispetta_limiti()
+
+    def svuota(self):
+        """
+        Elimina tutte le voci e azzera le statistiche.
+        """
+        self.voci.clear()
+        self.byte = 0
+        self.hit = 0
+        self.miss = 0
+
+    def statistiche(self) -> Dict[str, int]:
+        """
+        :returns: hit, miss, numero di voci e byte occupati
+        """
+        return {"hit": self.hit, "miss": self.miss,
+                "voci": len(self.voci), "byte": self.byte}
+
+    def _rispetta_limiti(self):
+        while len(self.voci) > self.max_voci or self.byte > self.max_byte:
+            _, scartata = self.voci.popitem(last=False)
+            self.byte -= _byte_immagine(scartata)
+
+
+_cache_rotazioni: Optional[_CacheLRU] = None  # None: cache disattivata
+_atlante_glifi: Optional[_CacheLRU] = None  # None: atlante disattivato
+
+# Font già caricati, per (nome, punti); il font di base ha nome None.
+_cache_font: Dict[Tuple[Optional[str], int], ImageFont] = {}
+# Avanzamenti di singoli caratteri e coppie di caratteri, per (id(font),
+# caratteri), usati dall'atlante dei glifi.
+_lunghezze_glifi: Dict[Tuple[int, str], float] = {}
+# Primo font disponibile di ogni elenco di font (None: nessuno disponibile).
+_font_risolti: Dict[Tuple[str, ...], Optional[str]] = {}
+
+# ======================================== #
+# Profilazione
+# ======================================== #
+
+
+@dataclass
+class _Misure:
+    """
+    Misure raccolte dalla profilazione per una funzione.
+    """
+    chiamate: int = 0
+    tempo: float = 0.0
+    tempo_proprio: float = 0.0
+    pixel: int = 0
+    picco: Tuple[int, int] = (0, 0)
+
+    def aggiungi_immagine(self, dimensioni: Tuple[int, int]):
+        """
+        Conta i pixel di un'immagine prodotta dalla funzione.
+
+        :param dimensioni: larghezza e altezza dell'immagine
+        """
+        larghezza, altezza = dimensioni
+        self.pixel += larghezza * altezza
+        if larghezza * altezza > self.picco[0] * self.picco[1]:
+            self.picco = dimensioni
+
+
+@dataclass
+class _Profilazione:
+    """
+    Misure raccolte da una profilazione, per nome della funzione.
+    """
+    misure: Dict[str, _Misure] = field(default_factory=dict)
+    # Per ogni chiamata in corso, il tempo trascorso nelle funzioni misurate
+    # che ha chiamato (da escludere dal suo tempo proprio)
+    pila: List[float] = field(default_factory=list)
+
+    def aggiungi(self, altra: "_Profilazione"):
+        """
+        Aggiunge a queste misure quelle di un'altra profilazione.
+
+        :param altra: la profilazione da aggiungere
+        """
+        for nome, misure in altra.misure.items():
+            totali = self.misure.setdefault(nome, _Misure())
+            totali.chiamate += misure.chiamate
+            totali.tempo += misure.tempo
+            totali.tempo_proprio += misure.tempo_proprio
+            totali.pixel += misure.pixel
+            if (misure.picco[0] * misure.picco[1]
+                    > totali.picco[0] * totali.picco[1]):
+                totali.picco = misure.picco
+
+    def risultati(self) -> Dict[str, Dict[str, Any]]:
+        """
+        :returns: le misure, come dizionari (vedi risultati_profilazione())
+        """
+        return {nome: {"chiamate": misure.chiamate, "tempo": misure.tempo,
+                       "tempo_proprio": misure.tempo_proprio,
+                       "pixel": misure.pixel, "picco": misure.picco}
+                for nome, misure in self.misure.items()}
+
+
+_profilazione: Optional[_Profilazione] = None  # None: profilazione disattiva
+_ultima_profilazione: Optional[_Profilazione] = None
+
+
+def _misura(profilazione: _Profilazione, nome: str,
+            funzione: Callable[..., Any], args: Tuple[Any, ...],
+            kwargs: Dict[str, Any]) -> Any:
+    """
+    Chiama una funzione e ne registra le misure (vedi _strumentata()).
+
+    :param profilazione: dove registrare le misure
+    :param nome: nome della funzione
+    :param funzione: la funzione da chiamare
+    :param args: argomenti posizionali
+    :param kwargs: argomenti con nome
+    :returns: il risultato della funzione
+    """
+    profilazione.pila.append(0.0)
+    inizio = perf_counter()
+    try:
+        risultato = funzione(*args, **kwargs)
+    finally:
+        tempo = perf_counter() - inizio
+        tempo_figli = profilazione.pila.pop()
+        esterna = not profilazione.pila
+        if not esterna:
+            profilazione.pila[-1] += tempo
+        misure = profilazione.misure.setdefault(nome, _Misure())
+        misure.chiamate += 1
+        misure.tempo += tempo
+        misure.tempo_proprio += tempo - tempo_figli
+    # I pixel vengono contati solo per la chiamata più esterna, altrimenti
+    # un'immagine verrebbe contata una volta per ogni livello (ad esempio da
+    # componi() e da componi_molti())
+    img = _immagine_prodotta(risultato) if esterna else None
+    if img is not None and not any(
+            img is _immagine_prodotta(arg) for arg in args):
+        misure.aggiungi_immagine(img.size)
+    return risultato
+
+
+def _immagine_prodotta(valore: Any) -> Optional[Image]:
+    """
+    Ritorna l'immagine Pillow contenuta in un valore, se c'è; le immagini
+    pigre non ancora disegnate non occupano pixel.
+
+    :param valore: un argomento o il risultato di una funzione
+    :returns: l'immagine Pillow, oppure None
+    """
+    if isinstance(valore, ImmaginePigra):
+        return valore.get_immagine_disegnata()
+    if isinstance(valore, Immagine):
+        return valore.get_image()
+    if isinstance(valore, Image):
+        return valore
+    return None
+
+
 # ======================================== #
 # Funzioni ausiliarie
 # ======================================== #
 
 
+def _impronta(img: Image) -> Tuple[str, Tuple[int, int], bytes]:
+    """
+    Calcola un'impronta compatta del contenuto di un'immagine Pillow, da usare
+    come chiave nelle cache al posto dei pixel veri e propri.
+
+    :param img: immagine Pillow
+    :returns: modalità, dimensioni e digest BLAKE2 dei pixel
+    """
+    digest = blake2b(img.tobytes() if img.size != (0, 0) else b"",
+                     digest_size=16).digest()
+    return (img.mode, img.size, digest)
+
+
+def _byte_immagine(immagine: Immagine) -> int:
+    """
+    Stima la memoria occupata dai pixel di un'immagine.
+
+    :param immagine: immagine di cui stimare la dimensione
+    :returns: dimensione in byte dei pixel
+    """
+    img = immagine.get_image()
+    return img.width * img.height * len(img.getbands())
+
+
 def _ottieni_font_se_disponibile(nome: str, punti: int) -> Optional[ImageFont]:
     """
     Prova ad ottenere il font con il nome indicato alla dimensione richiesta.
@@ -683,6 +2973,128 @@ def _ottieni_font_se_disponibile(nome: str, punti: int) -> Optional[ImageFont]:
         return None
 
 
+def _font_testo(punti: int) -> ImageFont:
+    """
+    Ritorna il font usato da testo() alla dimensione richiesta: il primo
+    disponibile fra quelli in _FONT_TESTO, altrimenti il font di base.
+    La ricerca del font disponibile avviene una sola volta e ogni font viene
+    caricato una sola volta per dimensione.
+
+    :param punti: dimensione del font
+    :returns: il font
+    """
+    if _FONT_TESTO not in _font_risolti:
+        _font_risolti[_FONT_TESTO] = None
+        for nome in _FONT_TESTO:
+            font = _ottieni_font_se_disponibile(nome, punti)
+            if font is not None:
+                _font_risolti[_FONT_TESTO] = nome
+                _cache_font[(nome, punti)] = font
+                break
+    nome_font = _font_risolti[_FONT_TESTO]
+    # Il font di base ha una dimensione fissa
+    chiave = (nome_font, punti if nome_font is not None else 0)
+    if chiave not in _cache_font:
+        _cache_font[chiave] = (ImageFontMod.truetype(nome_font, size=punti)
+                               if nome_font is not None
+                               else ImageFontMod.load_default())
+    return _cache_font[chiave]
+
+
+def _dimensioni_testo(font: ImageFont, contenuto: str) -> Tuple[int, int]:
+    """
+    Calcola le dimensioni dell'immagine necessarie per contenere un testo
+    disegnato a partire dall'origine.
+    Usa getbbox() quando disponibile (getsize() non esiste più nelle versioni
+    recenti di Pillow), altrimenti getsize().
+
+    :param font: il font con cui disegnare il testo
+    :param contenuto: il testo
+    :returns: larghezza e altezza in pixel
+    """
+    if hasattr(font, "getbbox"):
+        _, _, destra, basso = font.getbbox(contenuto)
+        return (destra, basso)
+    return font.getsize(contenuto)
+
+
+def _lunghezza_glifi(font: ImageFont, caratteri: str) -> float:
+    """
+    Ritorna l'avanzamento di uno o due caratteri nel font indicato,
+    ricordandolo per le volte successive.
+
+    :param font: il font
+    :param caratteri: i caratteri da misurare
+    :returns: l'avanzamento in pixel (eventualmente frazionario)
+    """
+    chiave = (id(font), caratteri)
+    lunghezza = _lunghezze_glifi.get(chiave)
+    if lunghezza is None:
+        lunghezza = _lunghezze_glifi[chiave] = font.getlength(caratteri)
+    return lunghezza
+
+
+def _componi_glifi(font: ImageFont, contenuto: str, colore: str,
+                   dimensioni: Tuple[int, int]) -> Optional[Image]:
+    """
+    Compone un testo incollando uno accanto all'altro i glifi dei suoi
+    caratteri, presi dall'atlante dei glifi (e disegnati solo se mancanti).
+    I glifi sono memorizzati come maschere di copertura (in nero, nel canale
+    alfa), indipendenti dal colore: dove due glifi si sovrappongono le
+    coperture vengono combinate con alpha_composite(), che usa la stessa
+    formula di Pillow quando disegna il testo intero, e la maschera completa
+    viene colorata una volta sola.
+    Il risultato è identico a quello di ImageDraw.text() solo se i caratteri
+    non interagiscono fra loro in altro modo: ogni avanzamento deve essere un
+    numero intero di pixel, nessuna coppia di caratteri consecutivi deve
+    essere soggetta a crenatura e nessun glifo deve sporgere a sinistra della
+    propria posizione. Negli altri casi ritorna None.
+
+    :param font: il font con cui disegnare il testo
+    :param contenuto: il testo
+    :param colore: colore del testo
+    :param dimensioni: dimensioni dell'immagine risultante
+    :returns: l'immagine Pillow con il testo, oppure None
+    """
+    assert _atlante_glifi is not None
+    maschera = ImageMod.new(_IMAGE_MODE, dimensioni, _TRANSPARENT_COLOR)
+    x = 0
+    precedente = ""
+    for carattere in contenuto:
+        avanzamento = _lunghezza_glifi(font, carattere)
+        if (not float(avanzamento).is_integer()
+                or (precedente
+                    and _lunghezza_glifi(font, precedente + carattere)
+                    != _lunghezza_glifi(font, precedente) + avanzamento)):
+            return None
+        # I font restano in _cache_font, quindi il loro id() non cambia
+        chiave = (id(font), carattere)
+        glifo = _atlante_glifi.cerca(chiave)
+        if glifo is None:
+            sinistra, _, destra, basso = font.getbbox(carattere)
+            if sinistra < 0:
+                return None
+            img_glifo = ImageMod.new(_IMAGE_MODE, (destra, basso),
+                                     _TRANSPARENT_COLOR)
+            ImageDraw.Draw(img_glifo).text((0, 0), carattere,
+                                           fill=(0, 0, 0, 255), font=font)
+            glifo = Immagine(img_glifo)
+            _atlante_glifi.inserisci(chiave, glifo)
+        img_glifo = glifo.get_image()
+        if (x + img_glifo.width > maschera.width
+                or img_glifo.height > maschera.height):
+            return None
+        if img_glifo.width > 0 and img_glifo.height > 0:
+            maschera.alpha_composite(img_glifo, (x, 0))
+        x += int(avanzamento)
+        precedente = carattere
+    img = ImageMod.new(_IMAGE_MODE, dimensioni, _TRANSPARENT_COLOR)
+    if img.width > 0 and img.height > 0:
+        ImageDraw.Draw(img).bitmap((0, 0), maschera.getchannel("A"),
+                                   fill=colore)
+    return img
+
+
 def _valida_dimensione(valore: int):
     """
     Solleva un'eccezione quando il valore fornito non è valido per una
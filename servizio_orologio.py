@@ -0,0 +1,501 @@
+"""
+Servizio HTTP locale che disegna orologi stile FFS su richiesta, senza dover
+avviare un interprete, importare la libreria e costruire il quadrante per
+ogni orologio.
+
+    GET /clock?h=4&m=10&s=45&size=300&fmt=png
+
+- h, m: ore (formato 12h o 24h) e minuti, obbligatori;
+- s: secondi, facoltativi (senza, l'orologio non ha la lancetta dei
+  secondi);
+- size: lato dell'immagine in pixel (arrotondato per difetto a un numero
+  pari), 600 se non indicato;
+- fmt: formato dell'immagine: png (il default), webp oppure qoi.
+
+Gli orologi vengono disegnati da un pool di processi avviati una volta sola,
+a cui vengono inviati i quadranti già costruiti. Le risposte vengono
+memorizzate in una cache LRU, con chiave l'ora normalizzata (formato 12h) e
+la dimensione: un orologio già richiesto viene servito direttamente dal
+processo principale, e i client che lo hanno già ricevuto ottengono
+304 Not Modified (tramite l'ETag).
+
+Uso:
+
+    python servizio_orologio.py [--host 127.0.0.1] [--porta 8080]
+                                [--processi N] [--dimensioni 600 300]
+    python servizio_orologio.py --carico 2000 [--concorrenza 8]
+
+Con --carico, il servizio viene avviato su una porta libera e sottoposto a
+una prova di carico: vengono riportate le latenze con la cache vuota e con
+la cache piena.
+"""
+
+import argparse
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha1
+from io import BytesIO
+import os
+import sys
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from esercizio_orologio import (
+    RAGGIO,
+    crea_orologio as crea_orologio_minuti,
+    crea_quadrante,
+    usa_quadrante
+)
+from esercizio_orologio_con_secondi import crea_orologio
+from img_lib_v0_6 import (
+    Immagine,
+    fattore_antialiasing,
+    modalita_antialiasing,
+    salva_immagine
+)
+
+# Per ogni formato, il tipo MIME e le opzioni di salva_immagine(): gli
+# orologi hanno pochi colori, per cui la palette non cambia alcun pixel e
+# rende la codifica PNG più veloce
+FORMATI: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    "png": ("image/png", {"colori": 256}),
+    "webp": ("image/webp", {"formato": "webp", "compressione": 0}),
+    "qoi": ("image/qoi", {"formato": "qoi"})
+}
+LATO_MINIMO = 32
+LATO_MASSIMO = 2000
+
+# Ore (0-11), minuti, secondi (None senza lancetta dei secondi), raggio e
+# formato: due richieste con la stessa chiave ricevono la stessa immagine.
+_Chiave = Tuple[int, int, Optional[int], int, str]
+
+_STATI = {200: "OK", 304: "Not Modified", 400: "Bad Request",
+          404: "Not Found", 405: "Method Not Allowed",
+          500: "Internal Server Error"}
+
+
+class RichiestaNonValida(ValueError):
+    """
+    Parametri della richiesta mancanti o non validi.
+    """
+
+
+def normalizza_richiesta(query: str) -> _Chiave:
+    """
+    Legge i parametri della richiesta e li riduce alla chiave della cache,
+    in modo che le richieste dello stesso orologio (ad esempio le 16:10 e le
+    4:10) abbiano la stessa chiave.
+
+    :param query: la query string della richiesta, senza "?"
+    :returns: ore (formato 12h), minuti, secondi, raggio e formato
+    """
+    parametri = {nome: valori[-1] for nome, valori
+                 in parse_qs(query, keep_blank_values=True).items()}
+    ore = _intero(parametri, "h", 0, 23)
+    minuti = _intero(parametri, "m", 0, 59)
+    secondi = (_intero(parametri, "s", 0, 59) if "s" in parametri
+               else None)
+    lato = (_intero(parametri, "size", LATO_MINIMO, LATO_MASSIMO)
+            if "size" in parametri else 2 * RAGGIO)
+    formato = parametri.get("fmt", "png").lower()
+    if formato not in FORMATI:
+        raise RichiestaNonValida(f"Formato non supportato: {formato}")
+    return (ore % 12, minuti, secondi, lato // 2, formato)
+
+
+def _intero(parametri: Dict[str, str], nome: str, minimo: int,
+            massimo: int) -> int:
+    """
+    :param parametri: i parametri della richiesta
+    :param nome: nome del parametro
+    :param minimo: valore minimo ammesso
+    :param massimo: valore massimo ammesso
+    :returns: il valore intero del parametro
+    """
+    if nome not in parametri:
+        raise RichiestaNonValida(f"Parametro mancante: {nome}")
+    try:
+        valore = int(parametri[nome])
+    except ValueError:
+        raise RichiestaNonValida(f"Parametro non intero: {nome}") from None
+    if not minimo <= valore <= massimo:
+        raise RichiestaNonValida(f"Il parametro {nome} deve essere tra "
+                                 f"{minimo} e {massimo}")
+    return valore
+
+
+def _inizializza_processo(quadranti: Dict[int, Immagine], fattore: int):
+    """
+    Memorizza nella cache di ogni processo del pool i quadranti costruiti dal
+    processo principale, per ogni raggio e per il fattore di antialiasing
+    con cui sono stati costruiti (che il processo non eredita, ad esempio se
+    avviato con spawn).
+
+    :param quadranti: i quadranti, per raggio
+    :param fattore: il fattore di antialiasing dei quadranti
+    """
+    with modalita_antialiasing(fattore):
+        for raggio, quadrante in quadranti.items():
+            usa_quadrante(quadrante, raggio)
+
+
+def disegna(chiave: _Chiave, fattore: int = 1) -> bytes:
+    """
+    Disegna un orologio e lo codifica nel formato richiesto.
+
+    :param chiave: la richiesta normalizzata (vedi normalizza_richiesta())
+    :param fattore: il fattore di antialiasing (1 per non usarlo)
+    :returns: il contenuto del file dell'immagine
+    """
+    ore, minuti, secondi, raggio, formato = chiave
+    with modalita_antialiasing(fattore):
+        if secondi is None:
+            orologio = crea_orologio_minuti(ore, minuti, raggio)
+        else:
+            orologio = crea_orologio(ore, minuti, secondi, raggio)
+    contenuto = BytesIO()
+    salva_immagine(contenuto, orologio, **FORMATI[formato][1])
+    return contenuto.getvalue()
+
+
+class ServizioOrologio:
+    """
+    Il servizio HTTP, con il suo pool di processi e la cache delle risposte.
+    Gli orologi vengono disegnati con il fattore di antialiasing attivo
+    quando il servizio viene creato.
+    """
+
+    def __init__(self, processi: Optional[int] = None,
+                 lati: Iterable[int] = (2 * RAGGIO,), max_voci: int = 4096,
+                 max_byte: int = 256 * 1024 * 1024) -> None:
+        """
+        :param processi: numero di processi che disegnano gli orologi (None
+                         per usare tutti i core)
+        :param lati: lati degli orologi il cui quadrante viene costruito
+                     all'avvio; gli altri vengono costruiti da ogni processo
+                     la prima volta che servono
+        :param max_voci: numero massimo di risposte nella cache
+        :param max_byte: dimensione massima complessiva delle risposte nella
+                         cache
+        """
+        quadranti = {lato // 2: crea_quadrante(lato // 2) for lato in lati}
+        self._antialiasing = fattore_antialiasing()
+        self._pool = ProcessPoolExecutor(
+            processi or os.cpu_count() or 1, initializer=_inizializza_processo,
+            initargs=(quadranti, self._antialiasing))
+        self._cache: "OrderedDict[_Chiave, Tuple[str, bytes]]" = OrderedDict()
+        self._in_corso: Dict[_Chiave, "asyncio.Future[Tuple[str, bytes]]"] = {}
+        self.max_voci = max_voci
+        self.max_byte = max_byte
+        self.byte = 0
+        self.hit = 0
+        self.miss = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def avvia(self, host: str = "127.0.0.1",
+                    porta: int = 8080) -> Tuple[str, int]:
+        """
+        Avvia il servizio e attende che i processi del pool siano pronti.
+
+        :param host: indirizzo su cui ascoltare
+        :param porta: porta su cui ascoltare (0 per una porta libera)
+        :returns: indirizzo e porta effettivi
+        """
+        ciclo = asyncio.get_running_loop()
+        # Il primo orologio avvia i processi e ne verifica il funzionamento
+        await ciclo.run_in_executor(self._pool, disegna,
+                                    (0, 0, None, LATO_MINIMO // 2, "png"),
+                                    self._antialiasing)
+        self._server = await asyncio.start_server(self._gestisci, host, porta)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def servi(self):
+        """
+        Serve le richieste finché il servizio non viene chiuso.
+        """
+        if self._server is None:
+            raise RuntimeError("Il servizio non è stato avviato")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def chiudi(self):
+        """
+        Chiude il servizio e termina i processi del pool.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._pool.shutdown()
+
+    def statistiche(self) -> Dict[str, int]:
+        """
+        :returns: hit, miss, numero di voci e byte occupati dalla cache
+        """
+        return {"hit": self.hit, "miss": self.miss,
+                "voci": len(self._cache), "byte": self.byte}
+
+    async def orologio(self, chiave: _Chiave) -> Tuple[str, bytes]:
+        """
+        Ritorna l'orologio richiesto dalla cache, oppure lo fa disegnare da
+        un processo del pool. Più richieste contemporanee dello stesso
+        orologio attendono lo stesso disegno.
+
+        :param chiave: la richiesta normalizzata (vedi normalizza_richiesta())
+        :returns: ETag e contenuto del file dell'immagine
+        """
+        risposta = self._cache.get(chiave)
+        if risposta is not None:
+            self.hit += 1
+            self._cache.move_to_end(chiave)
+            return risposta
+        self.miss += 1
+        in_corso = self._in_corso.get(chiave)
+        if in_corso is not None:
+            return await asyncio.shield(in_corso)
+        ciclo = asyncio.get_running_loop()
+        in_corso = self._in_corso[chiave] = ciclo.create_future()
+        try:
+            contenuto = await ciclo.run_in_executor(self._pool, disegna,
+                                                    chiave, self._antialiasing)
+            risposta = (f'"{sha1(contenuto).hexdigest()[:20]}"', contenuto)
+            self._memorizza(chiave, risposta)
+            in_corso.set_result(risposta)
+        except BaseException as errore:
+            in_corso.set_exception(errore)
+            # L'errore viene comunque segnalato a questa richiesta
+            in_corso.exception()
+            raise
+        finally:
+            del self._in_corso[chiave]
+        return risposta
+
+    def _memorizza(self, chiave: _Chiave, risposta: Tuple[str, bytes]):
+        if len(risposta[1]) > self.max_byte:
+            return
+        self._cache[chiave] = risposta
+        self.byte += len(risposta[1])
+        while len(self._cache) > self.max_voci or self.byte > self.max_byte:
+            _, (_, scartato) = self._cache.popitem(last=False)
+            self.byte -= len(scartato)
+
+    async def _gestisci(self, lettore: asyncio.StreamReader,
+                        scrittore: asyncio.StreamWriter):
+        """
+        Gestisce una connessione, con una o più richieste (keep-alive).
+        """
+        try:
+            while True:
+                try:
+                    testata = await lettore.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError,
+                        asyncio.LimitOverrunError, ConnectionError):
+                    return
+                righe = testata.decode("latin-1").split("\r\n")
+                metodo, _, resto = righe[0].partition(" ")
+                bersaglio, _, versione = resto.partition(" ")
+                intestazioni = {}
+                for riga in righe[1:]:
+                    nome, _, valore = riga.partition(":")
+                    intestazioni[nome.strip().lower()] = valore.strip()
+                connessione = intestazioni.get("connection", "").lower()
+                mantieni = (connessione != "close"
+                            if versione == "HTTP/1.1"
+                            else connessione == "keep-alive")
+                scrittore.write(await self._risposta(
+                    metodo, bersaglio, intestazioni.get("if-none-match"),
+                    mantieni))
+                await scrittore.drain()
+                if not mantieni:
+                    return
+        finally:
+            scrittore.close()
+
+    async def _risposta(self, metodo: str, bersaglio: str,
+                        etag_client: Optional[str], mantieni: bool) -> bytes:
+        """
+        :param metodo: il metodo HTTP della richiesta
+        :param bersaglio: percorso e query string della richiesta
+        :param etag_client: l'intestazione If-None-Match, se presente
+        :param mantieni: True se la connessione resta aperta
+        :returns: la risposta HTTP completa
+        """
+        indirizzo = urlsplit(bersaglio)
+        if indirizzo.path != "/clock":
+            return _risposta(404, b"Not found\n", mantieni)
+        if metodo not in ("GET", "HEAD"):
+            return _risposta(405, b"Method not allowed\n", mantieni,
+                             {"Allow": "GET, HEAD"})
+        try:
+            chiave = normalizza_richiesta(indirizzo.query)
+        except RichiestaNonValida as errore:
+            return _risposta(400, f"{errore}\n".encode("utf-8"), mantieni)
+        try:
+            etag, contenuto = await self.orologio(chiave)
+        except Exception:  # pylint: disable=broad-except
+            return _risposta(500, b"Internal server error\n", mantieni)
+        intestazioni = {"ETag": etag,
+                        "Cache-Control": "public, max-age=86400, immutable"}
+        if etag_client is not None and etag in (
+                valore.strip() for valore in etag_client.split(",")):
+            return _risposta(304, b"", mantieni, intestazioni)
+        intestazioni["Content-Type"] = FORMATI[chiave[4]][0]
+        return _risposta(200, contenuto, mantieni, intestazioni,
+                         solo_intestazioni=metodo == "HEAD")
+
+
+def _risposta(stato: int, contenuto: bytes, mantieni: bool,
+              intestazioni: Optional[Dict[str, str]] = None,
+              solo_intestazioni: bool = False) -> bytes:
+    """
+    Compone una risposta HTTP/1.1.
+
+    :param stato: codice di stato
+    :param contenuto: corpo della risposta
+    :param mantieni: True se la connessione resta aperta
+    :param intestazioni: intestazioni aggiuntive
+    :param solo_intestazioni: True per omettere il corpo (richieste HEAD)
+    :returns: la risposta completa
+    """
+    righe = [f"HTTP/1.1 {stato} {_STATI[stato]}"]
+    if stato not in (200, 304):
+        righe.append("Content-Type: text/plain; charset=utf-8")
+    righe.extend(f"{nome}: {valore}"
+                 for nome, valore in (intestazioni or {}).items())
+    if stato != 304:
+        righe.append(f"Content-Length: {len(contenuto)}")
+    righe.append(f"Connection: {'keep-alive' if mantieni else 'close'}")
+    testata = ("\r\n".join(righe) + "\r\n\r\n").encode("latin-1")
+    if solo_intestazioni or stato == 304:
+        return testata
+    return testata + contenuto
+
+
+async def prova_carico(host: str, porta: int, bersagli: List[str],
+                       concorrenza: int = 8) -> List[float]:
+    """
+    Invia le richieste indicate al servizio, su `concorrenza` connessioni
+    keep-alive contemporanee, e misura la latenza di ogni richiesta.
+
+    :param host: indirizzo del servizio
+    :param porta: porta del servizio
+    :param bersagli: percorsi e query string da richiedere
+    :param concorrenza: numero di connessioni contemporanee
+    :returns: le latenze, in secondi
+    """
+    latenze: List[float] = []
+    coda = iter(bersagli)
+
+    async def client():
+        lettore, scrittore = await asyncio.open_connection(host, porta)
+        try:
+            for bersaglio in coda:
+                inizio = perf_counter()
+                scrittore.write(f"GET {bersaglio} HTTP/1.1\r\n"
+                                f"Host: {host}\r\n\r\n".encode("latin-1"))
+                testata = await lettore.readuntil(b"\r\n\r\n")
+                lunghezza = 0
+                for riga in testata.decode("latin-1").split("\r\n"):
+                    nome, _, valore = riga.partition(":")
+                    if nome.lower() == "content-length":
+                        lunghezza = int(valore)
+                await lettore.readexactly(lunghezza)
+                latenze.append(perf_counter() - inizio)
+                if not testata.startswith(b"HTTP/1.1 200"):
+                    raise RuntimeError(testata.split(b"\r\n")[0].decode())
+        finally:
+            scrittore.close()
+
+    await asyncio.gather(*(client() for _ in range(concorrenza)))
+    return latenze
+
+
+def _percentile(valori: List[float], percentuale: float) -> float:
+    ordinati = sorted(valori)
+    return ordinati[min(len(ordinati) - 1,
+                        int(len(ordinati) * percentuale / 100))]
+
+
+async def _esegui_prova_carico(richieste: int, concorrenza: int,
+                               processi: Optional[int]):
+    """
+    Avvia il servizio su una porta libera e lo sottopone a una prova di
+    carico: prima `richieste` orologi diversi (cache vuota), poi gli stessi
+    orologi una seconda volta (cache piena).
+
+    :param richieste: numero di richieste per ogni fase
+    :param concorrenza: numero di connessioni contemporanee
+    :param processi: numero di processi del pool
+    """
+    servizio = ServizioOrologio(processi, (300,))
+    host, porta = await servizio.avvia("127.0.0.1", 0)
+    bersagli = [f"/clock?h={(i // 3600) % 12}&m={(i // 60) % 60}"
+                f"&s={i % 60}&size=300" for i in range(richieste)]
+    print(f"{'fase':<16}{'richieste/s':>12}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    try:
+        for fase in ("cache vuota", "cache piena"):
+            inizio = perf_counter()
+            latenze = await prova_carico(host, porta, bersagli, concorrenza)
+            durata = perf_counter() - inizio
+            print(f"{fase:<16}{len(latenze) / durata:>12.0f}"
+                  f"{_percentile(latenze, 50) * 1000:>10.2f}"
+                  f"{_percentile(latenze, 99) * 1000:>10.2f}")
+    finally:
+        await servizio.chiudi()
+
+
+async def _esegui_servizio(host: str, porta: int, processi: Optional[int],
+                           lati: List[int]):
+    servizio = ServizioOrologio(processi, lati)
+    host, porta = await servizio.avvia(host, porta)
+    print(f"In ascolto su http://{host}:{porta}/clock?h=4&m=10&s=45")
+    try:
+        await servizio.servi()
+    finally:
+        await servizio.chiudi()
+
+
+def main(argomenti: Optional[List[str]] = None) -> int:
+    """
+    Avvia il servizio, oppure la prova di carico.
+
+    :param argomenti: argomenti della riga di comando (None per sys.argv)
+    :returns: il codice di uscita
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="indirizzo su cui ascoltare")
+    parser.add_argument("--porta", type=int, default=8080,
+                        help="porta su cui ascoltare")
+    parser.add_argument("--processi", type=int,
+                        help="numero di processi che disegnano gli orologi "
+                             "(tutti i core se non indicato)")
+    parser.add_argument("--dimensioni", type=int, nargs="+",
+                        default=[2 * RAGGIO],
+                        help="lati degli orologi il cui quadrante viene "
+                             "costruito all'avvio")
+    parser.add_argument("--carico", type=int, metavar="RICHIESTE",
+                        help="esegue una prova di carico con il numero di "
+                             "richieste indicato")
+    parser.add_argument("--concorrenza", type=int, default=8,
+                        help="connessioni contemporanee della prova di "
+                             "carico")
+    opzioni = parser.parse_args(argomenti)
+
+    try:
+        if opzioni.carico:
+            asyncio.run(_esegui_prova_carico(opzioni.carico,
+                                             opzioni.concorrenza,
+                                             opzioni.processi))
+        else:
+            asyncio.run(_esegui_servizio(opzioni.host, opzioni.porta,
+                                         opzioni.processi,
+                                         opzioni.dimensioni))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""
+Configurazione dei test: i moduli della libreria e degli esercizi si trovano
+nella cartella principale del progetto.
+"""
+import os
+import sys
+
+CARTELLA_PROGETTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CARTELLA_PROGETTO)
+
+
+def uguali(prima, seconda) -> bool:
+    """
+    Verifica che due immagini abbiano gli stessi pixel, le stesse dimensioni e
+    lo stesso punto di riferimento.
+
+    :param prima: prima immagine
+    :param seconda: seconda immagine
+    :returns: True se le due immagini sono identiche
+    """
+    return (prima.get_image().tobytes() == seconda.get_image().tobytes()
+            and prima.get_dimensioni() == seconda.get_dimensioni()
+            and prima.get_punto_riferimento()
+            == seconda.get_punto_riferimento())
@@ -0,0 +1,25 @@
+"""
+Test della misura della memoria dei benchmark.
+"""
+from typing import Any, Callable
+
+from benchmark import misura_picco_memoria
+
+MIB = 1024 * 1024
+
+
+def _prepara_allocazione(byte: int) -> Callable[[], Any]:
+    # Un byte diverso da zero, perché le pagine vengano davvero occupate
+    return lambda: bytearray(b"\x01") * byte
+
+
+def test_picco_memoria_di_una_allocazione_nota():
+    picco = misura_picco_memoria(_prepara_allocazione, 50 * MIB)
+    assert 45 * MIB < picco < 55 * MIB
+
+
+def test_picco_memoria_non_eredita_quella_del_processo():
+    occupata = bytearray(b"\x01") * (100 * MIB)
+    picco = misura_picco_memoria(_prepara_allocazione, 0)
+    del occupata
+    assert picco < 5 * MIB
@@ -0,0 +1,187 @@
+"""
+Test delle identità della libreria: immagini pigre e normali, composizione
+su uno sfondo e in due passi, rotazioni di angoli retti e caso generale,
+disegno a tasselli e disegno intero, testi composti dall'atlante dei glifi e
+disegnati per intero, frame di una GIF riletti dal file.
+"""
+import random
+
+import pytest
+from PIL import Image as ImageMod, ImageDraw, ImageSequence
+
+import img_lib_v0_6
+from conftest import uguali
+from img_lib_v0_6 import (
+    Immagine,
+    ImmaginePigra,
+    affianca,
+    attiva_atlante_glifi,
+    cerchio,
+    componi,
+    componi_molti,
+    crea_gif,
+    disattiva_atlante_glifi,
+    disegna_regione,
+    modalita_antialiasing,
+    modalita_pigra,
+    rettangolo,
+    ruota,
+    salva_immagine_a_tasselli,
+    tasselli,
+    triangolo
+)
+# Con il suo nome, pytest considererebbe testo() un test
+from img_lib_v0_6 import testo as crea_testo
+
+
+def _normale_e_pigra(crea):
+    normale = crea()
+    with modalita_pigra():
+        pigra = crea()
+    assert isinstance(pigra, ImmaginePigra)
+    return normale, pigra
+
+
+@pytest.mark.parametrize("colore", ["red", (0, 0, 255), (10, 200, 30, 128)])
+@pytest.mark.parametrize("misura", [1, 2, 7, 25, 50])
+def test_forme_pigre_identiche(misura, colore):
+    for crea in (lambda: cerchio(misura, colore),
+                 lambda: triangolo(misura * 2, colore),
+                 lambda: rettangolo(misura, misura * 2 + 1, colore)):
+        assert uguali(*_normale_e_pigra(crea))
+
+
+def test_composizioni_pigre_identiche():
+    def crea():
+        return affianca(
+            componi(cerchio(20, (255, 0, 0, 100)),
+                    rettangolo(100, 60, "white")),
+            triangolo(30, "blue"))
+    assert uguali(*_normale_e_pigra(crea))
+
+
+@pytest.mark.parametrize("lato_sfondo", [10, 100])
+def test_componi_molti_su_sfondo_come_componi(lato_sfondo):
+    # Con lo sfondo piccolo le immagini sporgono
+    immagini = [ruota(rettangolo(40, 6, (255, 0, 0, 128)), 30),
+                cerchio(8, (0, 0, 255, 200)),
+                ruota(triangolo(30, (0, 128, 0, 100)), 75)]
+    sfondo = cerchio(lato_sfondo // 2, (250, 250, 250, 230))
+    assert uguali(componi_molti(immagini, sfondo),
+                  componi(componi_molti(immagini), sfondo))
+
+
+@pytest.mark.parametrize("gradi", [-270, -90, 0, 90, 180, 270, 360, 450])
+def test_ruota_angolo_retto_come_caso_generale(gradi, monkeypatch):
+    casuale = random.Random(gradi)
+    for _ in range(20):
+        larghezza, altezza = casuale.randint(1, 30), casuale.randint(1, 30)
+        img = ImageMod.new("RGBA", (larghezza + 10, altezza + 10),
+                           (0, 0, 0, 0))
+        img.paste((200, 30, 30, 255), (casuale.randint(0, 9),
+                                       casuale.randint(0, 9),
+                                       casuale.randint(10, larghezza + 10),
+                                       casuale.randint(10, altezza + 10)))
+        immagine = Immagine(img, (casuale.randint(-5, larghezza + 15),
+                                  casuale.randint(-5, altezza + 15)))
+        veloce = ruota(immagine, gradi)
+        with monkeypatch.context() as patch:
+            patch.setattr(img_lib_v0_6, "_ruota_angolo_retto",
+                          lambda immagine, gradi: None)
+            generale = ruota(immagine, gradi)
+        assert uguali(veloce, generale)
+
+
+def _scena(raggio: int) -> ImmaginePigra:
+    # pylint: disable=import-outside-toplevel
+    from esercizio_orologio import costruisci_quadrante
+    with modalita_pigra():
+        scritta = ruota(crea_testo("Poster", raggio // 8, "blue"), 30)
+        raster = Immagine(ruota(rettangolo(300, 40, "green"), 17).get_image())
+        barra = ruota(rettangolo(raggio, 60, (255, 0, 0, 128)), 33)
+        scena = componi(scritta, componi(raster, componi(
+            barra, costruisci_quadrante(raggio))))
+    assert isinstance(scena, ImmaginePigra)
+    return scena
+
+
+@pytest.mark.parametrize("antialiasing", [1, 4])
+def test_tasselli_identici_al_disegno_intero(antialiasing, tmp_path):
+    with modalita_antialiasing(antialiasing):
+        scena = _scena(700)
+    larghezza, altezza = scena.get_dimensioni()
+    assert larghezza > 1024 and altezza > 1024
+    intera = scena.get_image()
+    casuale = random.Random(antialiasing)
+    for _ in range(10):
+        sinistra = casuale.randrange(larghezza)
+        alto = casuale.randrange(altezza)
+        regione = (sinistra, alto, casuale.randint(sinistra + 1, larghezza),
+                   casuale.randint(alto + 1, altezza))
+        # Un'immagine nuova, che non ha ancora disegnato i pixel
+        nuova = ImmaginePigra(scena.forme, scena.get_dimensioni())
+        parte = disegna_regione(nuova, regione)
+        assert parte.get_image().tobytes() == intera.crop(regione).tobytes()
+    nuova = ImmaginePigra(scena.forme, scena.get_dimensioni())
+    for regione, tassello in tasselli(nuova):
+        assert (tassello.get_image().tobytes()
+                == intera.crop(regione).tobytes())
+    salva_immagine_a_tasselli(str(tmp_path / "poster"), nuova)
+    with ImageMod.open(tmp_path / "poster.png") as salvata:
+        assert salvata.convert("RGBA").tobytes() == intera.tobytes()
+
+
+@pytest.mark.parametrize("colore",
+                         ["red", (255, 0, 0, 128), (10, 200, 30, 40)])
+def test_testo_con_atlante_come_senza(colore):
+    # "ff" e "fi" hanno glifi che si sovrappongono
+    contenuti = ("ff fi", "Hello World", "12:45")
+    senza = [crea_testo(contenuto, punti, colore)
+             for contenuto in contenuti for punti in (10, 30, 60)]
+    attiva_atlante_glifi()
+    try:
+        # Due volte: la seconda con i glifi già nell'atlante
+        for _ in range(2):
+            con = [crea_testo(contenuto, punti, colore)
+                   for contenuto in contenuti for punti in (10, 30, 60)]
+            for glifi, intero in zip(con, senza):
+                assert uguali(glifi, intero)
+    finally:
+        disattiva_atlante_glifi()
+
+
+def _frame_gif():
+    frame = []
+    for numero in range(8):
+        img = ImageMod.new("RGBA", (60, 40), (0, 0, 0, 0))
+        disegno = ImageDraw.Draw(img)
+        disegno.rectangle((5, 5, 50, 30), fill="white")
+        # Un rettangolo che si sposta e ogni tanto sparisce
+        if numero % 3 != 2:
+            disegno.rectangle((10 + numero * 3, 8, 20 + numero * 3, 20),
+                              fill=(200, 10, 10))
+        # Un frame tutto trasparente e uno con colori nuovi
+        if numero == 5:
+            disegno.rectangle((0, 0, 59, 39), fill=(0, 0, 0, 0))
+        if numero == 6:
+            for x in range(0, 60, 20):
+                disegno.rectangle((x, 0, x + 19, 2), fill=(x * 5, 50, 7))
+        frame.append(Immagine(img))
+    # Un frame identico al precedente
+    frame.append(frame[-1])
+    return frame
+
+
+def test_frame_gif_riletti_come_scritti(tmp_path):
+    frame = _frame_gif()
+    crea_gif(str(tmp_path / "animazione"), iter(frame))
+    with ImageMod.open(tmp_path / "animazione.gif") as gif:
+        letti = [letto.convert("RGBA")
+                 for letto in ImageSequence.Iterator(gif)]
+    assert len(letti) == len(frame)
+    for letto, scritto in zip(letti, frame):
+        # I pixel trasparenti di una GIF non hanno un colore
+        nero = ImageMod.new("RGBA", letto.size, (0, 0, 0, 0))
+        assert (ImageMod.composite(letto, nero, letto).tobytes()
+                == ImageMod.composite(scritto.get_image(), nero,
+                                      scritto.get_image()).tobytes())
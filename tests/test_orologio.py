@@ -0,0 +1,114 @@
+"""
+Test delle identità degli esercizi: atlante e orologi in blocco rispetto a
+crea_orologio(), frame creati in parallelo rispetto a quelli creati in
+serie, ripresa di un archivio di fotogrammi.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+
+import pytest
+
+import animazione_orologio_con_secondi
+import esercizio_orologio
+import esercizio_orologio_con_secondi
+from animazione_orologio_con_secondi import archivia_orologi, genera_orologi
+from atlante_orologio import AtlanteOrologio, costruisci_atlante
+from conftest import uguali
+from img_lib_v0_6 import modalita_antialiasing
+
+RAGGIO = 50
+ORARI = [(ore, minuti, (7 * minuti + ore) % 60)
+         for ore in range(0, 24, 5) for minuti in range(0, 60, 7)]
+
+
+@pytest.mark.parametrize("antialiasing", [1, 4])
+def test_crea_orologi_come_crea_orologio(antialiasing):
+    with modalita_antialiasing(antialiasing):
+        in_blocco = esercizio_orologio_con_secondi.crea_orologi(ORARI, RAGGIO)
+        for (ore, minuti, secondi), orologio in zip(ORARI, in_blocco):
+            assert uguali(orologio, esercizio_orologio_con_secondi
+                          .crea_orologio(ore, minuti, secondi, RAGGIO))
+        in_blocco = esercizio_orologio.crea_orologi(
+            [(ore, minuti) for ore, minuti, _ in ORARI], RAGGIO)
+        for (ore, minuti, _), orologio in zip(ORARI, in_blocco):
+            assert uguali(orologio, esercizio_orologio.crea_orologio(
+                ore, minuti, RAGGIO))
+
+
+@pytest.mark.parametrize("antialiasing", [1, 4])
+def test_atlante_come_crea_orologio(antialiasing, tmp_path):
+    nome_file = str(tmp_path / "orologi.atlante")
+    with modalita_antialiasing(antialiasing):
+        costruisci_atlante(nome_file, RAGGIO)
+        with AtlanteOrologio(nome_file) as atlante:
+            for ore, minuti, secondi in ORARI:
+                assert uguali(atlante.crea_orologio(ore, minuti, secondi),
+                              esercizio_orologio_con_secondi.crea_orologio(
+                                  ore, minuti, secondi, RAGGIO))
+                assert uguali(atlante.crea_orologio(ore, minuti),
+                              esercizio_orologio.crea_orologio(
+                                  ore, minuti, RAGGIO))
+
+
+def test_frame_paralleli_come_seriali():
+    secondi = range(0, 7)
+    seriali = list(genera_orologi(4, 10, secondi, 1))
+    paralleli = list(genera_orologi(4, 10, secondi, 2, dimensione_blocco=2))
+    assert len(paralleli) == len(seriali)
+    for parallelo, seriale in zip(paralleli, seriali):
+        assert uguali(parallelo, seriale)
+
+
+def test_frame_paralleli_con_antialiasing(monkeypatch):
+    # Con spawn i processi non ereditano l'antialiasing del processo
+    # principale
+    monkeypatch.setattr(
+        animazione_orologio_con_secondi, "ProcessPoolExecutor",
+        partial(ProcessPoolExecutor,
+                mp_context=multiprocessing.get_context("spawn")))
+    secondi = range(0, 3)
+    with modalita_antialiasing():
+        seriali = list(genera_orologi(4, 10, secondi, 1))
+        paralleli = list(genera_orologi(4, 10, secondi, 2,
+                                        dimensione_blocco=2))
+    for parallelo, seriale in zip(paralleli, seriali):
+        assert uguali(parallelo, seriale)
+
+
+def test_archivio_parallelo_come_seriale(tmp_path):
+    secondi = range(0, 5)
+    with archivia_orologi(4, 10, secondi, str(tmp_path / "seriale"), 1) \
+            as seriale, archivia_orologi(4, 10, secondi,
+                                         str(tmp_path / "parallelo"), 2,
+                                         dimensione_blocco=2) as parallelo:
+        for numero in range(len(secondi)):
+            assert uguali(parallelo.leggi(numero), seriale.leggi(numero))
+
+
+def test_archivio_ripreso_solo_con_gli_stessi_parametri(tmp_path,
+                                                        monkeypatch):
+    nome_file = str(tmp_path / "animazione.fotogrammi")
+    secondi = range(0, 3)
+    chiamate = []
+    crea_orologio = animazione_orologio_con_secondi.crea_orologio
+
+    def conta(ore, minuti, passo):
+        chiamate.append((ore, minuti, passo))
+        return crea_orologio(ore, minuti, passo)
+    monkeypatch.setattr(animazione_orologio_con_secondi, "crea_orologio",
+                        conta)
+
+    archivia_orologi(4, 10, secondi, nome_file).chiudi()
+    assert len(chiamate) == 3
+    # Stessi parametri: l'archivio è completo e viene solo riaperto
+    archivia_orologi(4, 10, secondi, nome_file).chiudi()
+    assert len(chiamate) == 3
+    # Parametri diversi: l'archivio viene ricreato con i nuovi orologi
+    with archivia_orologi(9, 45, secondi, nome_file) as archivio:
+        assert len(chiamate) == 6
+        for numero, passo in enumerate(secondi):
+            assert uguali(archivio.leggi(numero), crea_orologio(9, 45, passo))
+    with modalita_antialiasing():
+        archivia_orologi(9, 45, secondi, nome_file).chiudi()
+    assert len(chiamate) == 9